@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark for intent routing over a corpus of voice transcripts.
+
+Compares the old per-call keyword scans (two lists rebuilt on every call,
+then `any(keyword in query.lower() ...)` per list) with the compiled
+IntentRouter, and lists any transcript where their decisions differ; the
+router keeps the scan's substring semantics, so there should be none.
+
+Uses transcripts from a file (one per line) if given, otherwise a generated
+corpus of chit-chat, search and image requests.
+"""
+
+import sys
+import time
+import random
+
+from services.intent_router import INTENT_IMAGE, INTENT_SEARCH, intent_router
+
+CORPUS_SIZE = 20_000
+
+TEMPLATES = [
+    "hi how are you doing",
+    "tell me a joke about {topic}",
+    "I don't know what to do about {topic}",
+    "that was a good one, tell me another",
+    "what's the weather in {city} today",
+    "latest news about {topic}",
+    "what is happening in {city} right now",
+    "show me a picture of {topic}",
+    "draw {topic} wearing sunglasses",
+    "what does a {topic} look like",
+    "any updates on the match?",
+    "I love drawing and painting {topic}",
+    "show me some designs with the gods",
+    "generate image of lord ganesha riding a {topic}",
+    "show me today's weather in {city}",
+    "can you give me the list of districts in {city}",
+    "my designer friend knows everything about {topic}",
+    "honestly I think that's a goodbye from me",
+]
+TOPICS = ["cricket", "traffic", "biryani", "monsoon", "auto rickshaw", "startups", "aunties", "chai"]
+CITIES = ["Delhi", "Mumbai", "Bangalore", "Chennai", "Kolkata", "Hyderabad"]
+
+
+def legacy_route(query):
+    """The scan query_llm and the streaming path each used to run."""
+    search_keywords = ["latest", "current", "news", "weather", "today", "now", "happening", "recent", "update", "holiday", "holidays", "districts", "list of", "current status"]
+    needs_search = any(keyword in query.lower() for keyword in search_keywords)
+    image_keywords = ["create image", "generate image", "generate me", "draw", "make picture", "show me", "create art", "paint", "design", "how does", "what does", "look like", "ganesh", "ganesha", "chaturthi", "vinayaka", "lord", "god", "deity", "image of", "picture of"]
+    needs_image = any(keyword in query.lower() for keyword in image_keywords)
+    return needs_search, needs_image
+
+
+def router_route(query):
+    intents = intent_router.match(query)
+    return INTENT_SEARCH in intents, INTENT_IMAGE in intents
+
+
+def load_corpus():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    rng = random.Random(7)
+    return [
+        rng.choice(TEMPLATES).format(topic=rng.choice(TOPICS), city=rng.choice(CITIES))
+        for _ in range(CORPUS_SIZE)
+    ]
+
+
+def timed(route, corpus):
+    start = time.perf_counter()
+    decisions = [route(query) for query in corpus]
+    return decisions, time.perf_counter() - start
+
+
+def main():
+    corpus = load_corpus()
+    legacy, legacy_s = timed(legacy_route, corpus)
+    routed, router_s = timed(router_route, corpus)
+
+    print(f"{len(corpus)} transcripts\n")
+    print(f"{'router':>8} {'total ms':>10} {'us/transcript':>14}")
+    for name, elapsed in (("legacy", legacy_s), ("compiled", router_s)):
+        print(f"{name:>8} {elapsed * 1000:>10.1f} {elapsed / len(corpus) * 1e6:>14.2f}")
+
+    differing = sorted({query for query, a, b in zip(corpus, legacy, routed) if a != b})
+    print(f"\n{len(differing)} distinct transcripts routed differently (legacy scan vs router):")
+    for query in differing[:10]:
+        print(f"  {query!r}: legacy={legacy_route(query)} router={router_route(query)}")
+
+
+if __name__ == "__main__":
+    main()
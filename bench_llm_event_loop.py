@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Event-loop lag while many LLM generations stream concurrently.
+
+Runs 50 generations at once in three styles and, alongside them, a ticker
+that asks to wake up every 10ms and records how late it actually wakes:
+
+  sync    iterate a blocking `send_message(..., stream=True)` inside a coroutine
+  thread  the same stream, but every `next()` pushed to a worker thread
+  async   `send_message_async(..., stream=True)` iterated with `async for`
+
+By default the model is simulated (fixed time to first token, then a chunk
+every few ms) so the numbers are reproducible offline. With --live and
+GEMINI_API_KEY set, the same three styles run against gemini-1.5-flash.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import statistics
+
+CONCURRENCY = 50
+TICK_MS = 10
+# Simulated generation: time to first chunk, then chunks at a steady pace
+FIRST_CHUNK_MS = 300
+CHUNK_INTERVAL_MS = 20
+CHUNKS = 25
+PROMPT = "Tell me a two sentence joke about Bangalore traffic."
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class SimulatedChat:
+    """Timing-only stand-in for a Gemini ChatSession."""
+
+    def send_message(self, prompt, stream=False):
+        def generate():
+            time.sleep(FIRST_CHUNK_MS / 1000)
+            for i in range(CHUNKS):
+                if i:
+                    time.sleep(CHUNK_INTERVAL_MS / 1000)
+                yield Chunk("word ")
+        return generate()
+
+    async def send_message_async(self, prompt, stream=False):
+        async def generate():
+            await asyncio.sleep(FIRST_CHUNK_MS / 1000)
+            for i in range(CHUNKS):
+                if i:
+                    await asyncio.sleep(CHUNK_INTERVAL_MS / 1000)
+                yield Chunk("word ")
+        return generate()
+
+
+def make_chat(live: bool):
+    if not live:
+        return SimulatedChat()
+    import google.generativeai as genai
+    genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+    return genai.GenerativeModel("gemini-1.5-flash").start_chat()
+
+
+async def generate_sync(chat):
+    text = ""
+    for chunk in chat.send_message(PROMPT, stream=True):
+        text += chunk.text
+    return text
+
+
+async def generate_thread(chat):
+    stream = await asyncio.to_thread(chat.send_message, PROMPT, stream=True)
+    iterator = iter(stream)
+    done = object()
+    text = ""
+    while True:
+        chunk = await asyncio.to_thread(next, iterator, done)
+        if chunk is done:
+            return text
+        text += chunk.text
+
+
+async def generate_async(chat):
+    text = ""
+    async for chunk in await chat.send_message_async(PROMPT, stream=True):
+        text += chunk.text
+    return text
+
+
+async def measure_lag(stop: asyncio.Event, lags: list):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + TICK_MS / 1000
+        await asyncio.sleep(TICK_MS / 1000)
+        lags.append(max(0.0, (loop.time() - expected) * 1000))
+
+
+async def run(style, generate, live):
+    stop = asyncio.Event()
+    lags = []
+    ticker = asyncio.create_task(measure_lag(stop, lags))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await asyncio.gather(*(generate(make_chat(live)) for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    lags.sort()
+    p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0.0
+    print(f"{style:>8} {elapsed:>9.2f}s {len(lags):>7} {statistics.median(lags) if lags else 0.0:>11.1f} "
+          f"{p99:>9.1f} {max(lags, default=0.0):>9.1f}")
+
+
+def main():
+    live = "--live" in sys.argv
+    if live and not os.getenv("GEMINI_API_KEY"):
+        sys.exit("--live needs GEMINI_API_KEY")
+    print(f"{CONCURRENCY} concurrent generations ({'gemini-1.5-flash' if live else 'simulated model'}), "
+          f"ticker every {TICK_MS}ms\n")
+    print(f"{'style':>8} {'wall':>10} {'ticks':>7} {'lag p50 ms':>11} {'p99 ms':>9} {'max ms':>9}")
+    for style, generate in (("sync", generate_sync), ("thread", generate_thread), ("async", generate_async)):
+        asyncio.run(run(style, generate, live))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Murf REST synthesis with a client per call versus the pooled per-key client.
+
+Runs the same `text_to_speech.generate` calls two ways, sequentially and
+CONCURRENCY at a time from worker threads (as /tts/generate does):
+
+  per-call  `Murf(api_key=...)` built for every call, so every call opens a new connection
+  pooled    `murf_clients.client(api_key)`, whose keep-alive connections are reused
+
+By default Murf is simulated by a local HTTP/1.1 server that charges
+CONNECT_MS for every new connection (standing in for the TCP and TLS
+handshakes to api.murf.ai) and SYNTH_MS per request, so the numbers are
+reproducible offline. With --live and MURF_API_KEY set, the calls go to
+Murf itself.
+"""
+
+import os
+import sys
+import time
+import json
+import base64
+import logging
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from murf import Murf
+from murf.environment import MurfEnvironment
+
+CALLS = 20
+CONCURRENCY = 10
+# Simulated Murf: new-connection cost (handshakes) and synthesis time
+CONNECT_MS = 60
+SYNTH_MS = 40
+TEXT = "Arre yaar, this traffic is so slow, even the potholes have potholes."
+VOICE_ID = "en-IN-rohan"
+
+
+class SimulatedMurfServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connection bursts into a 1s SYN retry, which would swamp the comparison
+    request_queue_size = 64
+
+
+class SimulatedMurf(BaseHTTPRequestHandler):
+    """Timing-only stand-in for POST /v1/speech/generate."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without this the body waits on a delayed ACK
+    disable_nagle_algorithm = True
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        with SimulatedMurf.lock:
+            SimulatedMurf.connections += 1
+        time.sleep(CONNECT_MS / 1000)
+        super().setup()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(SYNTH_MS / 1000)
+        body = json.dumps({
+            "audioFile": "https://murf.example/audio.mp3",
+            "encodedAudio": base64.b64encode(b"\0" * 2048).decode(),
+            "audioLengthInSeconds": 2.0,
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_simulated_murf() -> str:
+    server = SimulatedMurfServer(("127.0.0.1", 0), SimulatedMurf)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def synthesize(client: Murf) -> float:
+    start = time.perf_counter()
+    client.text_to_speech.generate(text=TEXT, voice_id=VOICE_ID, format="MP3", sample_rate=44100.0,
+                                   encode_as_base_64=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def run(style: str, mode: str, make_client, live: bool):
+    SimulatedMurf.connections = 0
+    start = time.perf_counter()
+    if mode == "sequential":
+        latencies = [synthesize(make_client()) for _ in range(CALLS)]
+    else:
+        with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+            latencies = list(pool.map(lambda _: synthesize(make_client()), range(CALLS)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    connections = "-" if live else str(SimulatedMurf.connections)
+    print(f"{style:>9} {mode:>11} {elapsed:>8.2f}s {statistics.median(latencies):>9.1f} {p95:>9.1f} {connections:>12}")
+
+
+def main():
+    live = "--live" in sys.argv
+    # One INFO line per request would bury the table
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if live:
+        api_key = os.getenv("MURF_API_KEY")
+        if not api_key:
+            sys.exit("--live needs MURF_API_KEY")
+    else:
+        api_key = "simulated"
+        # Both styles build their clients on the default environment; point it at the local server
+        MurfEnvironment.DEFAULT.base = start_simulated_murf()
+
+    from services.murf_clients import murf_clients
+
+    print(f"{CALLS} calls, {CONCURRENCY} at a time when concurrent "
+          f"({'api.murf.ai' if live else f'simulated Murf: {CONNECT_MS}ms per new connection, {SYNTH_MS}ms per request'})\n")
+    print(f"{'style':>9} {'mode':>11} {'wall':>9} {'p50 ms':>9} {'p95 ms':>9} {'connections':>12}")
+    for mode in ("sequential", "concurrent"):
+        run("per-call", mode, lambda: Murf(api_key=api_key), live)
+        run("pooled", mode, lambda: murf_clients.client(api_key), live)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the STT audio framer.
+
+Feeds one minute of 16kHz 16-bit mono audio through the old bytearray framer and
+through PcmFramer, for several browser frame sizes and STT frame durations, and
+reports bytes copied per second of audio plus wall time.
+"""
+
+import time
+
+from utils.audio_framing import PcmFramer
+
+SAMPLE_RATE = 16_000
+BYTES_PER_SECOND = SAMPLE_RATE * 2
+AUDIO_SECONDS = 60
+# 86 bytes is what the AudioWorklet posts (128 samples at 48kHz downsampled to 16kHz)
+INPUT_SIZES = [86, 256, 1024, 4096, 16384, 65536, 262144]
+FRAME_DURATIONS_MS = [50, 100, 250]
+
+
+def legacy_framer(chunks, frame_bytes):
+    """The framer run_transcription used to have, instrumented to count copies."""
+    buffer = bytearray()
+    copied = 0
+    for chunk in chunks:
+        buffer.extend(chunk)
+        copied += len(chunk)
+        while len(buffer) >= frame_bytes:
+            frame = bytes(buffer[:frame_bytes])
+            copied += 2 * frame_bytes  # slice, then bytes()
+            buffer = buffer[frame_bytes:]
+            copied += len(buffer)
+            yield frame
+    if buffer:
+        yield bytes(buffer)
+    legacy_framer.bytes_copied = copied
+
+
+def make_chunks(input_size):
+    total = BYTES_PER_SECOND * AUDIO_SECONDS
+    payload = bytes(input_size)
+    return [payload] * (total // input_size)
+
+
+def run_legacy(chunks, frame_bytes):
+    start = time.perf_counter()
+    frames = sum(1 for _ in legacy_framer(chunks, frame_bytes))
+    return frames, legacy_framer.bytes_copied, time.perf_counter() - start
+
+
+def run_ring(chunks, frame_ms):
+    framer = PcmFramer(frame_ms=frame_ms, sample_rate=SAMPLE_RATE)
+    start = time.perf_counter()
+    frames = 0
+    for chunk in chunks:
+        frames += len(framer.push(chunk))
+    if framer.flush():
+        frames += 1
+    return frames, framer.bytes_copied, time.perf_counter() - start
+
+
+def main():
+    print(f"Framing {AUDIO_SECONDS}s of audio ({BYTES_PER_SECOND} bytes/s)")
+    print(f"{'frame':>6} {'input':>8} | {'legacy copied/s':>16} {'legacy ms':>10} | {'ring copied/s':>14} {'ring ms':>8}")
+    print("-" * 74)
+    for frame_ms in FRAME_DURATIONS_MS:
+        frame_bytes = (SAMPLE_RATE * frame_ms // 1000) * 2
+        for input_size in INPUT_SIZES:
+            chunks = make_chunks(input_size)
+            audio_seconds = len(chunks) * input_size / BYTES_PER_SECOND
+            _, legacy_copied, legacy_time = run_legacy(chunks, frame_bytes)
+            _, ring_copied, ring_time = run_ring(chunks, frame_ms)
+            print(
+                f"{frame_ms:>4}ms {input_size:>8} | "
+                f"{legacy_copied / audio_seconds:>16,.0f} {legacy_time * 1000:>10.1f} | "
+                f"{ring_copied / audio_seconds:>14,.0f} {ring_time * 1000:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,36 @@
 import time
 import logging
 import asyncio
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables from .env file BEFORE other imports
 load_dotenv()
 
-from fastapi import FastAPI, UploadFile, File, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+from fastapi import FastAPI, UploadFile, File, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
 # Import services and schemas
 from services.stt_service import transcribe_audio_data
-from services.llm_service import query_llm
-from services.tts_service import generate_tts_audio, generate_comedian_tts_audio
+from services.llm_service import get_chat_session_stats, get_session_template_stats, get_response_cache_stats
+from services.tts_service import generate_tts_audio, generate_long_tts_audio, get_runtime_api_key, stream_tts_audio
+from services.turn_pipeline import run_request_turn, get_pipeline_stats, get_tts_pipeline_stats
 from services.chat_persistence import chat_db
+from services.stream_session import StreamSession, get_streaming_stats
+from services.turn_dispatcher import get_turn_stats
+from services.murf_connection_pool import get_murf_pool_stats
+from services.murf_websocket_service import retire_murf_service
+from services.speculative_llm import get_speculation_stats
+from services.history_manager import get_history_stats
+from services.tool_orchestrator import get_tool_stats
+from services.gemini_clients import get_gemini_client_stats
+from services.response_shaper import get_shaper_stats
+from services.resilience import get_resilience_stats
+from services.tts_cache import MEDIA_TYPES, get_tts_cache_stats, is_cache_key, tts_cache
+from services.voice_selector import get_voice_selector_stats
+from services.murf_clients import get_murf_client_stats
+from services.long_form_tts import get_long_form_stats, is_long_form
 from schemas.tts import TTSResponse, TTSRequest
 from schemas.stt import TranscriptionResponse
 
@@ -44,20 +60,8 @@ async def agent_chat(session_id: str, file: UploadFile = File(...)):
     # Read audio data into memory
     audio_data = await file.read()
     
-    # 1. Transcribe Audio
-    logging.info("Transcribing audio...")
-    user_query = transcribe_audio_data(audio_data)
-    logging.info(f"Transcription successful: '{user_query}'")
-    
-    # 2. Query LLM with chat history
-    logging.info("Querying LLM...")
-    llm_response_text = query_llm(session_id, user_query)
-    logging.info(f"LLM response received: '{llm_response_text}'")
-    
-    # 3. Generate TTS from LLM response with comedian voice
-    logging.info("Generating comedian TTS audio...")
-    audio_url = generate_comedian_tts_audio(llm_response_text)
-    logging.info(f"Comedian TTS audio generated successfully: {audio_url}")
+    # STT, LLM and TTS run as stages of the same turn pipeline as the streaming WebSocket
+    audio_url = await run_request_turn(session_id, audio_data)
     
     return TTSResponse(audio_url=audio_url, message="LLM response audio generated successfully")
 
@@ -67,10 +71,41 @@ async def generate_tts_endpoint(request: TTSRequest):
     Endpoint for generating TTS audio from text.
     """
     logging.info(f"Received TTS generation request for text: '{request.text[:30]}...'")
-    audio_url = generate_tts_audio(request.text, request.voice_id)
-    logging.info(f"TTS audio generated: {audio_url}")
+    if is_long_form(request.text):
+        # Too long for one Murf request: synthesized in parallel parts and joined
+        audio_url = await generate_long_tts_audio(request.text, request.voice_id)
+    else:
+        audio_url = await asyncio.to_thread(generate_tts_audio, request.text, request.voice_id)
+    # A long clip without the cache comes back inline as a data URL; keep the log line short
+    logging.info(f"TTS audio generated: {audio_url[:80]}")
     return TTSResponse(audio_url=audio_url, message="TTS audio generated successfully")
 
+@app.post("/tts/stream")
+async def stream_tts_endpoint(request: TTSRequest):
+    """
+    Stream MP3 audio for text of any length. Long text plays from its first
+    part while the later parts are still being synthesized.
+    """
+    logging.info(f"Received TTS stream request for {len(request.text)} chars: '{request.text[:30]}...'")
+    # Checked up front: once streaming has started the status can no longer change
+    if not get_runtime_api_key():
+        raise HTTPException(status_code=500, detail="Murf API key not configured. Please configure it in the API settings.")
+    return StreamingResponse(stream_tts_audio(request.text, request.voice_id), media_type=MEDIA_TYPES["mp3"])
+
+@app.get("/tts/cache/{key}")
+async def get_cached_tts_audio(key: str):
+    """
+    Serve a clip from the TTS cache, from RAM or streamed from disk.
+    Keys are content hashes, so a clip never changes and can be cached by the browser for good.
+    """
+    if not is_cache_key(key):
+        raise HTTPException(status_code=404, detail="Unknown audio clip")
+    chunks = await asyncio.to_thread(tts_cache.open_clip, key)
+    if chunks is not None:
+        return StreamingResponse(chunks, media_type=MEDIA_TYPES[key.rsplit(".", 1)[1]],
+                                 headers={"Cache-Control": "public, max-age=31536000, immutable"})
+    raise HTTPException(status_code=404, detail="Audio clip is no longer cached")
+
 @app.post("/transcribe/file", response_model=TranscriptionResponse)
 async def transcribe_audio_endpoint(file: UploadFile = File(...)):
     """
@@ -78,7 +113,7 @@ async def transcribe_audio_endpoint(file: UploadFile = File(...)):
     """
     logging.info("Received request to transcribe an audio file.")
     audio_data = await file.read()
-    transcription = transcribe_audio_data(audio_data)
+    transcription = await asyncio.to_thread(transcribe_audio_data, audio_data)
     logging.info(f"Transcription successful: '{transcription}'")
     return TranscriptionResponse(transcription=transcription)
 
@@ -172,10 +207,9 @@ async def test_api_keys(request: dict):
     # Test Gemini key
     if request.get('gemini'):
         try:
-            import google.generativeai as genai
-            genai.configure(api_key=request['gemini'])
-            # Test with a simple generation
-            model = genai.GenerativeModel('gemini-pro')
+            from services.gemini_clients import gemini_clients
+            # Test with a simple generation, on the key's own clients rather than the global configuration
+            model = gemini_clients.model(request['gemini'], 'gemini-pro')
             response = model.generate_content("Hi")
             results['gemini'] = '✅ Valid'
         except Exception as e:
@@ -228,12 +262,16 @@ async def set_runtime_keys(request: dict):
     
     # Store keys in a global variable for runtime use
     global runtime_api_keys
+    previous_murf_key = runtime_api_keys.get('murf', '')
     runtime_api_keys = {
         'assemblyai': request.get('assemblyai', ''),
         'gemini': request.get('gemini', ''),
         'murf': request.get('murf', ''),
         'tavily': request.get('tavily', '')
     }
+    # Nothing will use the old Murf key again; close its sockets instead of leaking them
+    if previous_murf_key and previous_murf_key != runtime_api_keys['murf']:
+        await retire_murf_service(previous_murf_key)
     
     return JSONResponse(content={
         "success": True,
@@ -407,181 +445,8 @@ async def websocket_endpoint(websocket: WebSocket):
         pass
 
 
-# --- Day 17: Streaming Audio with AssemblyAI (v3 SDK) ---
-import os
-import queue
-import threading
-from assemblyai.streaming.v3 import (
-    BeginEvent,
-    StreamingClient,
-    StreamingClientOptions,
-    StreamingError,
-    StreamingEvents,
-    StreamingParameters,
-    TerminationEvent,
-    TurnEvent,
-)
-
-# API keys will be provided by users via the frontend
-
-# Define event handlers
-def on_begin(self, event: BeginEvent):
-    logging.info(f"Session started: {event.id}")
-
-def on_turn(self, event: TurnEvent):
-    logging.info(f"Turn: {event.transcript} (end_of_turn: {event.end_of_turn})")
-
-def on_terminated(self, event: TerminationEvent):
-    logging.info(f"Session terminated: {event.audio_duration_seconds}s of audio processed")
-
-def on_error(self, error: StreamingError):
-    logging.error(f"Error occurred: {error}")
-
-from assemblyai import extras
-
-# ... existing code ...
-
-import assemblyai as aai
-
-# ... existing code ...
-
-import assemblyai as aai
-from assemblyai.streaming.v3 import (
-    StreamingClient,
-    StreamingClientOptions,
-    StreamingEvents,
-    StreamingParameters,
-    TerminationEvent,
-    TurnEvent,
-    StreamingError,
-    BeginEvent,
-)
-
-# ... existing code ...
-
-def run_transcription(audio_queue: queue.Queue, message_queue: queue.Queue, websocket_conn=None, session_id: str | None = None):
-    """Runs the transcription in a separate thread."""
-    logging.info("Transcription thread started.")
-    
-    # Store the full transcript for the current turn
-    current_transcript = ""
-
-    def on_begin(client, event: BeginEvent):
-        logging.info(f"Session started: {event.id}")
-
-    def on_turn(client, event: TurnEvent):
-        nonlocal current_transcript
-        if event.transcript:
-            current_transcript = event.transcript
-            logging.info(f"Turn: {event.transcript} (end_of_turn: {event.end_of_turn})")
-            
-            if event.end_of_turn:
-                try:
-                    import json
-                    message = {
-                        "type": "turn_end",
-                        "transcript": current_transcript,
-                        "timestamp": time.time()
-                    }
-                    
-                    message_queue.put(json.dumps(message))
-                    
-                    logging.info(f"Turn ended - queued transcript for client: '{current_transcript}'")
-                    # --- Day 21: Stream LLM response to Murf WebSocket and send audio to client ---
-                    from services.llm_service import stream_llm_to_murf_and_client
-                    print(f"\n[Day 21] Sending transcript to LLM and Murf, then streaming audio to client: '{current_transcript}'")
-                    
-                    # Capture the transcript value to avoid closure issues
-                    transcript_to_process = current_transcript
-                    
-                    # Create a task to run the async function
-                    import threading
-                    def run_async_task(transcript, ws_connection, sess_id):
-                        print(f"🔍 Inside run_async_task, transcript: '{transcript}'")
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                        try:
-                            loop.run_until_complete(stream_llm_to_murf_and_client(transcript, ws_connection, session_id=sess_id))
-                        finally:
-                            loop.close()
-                    
-                    # Run in a separate thread to avoid blocking
-                    task_thread = threading.Thread(target=run_async_task, args=(transcript_to_process, websocket_conn, session_id))
-                    task_thread.daemon = True
-                    task_thread.start()
-                    
-                    current_transcript = ""  # Reset for next turn
-                except Exception as e:
-                    logging.error(f"Error processing turn end: {e}")
-
-    def on_error(client, error: StreamingError):
-        logging.error(f"An error occurred: {error}")
-
-    def on_terminated(client, event: TerminationEvent):
-        logging.info(f"Session terminated: {event.audio_duration_seconds}s of audio processed")
-
-    try:
-        # Use runtime API key if available
-        global runtime_api_keys
-        assemblyai_key = runtime_api_keys.get('assemblyai') if runtime_api_keys else None
-        
-        if not assemblyai_key:
-            logging.warning("AssemblyAI API key not available in runtime. Streaming transcription may not work.")
-            return
-        
-        # Set the API key for this session
-        aai.settings.api_key = assemblyai_key
-
-        client = StreamingClient(
-            StreamingClientOptions(
-                api_key=assemblyai_key,
-            )
-        )
-
-        client.on(StreamingEvents.Begin, on_begin)
-        client.on(StreamingEvents.Turn, on_turn)
-        client.on(StreamingEvents.Error, on_error)
-        client.on(StreamingEvents.Termination, on_terminated)
-
-        client.connect(
-            StreamingParameters(
-                sample_rate=16_000,
-                enable_turn_detection=True,  # Enable turn detection
-            )
-        )
-
-        # Buffer audio chunks to meet AssemblyAI's duration requirements (50-1000ms)
-        buffer = bytearray()
-        target_chunk_size = 1600  # 50ms at 16kHz 16-bit mono (16000 * 0.05 * 2 bytes)
-
-        def audio_generator(q: queue.Queue):
-            nonlocal buffer
-            while True:
-                chunk = q.get()
-                if chunk is None:
-                    # Send any remaining buffered audio before stopping
-                    if buffer:
-                        yield bytes(buffer)
-                    break
-                
-                buffer.extend(chunk)
-                
-                # Send chunks when we have enough audio (50ms worth)
-                while len(buffer) >= target_chunk_size:
-                    yield bytes(buffer[:target_chunk_size])
-                    buffer = buffer[target_chunk_size:]
-                
-                q.task_done()
-
-        client.stream(audio_generator(audio_queue))
-
-    except Exception as e:
-        logging.error(f"Error during transcription: {e}", exc_info=True)
-    finally:
-        logging.info("Transcription thread finished.")
-
-
-
+# --- Day 17: Streaming Audio with AssemblyAI (v3 streaming API) ---
+# The whole streaming path runs on the server event loop: see services/stream_session.py
 
 @app.websocket("/ws/stream-audio")
 async def stream_audio_websocket(websocket: WebSocket):
@@ -591,50 +456,38 @@ async def stream_audio_websocket(websocket: WebSocket):
     await websocket.accept()
     logging.info(f"WebSocket connection established. session_id={session_id}")
 
-    audio_queue = queue.Queue()
-    message_queue = queue.Queue()  # Queue for messages from transcription thread
-    
-    transcription_thread = threading.Thread(
-        target=run_transcription, args=(audio_queue, message_queue, websocket, session_id)
-    )
-    transcription_thread.start()
+    # Use runtime API key if available
+    assemblyai_key = runtime_api_keys.get('assemblyai') if runtime_api_keys else None
 
-    async def send_queued_messages():
-        """Send any queued messages to the client."""
-        try:
-            while True:
-                message = message_queue.get_nowait()
-                await websocket.send_text(message)
-                logging.info(f"Sent message to client: {message}")
-                message_queue.task_done()
-        except queue.Empty:
-            pass
+    session = StreamSession(websocket, session_id, assemblyai_key)
+    await session.run()
 
-    try:
-        while True:
-            # Always check for messages first
-            await send_queued_messages()
-            
-            # Handle incoming audio data with a timeout
-            try:
-                data = await asyncio.wait_for(websocket.receive_bytes(), timeout=0.1)
-                audio_queue.put(data)
-            except asyncio.TimeoutError:
-                continue  # Continue checking for messages
-                
-    except WebSocketDisconnect:
-        logging.info("WebSocket disconnected by client.")
-        # Signal the transcription thread to stop
-        audio_queue.put(None)
-    except Exception as e:
-        logging.error(f"An error occurred in the websocket: {e}", exc_info=True)
-        # Signal the transcription thread to stop
-        audio_queue.put(None)
-    finally:
-        # Wait for the transcription thread to finish
-        if transcription_thread.is_alive():
-            transcription_thread.join()
-        logging.info("WebSocket connection closed.")
+@app.get("/api/metrics")
+async def get_metrics():
+    """
+    Runtime counters for the streaming pipeline.
+    """
+    return JSONResponse(content={
+        "threads": threading.active_count(),
+        "streaming": get_streaming_stats(),
+        "turns": get_turn_stats(),
+        "tts_pipeline": get_tts_pipeline_stats(),
+        "pipeline": get_pipeline_stats(),
+        "murf_pool": get_murf_pool_stats(),
+        "speculation": get_speculation_stats(),
+        "chat_sessions": get_chat_session_stats(),
+        "session_template": get_session_template_stats(),
+        "history": get_history_stats(),
+        "response_cache": get_response_cache_stats(),
+        "tools": get_tool_stats(),
+        "gemini_clients": get_gemini_client_stats(),
+        "response_shaper": get_shaper_stats(),
+        "resilience": get_resilience_stats(),
+        "tts_cache": get_tts_cache_stats(),
+        "voices": get_voice_selector_stats(),
+        "long_form_tts": get_long_form_stats(),
+        "murf_clients": get_murf_client_stats(),
+    })
 
 # For local development
 if __name__ == "__main__":
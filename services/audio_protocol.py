@@ -0,0 +1,152 @@
+import base64
+import struct
+from typing import Tuple
+
+# Transports the streaming client can ask for with ?audio_transport=...
+# "json" is the original shape: base64 audio split into audio_chunk messages.
+# "binary" sends raw audio in binary frames and keeps JSON for control events.
+AUDIO_TRANSPORT_JSON = "json"
+AUDIO_TRANSPORT_BINARY = "binary"
+
+# Binary frame header, network byte order:
+#   version (u8) | kind (u8) | turn_id (u32) | seq (u32)
+AUDIO_FRAME_VERSION = 1
+FRAME_KIND_AUDIO = 1
+AUDIO_FRAME_HEADER = struct.Struct("!BBII")
+
+# Raw audio bytes per binary frame
+AUDIO_FRAME_PAYLOAD_BYTES = 16 * 1024
+
+
+def pack_audio_frame(turn_id: int, seq: int, payload: bytes) -> bytes:
+    """Prefix a chunk of audio with the binary frame header."""
+    return AUDIO_FRAME_HEADER.pack(AUDIO_FRAME_VERSION, FRAME_KIND_AUDIO, turn_id or 0, seq) + payload
+
+
+def unpack_audio_frame(frame: bytes) -> Tuple[int, int, bytes]:
+    """Split a binary frame into (turn_id, seq, payload)."""
+    version, kind, turn_id, seq = AUDIO_FRAME_HEADER.unpack_from(frame)
+    if version != AUDIO_FRAME_VERSION or kind != FRAME_KIND_AUDIO:
+        raise ValueError(f"Unsupported audio frame (version={version}, kind={kind})")
+    return turn_id, seq, frame[AUDIO_FRAME_HEADER.size:]
+
+
+class Base64ChunkEncoder:
+    """
+    Base64-encodes a byte stream in pieces that concatenate into one valid string.
+
+    Only whole 3-byte groups are encoded per call, so no piece but the last
+    carries padding; the legacy client joins the pieces before decoding.
+    """
+
+    def __init__(self):
+        self._pending = b""
+
+    def encode(self, data: bytes) -> str:
+        data = self._pending + data
+        cut = len(data) - len(data) % 3
+        self._pending = data[cut:]
+        return base64.b64encode(data[:cut]).decode("ascii")
+
+    def flush(self) -> str:
+        tail, self._pending = self._pending, b""
+        return base64.b64encode(tail).decode("ascii") if tail else ""
+
+
+class WavStreamNormalizer:
+    """
+    Keeps a stream of Murf WAV chunks playable as a single WAV file.
+
+    Murf starts every synthesized segment with its own RIFF header, so a
+    multi-sentence context would otherwise carry headers mid-stream that play
+    as clicks. The first header is passed through and later ones are cut
+    off, leaving only their PCM data. The client rewrites the length fields
+    once the whole stream has arrived.
+    """
+
+    def __init__(self):
+        self.header_seen = False
+        self.headers_stripped = 0
+
+    def feed(self, chunk: bytes) -> bytes:
+        if chunk[:4] != b"RIFF" or chunk[8:12] != b"WAVE":
+            return chunk
+        if not self.header_seen:
+            self.header_seen = True
+            return chunk
+        self.headers_stripped += 1
+        return chunk[_wav_data_offset(chunk):]
+
+
+def _wav_data_offset(chunk: bytes) -> int:
+    """Offset of the PCM samples after a RIFF header, walking the sub-chunks."""
+    offset = 12
+    while offset + 8 <= len(chunk):
+        chunk_id = chunk[offset:offset + 4]
+        chunk_size = struct.unpack_from("<I", chunk, offset + 4)[0]
+        if chunk_id == b"data":
+            return offset + 8
+        offset += 8 + chunk_size + (chunk_size & 1)
+    # No data sub-chunk in this piece: it was all header
+    return len(chunk)
+
+
+def wav_with_lengths(audio: bytes) -> bytes:
+    """
+    A complete WAV stream whose RIFF and data lengths match its size. The
+    header at the front of a joined stream only describes the first piece.
+    """
+    if audio[:4] != b"RIFF" or audio[8:12] != b"WAVE":
+        return audio
+    offset = _wav_data_offset(audio)
+    if audio[offset - 8:offset - 4] != b"data":
+        return audio
+    fixed = bytearray(audio)
+    struct.pack_into("<I", fixed, 4, len(audio) - 8)
+    struct.pack_into("<I", fixed, offset - 4, len(audio) - offset)
+    return bytes(fixed)
+
+
+# MPEG audio layer III bitrates (kbps) by index, and sample rates by version
+_MP3_BITRATES = {
+    "mpeg1": (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    "mpeg2": (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def mp3_frames(clip: bytes) -> bytes:
+    """
+    The audio frames of an MP3 clip, without its ID3 tags or Xing/Info frame.
+
+    Separately synthesized clips stripped this way concatenate into one valid
+    MP3: a tag mid-stream plays as noise, and the Xing/Info frame of a clip
+    states only that clip's length, which would end playback early.
+    """
+    start, end = 0, len(clip)
+    if clip[:3] == b"ID3" and len(clip) >= 10:
+        size = (clip[6] << 21) | (clip[7] << 14) | (clip[8] << 7) | clip[9]
+        # Plus the footer, when the flags say there is one
+        start = 10 + size + (10 if clip[5] & 0x10 else 0)
+    if end - start >= 128 and clip[end - 128:end - 125] == b"TAG":
+        end -= 128
+    frame_length = _mp3_frame_length(clip, start)
+    if frame_length and any(tag in clip[start + 4:start + 40] for tag in (b"Xing", b"Info", b"VBRI")):
+        start += frame_length
+    return clip[start:end]
+
+
+def _mp3_frame_length(clip: bytes, offset: int):
+    """Length of the layer III frame at `offset`, or None if there is no valid frame header there."""
+    if offset + 4 > len(clip) or clip[offset] != 0xFF or clip[offset + 1] & 0xE0 != 0xE0:
+        return None
+    version = (clip[offset + 1] >> 3) & 0x3
+    layer = (clip[offset + 1] >> 1) & 0x3
+    bitrate_index = clip[offset + 2] >> 4
+    rate_index = (clip[offset + 2] >> 2) & 0x3
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    padding = (clip[offset + 2] >> 1) & 0x1
+    bitrate = _MP3_BITRATES["mpeg1" if version == 3 else "mpeg2"][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+    return (144 if version == 3 else 72) * bitrate // sample_rate + padding
@@ -0,0 +1,97 @@
+import asyncio
+import collections
+from typing import Any, Callable, Dict
+
+# What to do when a put would exceed the byte budget
+POLICY_BLOCK = "block"
+POLICY_DROP_OLDEST = "drop-oldest"
+POLICY_DISCONNECT = "disconnect"
+POLICIES = (POLICY_BLOCK, POLICY_DROP_OLDEST, POLICY_DISCONNECT)
+
+
+class QueueOverflowError(Exception):
+    """Raised by a queue with the disconnect policy when its budget is exceeded."""
+
+
+class BoundedQueue:
+    """
+    Single-consumer asyncio queue bounded by the total size of its items.
+
+    `policy` decides what happens when a put would go over `max_bytes`:
+    block the producer until the consumer catches up, drop the oldest queued
+    items, or raise QueueOverflowError so the caller can hang up. An item larger
+    than the whole budget is still accepted into an empty queue, so a single
+    oversized frame can never wedge the pipeline.
+    """
+
+    def __init__(self, max_bytes: int, policy: str = POLICY_BLOCK, sizeof: Callable[[Any], int] = len):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}', expected one of {POLICIES}")
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.sizeof = sizeof
+        self._items = collections.deque()
+        self._bytes = 0
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self.stats = {
+            "queued_items": 0,
+            "queued_bytes": 0,
+            "max_depth": 0,
+            "max_queued_bytes": 0,
+            "dropped_items": 0,
+            "dropped_bytes": 0,
+            "blocked_puts": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    async def put(self, item):
+        size = self.sizeof(item)
+        while self._items and self._bytes + size > self.max_bytes:
+            if self.policy == POLICY_BLOCK:
+                self.stats["blocked_puts"] += 1
+                self._not_full.clear()
+                await self._not_full.wait()
+            elif self.policy == POLICY_DROP_OLDEST:
+                dropped = self._pop()
+                self.stats["dropped_items"] += 1
+                self.stats["dropped_bytes"] += self.sizeof(dropped)
+            else:
+                raise QueueOverflowError(f"Queue over budget ({self._bytes + size} > {self.max_bytes} bytes)")
+        self._append(item, size)
+
+    def put_unbounded(self, item):
+        """Enqueue ignoring the budget; for end-of-stream sentinels."""
+        self._append(item, self.sizeof(item))
+
+    async def get(self):
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        return self._pop()
+
+    def _append(self, item, size: int):
+        self._items.append((item, size))
+        self._bytes += size
+        self._not_empty.set()
+        self.stats["max_depth"] = max(self.stats["max_depth"], len(self._items))
+        self.stats["max_queued_bytes"] = max(self.stats["max_queued_bytes"], self._bytes)
+        self._update_gauges()
+
+    def _pop(self):
+        item, size = self._items.popleft()
+        self._bytes -= size
+        if self._bytes <= self.max_bytes:
+            self._not_full.set()
+        self._update_gauges()
+        return item
+
+    def _update_gauges(self):
+        self.stats["queued_items"] = len(self._items)
+        self.stats["queued_bytes"] = self._bytes
+
+    def get_stats(self) -> Dict:
+        return {"policy": self.policy, "max_bytes": self.max_bytes, **self.stats}
@@ -26,6 +26,14 @@ class ChatPersistenceService:
                 CREATE INDEX IF NOT EXISTS idx_session_id 
                 ON chat_sessions(session_id)
             """)
+            # LLM chat history of sessions evicted from memory, as compact JSON
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS hibernated_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    history TEXT NOT NULL,
+                    hibernated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
             conn.commit()
     
     def save_chat_turn(self, session_id: str, user_message: str, agent_response: str) -> bool:
@@ -105,5 +113,43 @@ class ChatPersistenceService:
             print(f"❌ Error clearing session history: {e}")
             return False
 
+    def hibernate_session(self, session_id: str, history: str) -> bool:
+        """Store the serialized LLM history of a session that is leaving memory."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO hibernated_sessions (session_id, history, hibernated_at)
+                    VALUES (?, ?, ?)
+                """, (session_id, history, datetime.now()))
+                conn.commit()
+                return True
+        except Exception as e:
+            print(f"❌ Error hibernating session: {e}")
+            return False
+    
+    def take_hibernated_session(self, session_id: str) -> Optional[str]:
+        """Return and remove the serialized history of a hibernated session, if any."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                row = conn.execute(
+                    "SELECT history FROM hibernated_sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute("DELETE FROM hibernated_sessions WHERE session_id = ?", (session_id,))
+                conn.commit()
+                return row[0]
+        except Exception as e:
+            print(f"❌ Error loading hibernated session: {e}")
+            return None
+    
+    def count_hibernated_sessions(self) -> int:
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                return conn.execute("SELECT COUNT(*) FROM hibernated_sessions").fetchone()[0]
+        except Exception as e:
+            print(f"❌ Error counting hibernated sessions: {e}")
+            return 0
+
 # Global instance
 chat_db = ChatPersistenceService()
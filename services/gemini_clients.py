@@ -0,0 +1,137 @@
+import os
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
+
+import google.generativeai as genai
+from google.api_core import exceptions as api_exceptions
+from google.generativeai import client as genai_client
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# API keys whose clients stay resident; the least recently used one is dropped beyond this
+GEMINI_MAX_TENANTS = int(os.getenv("GEMINI_MAX_TENANTS", 8))
+GEMINI_MODEL_NAME = "gemini-1.5-flash"
+
+gemini_client_stats = {
+    "hits": 0,
+    "misses": 0,
+    "evictions": 0,
+}
+
+
+def key_fingerprint(api_key: str) -> str:
+    """Short stable id for an API key, safe to log and to use as a dict key."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def gemini_retryable(error: BaseException) -> bool:
+    """Rate limits and server-side hiccups are worth another attempt; bad requests and keys are not."""
+    return isinstance(error, (api_exceptions.ResourceExhausted, api_exceptions.ServiceUnavailable,
+                              api_exceptions.InternalServerError, api_exceptions.DeadlineExceeded))
+
+
+class _GeminiTenant:
+    """The transports and models configured for one API key."""
+
+    def __init__(self, api_key: str):
+        # A private client manager per key: genai.configure() would rewrite the
+        # process-wide default that every other tenant's turns are using. This is
+        # private API: requirements.txt pins the version and test_gemini_clients.py
+        # fails if an upgrade moves it
+        self.manager = genai_client._ClientManager()
+        self.manager.configure(api_key=api_key)
+        self.client = self.manager.make_client("generative")
+        self.async_client = None
+        self.models: Dict[tuple, genai.GenerativeModel] = {}
+
+    def model(self, model_name: str, tools: Optional[Sequence] = None,
+              system_instruction: Optional[str] = None) -> genai.GenerativeModel:
+        if self.async_client is None and _loop_running():
+            # grpc.aio channels bind to the loop they are created on, so make it from inside the loop
+            self.async_client = self.manager.make_client("generative_async")
+            for model in self.models.values():
+                model._async_client = self.async_client
+        key = (model_name, tuple(id(tool) for tool in tools or ()), system_instruction)
+        model = self.models.get(key)
+        if model is None:
+            model = genai.GenerativeModel(model_name, tools=list(tools) if tools else None,
+                                          system_instruction=system_instruction)
+            # GenerativeModel only falls back to the global default clients when these are unset
+            model._client = self.client
+            model._async_client = self.async_client
+            self.models[key] = model
+        return model
+
+
+def _loop_running() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+class GeminiClientRegistry:
+    """
+    One set of Gemini clients and models per API key, kept warm across turns.
+
+    `model(api_key)` returns a GenerativeModel bound to that key's own gRPC
+    channels instead of the process-global configuration, so concurrent turns
+    on different keys never see each other's credentials, and a repeat turn
+    reuses the open channel instead of configuring and connecting again. At
+    most `max_tenants` keys stay resident; the least recently used is dropped.
+    Chats already holding an evicted key's model keep working until they are
+    rebound on their next turn.
+    """
+
+    def __init__(self, max_tenants: int = GEMINI_MAX_TENANTS):
+        self.max_tenants = max_tenants
+        self._tenants: "OrderedDict[str, _GeminiTenant]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def model(self, api_key: str, model_name: str = GEMINI_MODEL_NAME, tools: Optional[Sequence] = None,
+              system_instruction: Optional[str] = None) -> genai.GenerativeModel:
+        with self._lock:
+            return self._tenant(api_key).model(model_name, tools, system_instruction)
+
+    def _tenant(self, api_key: str) -> _GeminiTenant:
+        fingerprint = key_fingerprint(api_key)
+        tenant = self._tenants.get(fingerprint)
+        if tenant is not None:
+            gemini_client_stats["hits"] += 1
+            self._tenants.move_to_end(fingerprint)
+            return tenant
+        gemini_client_stats["misses"] += 1
+        tenant = self._tenants[fingerprint] = _GeminiTenant(api_key)
+        logger.info(f"Created Gemini clients for key {fingerprint}")
+        while len(self._tenants) > self.max_tenants:
+            old_fingerprint, _ = self._tenants.popitem(last=False)
+            gemini_client_stats["evictions"] += 1
+            # Not closed: a turn may still be streaming on it; the channels go with the last model
+            logger.info(f"Evicted Gemini clients for key {old_fingerprint}")
+        return tenant
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            tenants = len(self._tenants)
+            models = sum(len(tenant.models) for tenant in self._tenants.values())
+        return {
+            "tenants": tenants,
+            "max_tenants": self.max_tenants,
+            "models": models,
+            **gemini_client_stats,
+        }
+
+
+# Global instance
+gemini_clients = GeminiClientRegistry()
+
+
+def get_gemini_client_stats() -> Dict:
+    return gemini_clients.get_stats()
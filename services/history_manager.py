@@ -0,0 +1,204 @@
+import os
+import asyncio
+import logging
+import weakref
+from typing import Dict, List, Optional, Tuple
+
+from .session_store import serialize_history
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Prompt tokens a turn may spend on history (summary + recent turns); the persona is a system instruction
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 1000))
+# Recent turns always sent verbatim, budget permitting
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", 6))
+# Fold old turns in batches, so a long session costs one summary call every few turns
+HISTORY_FOLD_BATCH = int(os.getenv("HISTORY_FOLD_BATCH", 3))
+# Rough characters per token for budgeting
+CHARS_PER_TOKEN = 4
+SUMMARY_MARKER = "[Conversation so far]"
+SUMMARY_ACK = "Haan boss, I remember all that. Carry on!"
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and RAVI, a comedian voice assistant.
+Keep facts about the user, their requests, answers given and running jokes. At most 120 words, plain text.
+
+Current summary:
+{summary}
+
+New turns to fold in:
+{turns}
+
+Updated summary:"""
+
+history_stats = {
+    "turns_prepared": 0,
+    "prompt_tokens_total": 0,
+    "prompt_tokens_last": 0,
+    "prompt_tokens_max": 0,
+    "summaries": 0,
+    "summary_failures": 0,
+    "turns_folded": 0,
+    "turns_truncated": 0,
+}
+
+
+def get_history_stats() -> Dict:
+    prepared = history_stats["turns_prepared"]
+    return {
+        "token_budget": history_manager.token_budget,
+        "keep_turns": history_manager.keep_turns,
+        "fold_batch": history_manager.fold_batch,
+        **history_stats,
+        "prompt_tokens_avg": round(history_stats["prompt_tokens_total"] / prepared, 1) if prepared else 0.0,
+    }
+
+
+def estimate_tokens(history) -> int:
+    return sum(len(part) for content in serialize_history(history) for part in content["parts"]) // CHARS_PER_TOKEN
+
+
+def _is_summary(entries) -> bool:
+    compact = serialize_history(entries[:1])
+    return bool(compact) and compact[0]["role"] == "user" and compact[0]["parts"][0].startswith(SUMMARY_MARKER)
+
+
+def _split(history) -> Tuple[Optional[str], List[list]]:
+    """Split a chat history into summary text and turns (user entry + replies)."""
+    rest = history
+    summary = None
+    if _is_summary(rest):
+        summary = serialize_history(rest[:1])[0]["parts"][0][len(SUMMARY_MARKER):].strip()
+        rest = rest[2:]
+    turns = []
+    for content in rest:
+        role = content.get("role") if isinstance(content, dict) else content.role
+        if role == "user" or not turns:
+            turns.append([content])
+        else:
+            turns[-1].append(content)
+    return summary, turns
+
+
+def _summary_entries(summary: Optional[str]) -> list:
+    if not summary:
+        return []
+    return [
+        {"role": "user", "parts": [f"{SUMMARY_MARKER} {summary}"]},
+        {"role": "model", "parts": [SUMMARY_ACK]},
+    ]
+
+
+class _SummaryState:
+    __slots__ = ("task",)
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+
+
+class HistoryManager:
+    """
+    Keeps the history a chat sends with each turn inside a token budget.
+
+    `prepare(chat, api_key)` runs before a turn. The last `keep_turns` turns
+    that fit the budget stay verbatim. Once `fold_batch` older turns have piled
+    up, they are folded into a rolling summary by a background Gemini call on
+    the turn's key; the summary sits at the head of the history as a
+    user/model pair. The fold lands at the start of a later turn, so no turn
+    waits for it and no in-flight reply is rewritten. Until then the older
+    turns stay as they are. If the summary call fails, the turns it was to
+    fold are dropped instead (oldest first, keeping any earlier summary), so
+    the budget still holds.
+    """
+
+    def __init__(self, token_budget: int = HISTORY_TOKEN_BUDGET, keep_turns: int = HISTORY_KEEP_TURNS,
+                 fold_batch: int = HISTORY_FOLD_BATCH):
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.fold_batch = fold_batch
+        self._states: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+    async def prepare(self, chat, api_key: str):
+        state = self._states.setdefault(chat, _SummaryState())
+        summary, turns = _split(list(chat.history))
+
+        if state.task is not None and state.task.done():
+            task, state.task = state.task, None
+            if not task.cancelled() and task.exception() is None:
+                summary, folded = task.result()
+                turns = turns[folded:]
+                chat.history = _summary_entries(summary) + [c for turn in turns for c in turn]
+            else:
+                turns = self._truncate(chat, summary, turns)
+
+        if state.task is None:
+            keep = self._recent_turns(summary, turns)
+            to_fold = turns[:len(turns) - keep]
+            if len(to_fold) >= self.fold_batch:
+                state.task = asyncio.create_task(self._summarize(summary, to_fold, api_key))
+
+        tokens = estimate_tokens(chat.history)
+        history_stats["turns_prepared"] += 1
+        history_stats["prompt_tokens_total"] += tokens
+        history_stats["prompt_tokens_last"] = tokens
+        history_stats["prompt_tokens_max"] = max(history_stats["prompt_tokens_max"], tokens)
+
+    def preview(self, chat) -> list:
+        """
+        The history a turn on `chat` would send, without touching the chat or
+        the stats: the summary and the recent turns that fit the budget. For
+        work that must leave the session alone, such as speculation.
+        """
+        summary, turns = _split(list(chat.history))
+        turns = turns[len(turns) - self._recent_turns(summary, turns):]
+        return _summary_entries(summary) + [c for turn in turns for c in turn]
+
+    def _truncate(self, chat, summary: Optional[str], turns: List[list]) -> List[list]:
+        """Drop the oldest turns that no longer fit; the fallback when they could not be summarized."""
+        dropped = len(turns) - self._recent_turns(summary, turns)
+        if not dropped:
+            return turns
+        turns = turns[dropped:]
+        chat.history = _summary_entries(summary) + [c for turn in turns for c in turn]
+        history_stats["turns_truncated"] += dropped
+        logger.warning(f"Dropped the {dropped} oldest turns to stay within the history budget")
+        return turns
+
+    def _recent_turns(self, summary, turns) -> int:
+        """How many of the latest turns fit verbatim; always at least the last one."""
+        used = estimate_tokens(_summary_entries(summary))
+        keep = 0
+        for turn in reversed(turns[-self.keep_turns:] if self.keep_turns else []):
+            used += estimate_tokens(turn)
+            if keep and used > self.token_budget:
+                break
+            keep += 1
+        return keep
+
+    async def _summarize(self, summary: Optional[str], turns: List[list], api_key: str) -> Tuple[str, int]:
+        from .gemini_clients import gemini_clients, gemini_retryable
+        from .resilience import get_provider
+
+        lines = []
+        for content in serialize_history([c for turn in turns for c in turn]):
+            speaker = "User" if content["role"] == "user" else "RAVI"
+            lines.append(f"{speaker}: {' '.join(content['parts'])}")
+        prompt = SUMMARY_PROMPT.format(summary=summary or "(none yet)", turns="\n".join(lines))
+        try:
+            model = gemini_clients.model(api_key)
+            # Background work: retried within the shared budget, never hedged
+            response = await get_provider("gemini").call(
+                lambda: model.generate_content_async(prompt), retryable=gemini_retryable, hedge=False)
+            new_summary = response.text.strip()
+        except Exception as e:
+            history_stats["summary_failures"] += 1
+            logger.warning(f"History summarization failed, the oldest turns will be dropped instead: {e}")
+            raise
+        history_stats["summaries"] += 1
+        history_stats["turns_folded"] += len(turns)
+        logger.info(f"Folded {len(turns)} turns into the conversation summary ({len(new_summary)} chars)")
+        return new_summary, len(turns)
+
+
+# Global instance
+history_manager = HistoryManager()
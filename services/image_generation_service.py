@@ -1,4 +1,5 @@
 import os
+import asyncio
 import logging
 import requests
 import base64
@@ -7,10 +8,15 @@ from PIL import Image
 import io
 import time
 
+from .resilience import TransientError, get_provider
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Hugging Face answers worth another attempt: rate limited, model loading, gateway trouble
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
 class ImageGenerationService:
     def __init__(self):
         # Using FREE Hugging Face Inference API - no authentication needed
@@ -49,13 +55,23 @@ class ImageGenerationService:
                 }
             }
             
-            # Make request to Hugging Face
-            response = requests.post(
-                self.base_url,
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
+            async def post():
+                # requests blocks, so keep it off the event loop
+                response = await asyncio.to_thread(
+                    requests.post,
+                    self.base_url,
+                    headers=headers,
+                    json=payload,
+                    timeout=60
+                )
+                if response.status_code in RETRYABLE_STATUSES:
+                    raise TransientError(f"Hugging Face returned {response.status_code} (model loading or busy)",
+                                         retry_after=self._estimated_time(response))
+                return response
+            
+            # Make request to Hugging Face; 503 while the model loads is retried with backoff
+            response = await get_provider("huggingface").call(
+                post, retryable=lambda e: isinstance(e, (requests.ConnectionError, requests.Timeout)))
             
             if response.status_code == 200:
                 # Save the image
@@ -66,8 +82,7 @@ class ImageGenerationService:
                 os.makedirs("static/generated_images", exist_ok=True)
                 filepath = f"static/generated_images/{filename}"
                 
-                with open(filepath, 'wb') as f:
-                    f.write(image_data)
+                await asyncio.to_thread(self._write_image, filepath, image_data)
                 
                 logger.info(f"FREE image generated successfully: {filepath}")
                 
@@ -79,11 +94,6 @@ class ImageGenerationService:
                     'model': 'Stable Diffusion XL (FREE)',
                     'cost': '₹0 - Completely FREE! 🎉'
                 }
-            elif response.status_code == 503:
-                # Model is loading, wait and retry
-                logger.info("Model is loading, waiting 20 seconds...")
-                await self._wait_for_model_load()
-                return await self.generate_image(prompt)  # Retry once
             else:
                 logger.error(f"Error from Hugging Face API: {response.status_code} - {response.text}")
                 return {
@@ -98,10 +108,18 @@ class ImageGenerationService:
                 'error': str(e)
             }
     
-    async def _wait_for_model_load(self):
-        """Wait for Hugging Face model to load"""
-        import asyncio
-        await asyncio.sleep(20)  # Wait 20 seconds for model to load
+    @staticmethod
+    def _write_image(filepath: str, image_data: bytes):
+        with open(filepath, 'wb') as f:
+            f.write(image_data)
+    
+    @staticmethod
+    def _estimated_time(response) -> Optional[float]:
+        """Seconds Hugging Face expects the model to need before it can serve, if it says."""
+        try:
+            return float(response.json().get("estimated_time"))
+        except Exception:
+            return None
     
     def format_image_response_for_comedy(self, image_data: Dict, local_path: str = None) -> str:
         """
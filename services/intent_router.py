@@ -0,0 +1,118 @@
+import re
+from typing import Dict, List
+
+# Intents that route a turn to a tool before the LLM answers
+INTENT_SEARCH = "search"
+INTENT_IMAGE = "image"
+# No tool needed: the comedian just talks
+INTENT_CHAT = "chat"
+
+# Trigger phrases per intent. Phrases match anywhere in the transcript, as the
+# keyword scans they replace did, so inflections still fire ("updates",
+# "drawing", "designs", "gods").
+INTENT_TRIGGERS: Dict[str, List[str]] = {
+    INTENT_SEARCH: [
+        "latest", "current", "news", "weather", "today", "now", "happening", "recent", "update",
+        "holiday", "holidays", "districts", "list of", "current status",
+    ],
+    INTENT_IMAGE: [
+        "create image", "generate image", "generate me", "draw", "make picture", "show me", "create art",
+        "paint", "design", "how does", "what does", "look like", "ganesh", "ganesha", "chaturthi",
+        "vinayaka", "lord", "god", "deity", "image of", "picture of",
+    ],
+}
+
+# Ties in score go to the intent listed first. Image turns are never cached and
+# search answers only briefly, so a tied turn errs towards the shorter cache life.
+INTENT_PRIORITY: List[str] = [INTENT_IMAGE, INTENT_SEARCH]
+
+
+def _trie_pattern(phrases) -> str:
+    """Regex source matching any of `phrases`, factored by common prefix."""
+    trie: Dict = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # A phrase ends here but longer ones continue: the rest is optional
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class IntentMatch:
+    """One intent found in a transcript: its score and the phrases that triggered it."""
+
+    __slots__ = ("intent", "score", "phrases")
+
+    def __init__(self, intent: str):
+        self.intent = intent
+        self.score = 0.0
+        self.phrases: List[str] = []
+
+    def __repr__(self):
+        return f"IntentMatch({self.intent!r}, score={self.score}, phrases={self.phrases})"
+
+
+class IntentRouter:
+    """
+    Finds every intent in a transcript in one pass.
+
+    All trigger phrases are compiled once into a single regex shaped like a
+    character trie, so the engine walks shared prefixes once instead of trying
+    every phrase at every position; greedy optional suffixes make the longest
+    phrase win ("current status" over "current"). The text is lowercased once
+    and the pattern is case-sensitive, which CPython matches faster than
+    IGNORECASE, and only the phrase itself is captured, so `findall` hands back
+    exactly the strings to look up. Each distinct phrase adds its word count to
+    its intent's score: multi-word phrases are more specific.
+    """
+
+    def __init__(self, triggers: Dict[str, List[str]]):
+        self._intent_of: Dict[str, str] = {}
+        for intent, phrases in triggers.items():
+            for phrase in phrases:
+                self._intent_of[phrase.lower()] = intent
+        self._words = {phrase: len(phrase.split()) for phrase in self._intent_of}
+        # Zero-width, so a phrase inside or overlapping another one is still found; the
+        # leading first-character class lets the engine skip positions no phrase starts at
+        first_chars = re.escape("".join(sorted({phrase[0] for phrase in self._intent_of})))
+        self._pattern = re.compile(rf"(?=[{first_chars}])(?=({_trie_pattern(self._intent_of)}))")
+
+    def match(self, text: str) -> Dict[str, IntentMatch]:
+        matches: Dict[str, IntentMatch] = {}
+        for phrase in self._pattern.findall(text.lower()):
+            intent = self._intent_of[phrase]
+            match = matches.get(intent)
+            if match is None:
+                match = matches[intent] = IntentMatch(intent)
+            if phrase not in match.phrases:
+                match.phrases.append(phrase)
+                match.score += self._words[phrase]
+        return matches
+
+    def primary_intent(self, text: str) -> str:
+        return primary_intent(self.match(text))
+
+
+def primary_intent(matches: Dict[str, IntentMatch]) -> str:
+    """The strongest matched intent, or INTENT_CHAT when no tool is triggered."""
+    if not matches:
+        return INTENT_CHAT
+    rank = {intent: index for index, intent in enumerate(INTENT_PRIORITY)}
+    return min(matches.values(), key=lambda match: (-match.score, rank.get(match.intent, len(rank)))).intent
+
+
+# Global instance
+intent_router = IntentRouter(INTENT_TRIGGERS)
+
+
+def route_intents(text: str) -> Dict[str, IntentMatch]:
+    return intent_router.match(text)
@@ -1,11 +1,21 @@
 import os
+import time
+import hashlib
 import google.generativeai as genai
+from collections import OrderedDict
 from fastapi import HTTPException
-from typing import Dict, List
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import asyncio
 
-# Don't initialize with env variable anymore
-chat_sessions: Dict[str, List[Dict[str, str]]] = {}
+from .session_store import ChatSessionStore
+from .gemini_clients import gemini_clients, gemini_retryable
+from .history_manager import history_manager
+from .intent_router import INTENT_CHAT, INTENT_IMAGE, INTENT_SEARCH, primary_intent, route_intents
+from .speculative_llm import normalize_transcript
+from .tool_orchestrator import run_tools
+from .response_shaper import GENERATION_CONFIG, ResponseShaper, shape_stream
+from .session_template import SessionTemplate
+from .resilience import CircuitOpenError, get_provider
 
 def get_runtime_api_key(service: str) -> str:
     """Get API key from runtime storage only, NO fallback to environment."""
@@ -121,98 +131,60 @@ search_web_function = genai.protos.FunctionDeclaration(
 )
 
 web_search_tool = genai.protos.Tool(function_declarations=[search_web_function])
+COMEDIAN_TOOLS = (web_search_tool,)
+
+# The reply chats used to be primed with after the persona; kept only to estimate the old prompt size
+LEGACY_GREETING = "Arre yaar! I'm RAVI, your comedy AI assistant! Ready to make you laugh while solving your problems. What's up, boss? 😄"
+
+# The persona rides along as the system instruction; every session is a clone of this template
+COMEDIAN_TEMPLATE = SessionTemplate(COMEDIAN_SYSTEM_PROMPT, tools=COMEDIAN_TOOLS, legacy_greeting=LEGACY_GREETING)
+
+def comedian_model(api_key: str):
+    """The comedian's Gemini model on this API key's own clients."""
+    return COMEDIAN_TEMPLATE.model(api_key)
+
+def _start_comedian_chat(history: List[Dict] | None = None, api_key: str | None = None):
+    """Start a Gemini chat from the comedian template, or resume a saved history on it."""
+    return COMEDIAN_TEMPLATE.start_chat(api_key or get_runtime_api_key('gemini'), history)
+
+# Live chat sessions, bounded; idle ones hibernate to chat_history.db
+chat_sessions = ChatSessionStore(_start_comedian_chat)
+
+async def get_chat_session(session_id: str | None, api_key: str, pin: bool = False):
+    """
+    Return the session's chat, creating or rehydrating it; without a session id the chat is throwaway.
+
+    The chat is rebound to `api_key`'s model every turn, so a session never
+    keeps talking on a key that has since been replaced. A turn that writes
+    to the history passes `pin` and calls `release_chat_session` when done.
+    """
+    if not session_id:
+        return _start_comedian_chat(api_key=api_key)
+    chat = await chat_sessions.get(session_id, pin=pin)
+    chat.model = comedian_model(api_key)
+    return chat
+
+def release_chat_session(session_id: str | None):
+    """Unpin a session pinned by `get_chat_session(..., pin=True)`."""
+    if session_id:
+        chat_sessions.release(session_id)
+
+def get_chat_session_stats() -> Dict:
+    return chat_sessions.get_stats()
+
+def get_session_template_stats() -> Dict:
+    return COMEDIAN_TEMPLATE.get_stats()
 
 
 async def query_llm(session_id: str, query: str) -> str:
-    # Get API key from runtime storage only
-    api_key = get_runtime_api_key('openai')  # Using OpenAI key for Gemini
-    if not api_key:
-        raise HTTPException(status_code=500, detail="OpenAI API key not configured. Please configure it in the API settings.")
-    
-    # Configure Gemini with the runtime API key
-    genai.configure(api_key=api_key)
+    """Answer a typed or already transcribed query: the turn pipeline's LLM stage on its own."""
+    from .turn_pipeline import Turn, run_text_turn
     try:
-        if session_id not in chat_sessions:
-            # Initialize chat with comedian persona and function calling
-            model = genai.GenerativeModel(
-                'gemini-1.5-flash',
-                tools=[web_search_tool]
-            )
-            chat_sessions[session_id] = model.start_chat(history=[
-                {
-                    "role": "user", 
-                    "parts": [COMEDIAN_SYSTEM_PROMPT]
-                },
-                {
-                    "role": "model", 
-                    "parts": ["Arre yaar! I'm RAVI, your comedy AI assistant! Ready to make you laugh while solving your problems. What's up, boss? 😄"]
-                }
-            ])
-        
-        chat = chat_sessions[session_id]
-        
-        # Check if the query requires web search
-        search_keywords = ["latest", "current", "news", "weather", "today", "now", "happening", "recent", "update", "holiday", "holidays", "districts", "list of", "current status"]
-        needs_search = any(keyword in query.lower() for keyword in search_keywords)
-        
-        # Check if the query requires image generation
-        image_keywords = ["create image", "generate image", "generate me", "draw", "make picture", "show me", "create art", "paint", "design", "how does", "what does", "look like", "ganesh", "ganesha", "chaturthi", "vinayaka", "lord", "god", "deity", "image of", "picture of"]
-        needs_image = any(keyword in query.lower() for keyword in image_keywords)
-        
-        print(f"🔍 Query analysis: '{query}'")
-        print(f"🔍 Needs search: {needs_search}")
-        print(f"🎨 Needs image: {needs_image}")
-        
-        if needs_image:
-            print(f"🎨 TRIGGERING IMAGE GENERATION for: '{query}'")
-        
-        if needs_search:
-            # Force web search for these queries
-            from .web_search_service import search_and_format_for_comedy
-            search_result = await search_and_format_for_comedy(query)
-            
-            # Create a prompt that includes the search result
-            search_prompt = f"User asked: '{query}'\n\nI searched the web and found: {search_result}\n\nNow give a short, funny response that includes this real information while maintaining your comedy style."
-            
-            response = chat.send_message(search_prompt)
-            response_text = response.text.strip()
-        elif needs_image:
-            # Force image generation for these queries
-            from .image_generation_service import generate_and_format_for_comedy
-            comedy_response, image_path = await generate_and_format_for_comedy(query)
-            
-            # Create a prompt that includes the image generation result
-            if image_path:
-                image_prompt = f"User asked: '{query}'\n\nI created an image for them: {comedy_response}\n\nImage saved at: {image_path}\n\nNow give a short, funny response about creating this image while maintaining your comedy style. Mention that they can see the image in the UI."
-            else:
-                image_prompt = f"User asked: '{query}'\n\nI tried to create an image but: {comedy_response}\n\nNow give a short, funny response about this while maintaining your comedy style."
-            
-            response = chat.send_message(image_prompt)
-            response_text = response.text.strip()
-        else:
-            # Regular response without search or image generation
-            response = chat.send_message(query)
-            response_text = response.text.strip()
-        
-        # Post-process response to ensure it's concise for comedy
-        if len(response_text) > 150:
-            # Find the first sentence or natural break point
-            sentences = response_text.split('. ')
-            if len(sentences) > 1:
-                response_text = sentences[0] + '. ' + sentences[1]
-            else:
-                response_text = response_text[:120]
-            
-            # Add a funny ending if it was truncated
-            comedy_endings = [
-                "... bas yaar, enough lecture! 😄",
-                "... you get it, na? Moving on!",
-                "... arre, I'm talking too much like my mother! 😅"
-            ]
-            import random
-            response_text += random.choice(comedy_endings)
-        
-        return response_text
+        return await run_text_turn(Turn(query, session_id=session_id))
+    except HTTPException:
+        raise
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Could not get LLM response: {e}")
 
@@ -226,11 +198,8 @@ def stream_llm_response(query: str):
         print("❌ Gemini API key not configured")
         return
     
-    # Configure Gemini with runtime API key
-    genai.configure(api_key=api_key)
-    
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = gemini_clients.model(api_key)
         stream = model.generate_content(query, stream=True)
         print("--- Streaming LLM response ---")
         full_response = ""
@@ -244,258 +213,246 @@ def stream_llm_response(query: str):
         print(f"Error streaming LLM response: {e}")
         return None
 
-# Day 21: Stream LLM response to Murf WebSocket and send audio to client
-async def stream_llm_to_murf_and_client(query: str, websocket=None, session_id: str | None = None):
+# Opt-in cache of whole answers (text and synthesized audio) for repeated queries
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 64_000_000))
+# Seconds an answer stays fresh, per intent; 0 never caches. Search answers go
+# stale fast, image turns depend on a freshly generated picture.
+RESPONSE_CACHE_TTLS = {
+    INTENT_CHAT: int(os.getenv("RESPONSE_CACHE_TTL_CHAT", 3600)),
+    INTENT_SEARCH: int(os.getenv("RESPONSE_CACHE_TTL_SEARCH", 120)),
+    INTENT_IMAGE: 0,
+}
+STREAM_VOICE_ID = "en-IN-rohan"
+
+
+class ResponseCache:
     """
-    Streams the LLM response, sends it to Murf WebSocket for TTS conversion,
-    and streams the base64 audio to the client via WebSocket.
+    LRU cache of answers keyed on normalized transcript, intent and persona.
+
+    An entry holds the response text and the speech Murf made for it: the
+    audio bytes for the streaming path and the clip URL for /agent/chat, so a
+    hit skips both providers. Entries expire after their intent's TTL; the
+    least recently used ones are evicted once `max_bytes` is exceeded.
     """
-    # Use runtime API key instead of environment variable
-    gemini_api_key = get_runtime_api_key('gemini')
-    if not gemini_api_key:
-        print("❌ Gemini API key not configured - please configure it in the frontend")
-        return
 
-    # Check WebSocket connection state early
-    websocket_available = False
-    if websocket:
-        try:
-            websocket_available = not websocket.client_state.name == 'DISCONNECTED'
-            if websocket_available:
-                print("🔗 WebSocket connection is active")
-            else:
-                print("⚠️ WebSocket is disconnected")
-        except Exception as e:
-            print(f"❌ Error checking WebSocket state: {e}")
-            websocket_available = False
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES, ttls: Dict[str, int] = RESPONSE_CACHE_TTLS):
+        self.max_bytes = max_bytes
+        self.ttls = ttls
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evicted": 0}
+
+    @staticmethod
+    def key(query: str, intent: str, persona: str) -> tuple:
+        return (normalize_transcript(query), intent, persona)
+
+    def cacheable(self, intent: str) -> bool:
+        return self.ttls.get(intent, 0) > 0
+
+    def get(self, key: tuple) -> Optional[Tuple[str, Optional[bytes], Optional[str]]]:
+        """Return (text, audio, audio_url) for a fresh entry; either audio form may be None."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            self._drop(key)
+            self.stats["expired"] += 1
+            entry = None
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry[1], entry[2], entry[3]
+
+    def put(self, key: tuple, text: str, audio: Optional[bytes] = None, audio_url: Optional[str] = None):
+        ttl = self.ttls.get(key[1], 0)
+        if ttl <= 0:
+            return
+        expires = time.monotonic() + ttl
+        existing = self._entries.get(key)
+        if existing is not None and existing[1] == text:
+            # The same answer spoken by the other endpoint: keep both forms, and the original expiry
+            expires = existing[0]
+            audio = audio if audio is not None else existing[2]
+            audio_url = audio_url or existing[3]
+        elif existing is not None and audio is None and not audio_url and (existing[2] is not None or existing[3]):
+            # Keep the speech an earlier turn stored; the text-only path has nothing better
+            return
+        if key in self._entries:
+            self._drop(key)
+        entry = (expires, text, audio, audio_url)
+        self._entries[key] = entry
+        self._bytes += self._sizeof(entry)
+        self.stats["stores"] += 1
+        while self._bytes > self.max_bytes and self._entries:
+            self._drop(next(iter(self._entries)))
+            self.stats["evicted"] += 1
+
+    def _drop(self, key: tuple):
+        self._bytes -= self._sizeof(self._entries.pop(key))
+
+    @staticmethod
+    def _sizeof(entry: tuple) -> int:
+        return len(entry[1].encode("utf-8")) + (len(entry[2]) if entry[2] else 0) + len(entry[3] or "")
+
+    def get_stats(self) -> Dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "enabled": RESPONSE_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            **self.stats,
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
+
+
+# The persona is part of every key, so editing the prompt or voice never serves stale jokes
+PERSONA_KEY = hashlib.sha1(f"{COMEDIAN_SYSTEM_PROMPT}|{STREAM_VOICE_ID}".encode("utf-8")).hexdigest()[:12]
 
+response_cache = ResponseCache()
+
+def get_response_cache_stats() -> Dict:
+    return response_cache.get_stats()
+
+async def _iterate_stream_text(stream):
+    """Yield the text of an async Gemini stream (`send_message_async(..., stream=True)`)."""
     try:
-        from .murf_websocket_service import send_to_murf_websocket
-        import json
-        import time
-        import random
-        import asyncio
-        from google.api_core.exceptions import ResourceExhausted
-
-        print(f"🤖 Querying LLM with: '{query}'")
-        genai.configure(api_key=gemini_api_key)
-
-        # Select chat session (stateful) if session_id is provided
-        if session_id:
-            if session_id not in chat_sessions:
-                # Initialize chat with comedian persona for streaming too
-                model = genai.GenerativeModel('gemini-1.5-flash', tools=[web_search_tool])
-                chat_sessions[session_id] = model.start_chat(history=[
-                    {
-                        "role": "user", 
-                        "parts": [COMEDIAN_SYSTEM_PROMPT]
-                    },
-                    {
-                        "role": "model", 
-                        "parts": ["Arre yaar! I'm RAVI, your comedy AI assistant! Ready to make you laugh while solving your problems. What's up, boss? 😄"]
-                    }
-                ])
-            chat = chat_sessions[session_id]
-        else:
-            # For non-session based streaming, still use comedian persona
-            model = genai.GenerativeModel('gemini-1.5-flash', tools=[web_search_tool])
-            chat = model.start_chat(history=[
-                {
-                    "role": "user", 
-                    "parts": [COMEDIAN_SYSTEM_PROMPT]
-                },
-                {
-                    "role": "model", 
-                    "parts": ["Arre yaar! I'm RAVI, your comedy AI assistant! Ready to make you laugh while solving your problems. What's up, boss? 😄"]
-                }
-            ])
-
-        # Retry on 429 rate limits with simple exponential backoff
-        max_retries = 3
-        backoff_base = 2
-        full_response = ""
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+    finally:
+        # Abandoned midway (reply budget spent, barge-in): let go of the gRPC stream
+        iterator = getattr(stream, "_iterator", None)
+        if hasattr(iterator, "aclose"):
+            try:
+                await iterator.aclose()
+            except Exception:
+                pass
+
+async def _send_turn(chat, history: list, prompt: str, on_retry=None):
+    """
+    Send a comedian turn through the Gemini resilience layer and return the
+    stream once its first chunk is in. Every attempt, retries and hedges
+    alike, runs on its own fork of `history`, so a failed or losing attempt
+    leaves nothing behind in the session's chat.
+    """
+    def attempt():
+        fork = chat.model.start_chat(history=history)
+        return fork.send_message_async(prompt, stream=True, generation_config=GENERATION_CONFIG)
+    return await get_provider("gemini").call(attempt, retryable=gemini_retryable, on_retry=on_retry)
+
+def _exchange(prompt: str, reply: str) -> list:
+    """A turn as the user heard it, for the chat history."""
+    return [{"role": "user", "parts": [prompt]}, {"role": "model", "parts": [reply]}]
+
+def needs_tools(query: str) -> bool:
+    """True if a turn for this query would call search or image generation."""
+    intents = route_intents(query)
+    return INTENT_SEARCH in intents or INTENT_IMAGE in intents
+
+# LLM stage of the turn pipeline (services/turn_pipeline.py), shared by /agent/chat and the streaming WebSocket
+async def reply_stream(turn, transcripts: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Yield the comedian's reply to `transcripts` as Gemini streams it, held to
+    the reply budget. Cache lookups, search and image tools, speculation,
+    retries and the chat history all happen here, once for both endpoints.
+
+    The final reply lands on `turn.reply`. A cached answer sets `turn.cached`,
+    `turn.cached_audio` (when the turn's speech stage can replay audio) and
+    `turn.cached_audio_url`; `turn.cache_key` says where the answer is or may
+    be cached. If the
+    stage is cancelled or closed early (barge-in), the chat history is rolled
+    back so the abandoned turn leaves no trace in the session.
+    """
+    turn.query = " ".join([text async for text in transcripts]).strip()
+    api_key = get_runtime_api_key('gemini')
+    if not api_key:
+        raise HTTPException(status_code=500, detail="Gemini API key not configured. Please configure it in the API settings.")
+
+    print(f"🤖 Querying LLM with: '{turn.query}'")
+    # The chat runs on this key's own Gemini clients, never the process-global configuration
+    chat = await get_chat_session(turn.session_id, api_key, pin=True)
+    try:
+        # Keep the history this turn resends within the token budget
+        await history_manager.prepare(chat, api_key)
+        # Snapshot so a cancelled turn can be rolled back out of the session
+        history_before_turn = list(chat.history)
 
         # Check if the query requires web search or image generation
-        search_keywords = ["latest", "current", "news", "weather", "today", "now", "happening", "recent", "update", "holiday", "holidays", "districts", "list of", "current status"]
-        needs_search = any(keyword in query.lower() for keyword in search_keywords)
-        
-        image_keywords = ["create image", "generate image", "generate me", "draw", "make picture", "show me", "create art", "paint", "design", "how does", "what does", "look like", "ganesh", "ganesha", "chaturthi", "vinayaka", "lord", "god", "deity", "image of", "picture of"]
-        needs_image = any(keyword in query.lower() for keyword in image_keywords)
+        intents = route_intents(turn.query)
+        needs_search = INTENT_SEARCH in intents
+        needs_image = INTENT_IMAGE in intents
 
-        print(f"🔍 [STREAMING] Query analysis: '{query}'")
-        print(f"🔍 [STREAMING] Needs search: {needs_search}")
-        print(f"🎨 [STREAMING] Needs image: {needs_image}")
-        
-        if needs_image:
-            print(f"🎨 [STREAMING] TRIGGERING IMAGE GENERATION for: '{query}'")
+        print(f"🔍 Query analysis: '{turn.query}'")
+        print(f"🔍 Needs search: {needs_search}")
+        print(f"🎨 Needs image: {needs_image}")
 
-        for attempt in range(max_retries):
+        if needs_image:
+            print(f"🎨 TRIGGERING IMAGE GENERATION for: '{turn.query}'")
+
+        # A repeated query can be answered from the cache without Gemini (or, with audio, Murf)
+        cache_key = ResponseCache.key(turn.query, primary_intent(intents), PERSONA_KEY)
+        if RESPONSE_CACHE_ENABLED and response_cache.cacheable(cache_key[1]):
+            cached = response_cache.get(cache_key)
+            if cached is not None and (cached[1] or not turn.wants_audio):
+                print(f"⚡ Response cache hit for '{turn.query}'")
+                if turn.speculation is not None:
+                    await turn.speculation.discard("unused: cache hit")
+                turn.reply, turn.cached = cached[0], True
+                turn.cached_audio = cached[1] if turn.wants_audio else None
+                turn.cached_audio_url, turn.cache_key = cached[2], cache_key
+                chat.history = history_before_turn + _exchange(turn.query, turn.reply)
+                yield turn.reply
+                return
+            turn.cache_key = cache_key
+
+        tools = None
+        try:
+            # Search and image generation run side by side, once per turn, before the LLM call
+            if needs_search or needs_image:
+                if turn.speculation is not None:
+                    # Guessed without the search or image results, so it cannot answer this turn
+                    await turn.speculation.discard("unused: tools")
+                tools = await run_tools(turn.query, search=needs_search, image=needs_image, on_image=turn.on_image)
+            # Search and image results, merged into one prompt, or the query itself
+            prompt = tools.build_prompt() if tools is not None else turn.query
+
+            shaper = ResponseShaper()
             try:
-                # Send retry toast to client if this is a retry attempt
-                if attempt > 0 and websocket:
-                    retry_message = {
-                        "type": "retry_toast",
-                        "message": f"Rate limited. Retrying in {backoff_base ** attempt:.1f}s... (attempt {attempt + 1}/{max_retries})",
-                        "attempt": attempt + 1,
-                        "max_retries": max_retries,
-                        "timestamp": time.time()
-                    }
-                    await websocket.send_text(json.dumps(retry_message))
-
-                if needs_search:
-                    # Force web search for these queries
-                    print(f"🔍 Search triggered for query: '{query}'")
-                    
-                    from .web_search_service import search_and_format_for_comedy
-                    search_result = await search_and_format_for_comedy(query)
-                    
-                    # Create a prompt that includes the search result
-                    search_prompt = f"User asked: '{query}'\n\nI searched the web and found: {search_result}\n\nNow give a short, funny response that includes this real information while maintaining your comedy style."
-                    
-                    stream = chat.send_message(search_prompt, stream=True)
-                    print("--- Streaming LLM response with search results ---")
-                    full_response = ""
-                    for chunk in stream:
-                        if chunk.text:
-                            print(chunk.text, end="", flush=True)
-                            full_response += chunk.text
-                elif needs_image:
-                    # Force image generation for these queries
-                    print(f"🎨 Image generation triggered for query: '{query}'")
-                    
-                    from .image_generation_service import generate_and_format_for_comedy
-                    comedy_response, image_path = await generate_and_format_for_comedy(query)
-                    
-                    # Send image info to client if websocket is available
-                    if websocket and image_path:
-                        # The image_path might contain the full path, so we need to handle it properly
-                        if image_path.startswith('/'):
-                            # It's already a URL path
-                            image_url = image_path
-                        elif image_path.startswith('static/'):
-                            # It's a file path, convert to URL
-                            image_url = f"/{image_path}"
-                        else:
-                            # Fallback: assume it's just the filename
-                            image_url = f"/static/generated_images/{os.path.basename(image_path)}"
-                        
-                        image_message = {
-                            "type": "image_generated",
-                            "image_path": image_path,
-                            "image_url": image_url,
-                            "timestamp": time.time()
-                        }
-                        await websocket.send_text(json.dumps(image_message))
-                        print(f"📤 Sent image info to client: {image_path} -> {image_url}")
-                    
-                    # Create a prompt that includes the image generation result
-                    if image_path:
-                        image_prompt = f"User asked: '{query}'\n\nI created an image for them: {comedy_response}\n\nNow give a short, funny response about creating this image while maintaining your comedy style. Mention that they can see the image in the UI."
-                    else:
-                        image_prompt = f"User asked: '{query}'\n\nI tried to create an image but: {comedy_response}\n\nNow give a short, funny response about this while maintaining your comedy style."
-                    
-                    stream = chat.send_message(image_prompt, stream=True)
-                    print("--- Streaming LLM response with image generation ---")
-                    full_response = ""
-                    for chunk in stream:
-                        if chunk.text:
-                            print(chunk.text, end="", flush=True)
-                            full_response += chunk.text
-                else:
-                    # Stream regular response without search
-                    stream = chat.send_message(query, stream=True)
-                    print("--- Streaming LLM response to Murf ---")
-                    full_response = ""
-                    for chunk in stream:
-                        if chunk.text:
-                            print(chunk.text, end="", flush=True)
-                            full_response += chunk.text
-                
-                # Success
-                break
-            except ResourceExhausted as e:
-                wait = (backoff_base ** attempt) + random.uniform(0, 1)
-                print(f"⏳ Rate limited (429). Retrying in {wait:.1f}s... [attempt {attempt + 1}/{max_retries}]")
-                await asyncio.sleep(wait)
-            except Exception as e:
-                print(f"❌ Error streaming LLM response: {e}")
-                break
-
-        print("\n--- Sending to Murf WebSocket ---")
-        print(f"📝 Full response length: {len(full_response)}")
-        print(f"📝 Full response content: '{full_response}'")
-        print(f"📝 Stripped response: '{full_response.strip()}'")
-
-        if full_response.strip():
-            # Send agent response text to client first
-            if websocket:
-                response_text_message = {
-                    "type": "agent_response_text",
-                    "text": full_response.strip(),
-                    "timestamp": time.time()
-                }
-                await websocket.send_text(json.dumps(response_text_message))
-                print(f"📤 Sent agent response text to client: '{full_response.strip()[:100]}...'")
-
-            # Note: Chat history is now saved client-side in localStorage for privacy
-            # No longer saving to server-side database to protect user privacy
-
-            # Send the complete response to Murf WebSocket with Rohan's voice
-            base64_audio = await send_to_murf_websocket(full_response.strip(), voice_id="en-IN-rohan")
-
-            if base64_audio and websocket:
-                print("✅ Successfully received base64 audio from Murf!")
-                print(f"🔊 Base64 audio length: {len(base64_audio)}")
-
-                # Day 21: Send audio data to client in chunks (base64-aligned)
-                chunk_size = 1000 - (1000 % 4)  # Ensure chunk size is divisible by 4 for proper base64 alignment
-                audio_chunks = [base64_audio[i:i+chunk_size] for i in range(0, len(base64_audio), chunk_size)]
-
-                print(f"� [Day 21] Splitting audio into {len(audio_chunks)} chunks")
-
-                for i, chunk in enumerate(audio_chunks):
-                    chunk_message = {
-                        "type": "audio_chunk",
-                        "chunk_id": i + 1,
-                        "data": chunk,
-                        "timestamp": time.time()
-                    }
-
-                    # Send chunk to client with proper error handling
+                if tools is None and turn.speculation is not None:
+                    # Generated ahead of end-of-turn; adopt it as this turn's reply
                     try:
-                        if websocket_available and websocket:
-                            await websocket.send_text(json.dumps(chunk_message))
-                            print(f"📤 [Day 21] Sent audio chunk {i + 1}/{len(audio_chunks)} to client ({len(chunk)} chars)")
-                        else:
-                            print(f"⚠️ WebSocket unavailable, skipping chunk {i + 1}")
+                        print("--- Speaking speculative LLM response ---")
+                        async for text in shape_stream(turn.speculation.text_stream(), shaper):
+                            yield text
                     except Exception as e:
-                        print(f"❌ Failed to send chunk {i + 1}: {e}")
-                        websocket_available = False  # Mark as unavailable after error
-
-                # Send completion message only if websocket is still connected
-                try:
-                    if websocket_available and websocket:
-                        completion_message = {
-                            "type": "audio_complete",
-                            "total_chunks": len(audio_chunks),
-                            "total_length": len(base64_audio),
-                            "timestamp": time.time()
-                        }
-                        await websocket.send_text(json.dumps(completion_message))
-                        print(f"🎉 [Day 21] Audio streaming to client complete!")
-                except Exception as e:
-                    print(f"❌ Failed to send completion message: {e}")
-
-                return base64_audio
-            else:
-                print("❌ Failed to get audio from Murf or no WebSocket connection")
-                return None
-        else:
-            print("⚠️ No content to send to Murf - response is empty after retries!")
-            return None
-
-    except Exception as e:
-        print(f"❌ Error streaming LLM response to Murf and client: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+                        if shaper.reply:
+                            raise
+                        print(f"⚠️ Speculative response failed before any text ({e}), asking Gemini directly")
+                if not shaper.reply:
+                    shaper = ResponseShaper()
+                    # Retries, backoff and hedging for Gemini live in the resilience layer
+                    stream = await _send_turn(chat, history_before_turn, prompt, on_retry=turn.on_retry)
+                    print("--- Streaming LLM response ---")
+                    async for text in shape_stream(_iterate_stream_text(stream), shaper):
+                        yield text
+                    COMEDIAN_TEMPLATE.record_usage(stream)
+            except Exception as e:
+                if not shaper.reply:
+                    raise
+                # Part of the reply is already on its way to the caller; a retry would repeat it
+                print(f"❌ LLM stream failed mid-response, keeping what we have: {e}")
+
+            # Record what was said; a stream stopped at the budget never completes on its own
+            turn.reply = shaper.reply
+            chat.history = history_before_turn + _exchange(prompt, turn.reply)
+        except (asyncio.CancelledError, GeneratorExit):
+            print(f"🛑 Turn cancelled: '{turn.query}'")
+            if tools is not None:
+                tools.cancel_late_image()
+            chat.history = history_before_turn
+            raise
+    finally:
+        # Hibernation skipped the session while this turn was writing to it
+        release_chat_session(turn.session_id)
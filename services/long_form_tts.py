@@ -0,0 +1,159 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import AsyncIterator, Callable, Dict, List, Sequence, Tuple, TypeVar
+
+from services.text_segmenter import split_long_text
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Murf rejects longer text in one request; longer text is synthesized in parts
+MURF_MAX_TEXT_CHARS = 2900
+# Parts are packed to about this size; the first is smaller so its audio starts sooner
+LONG_FORM_PART_CHARS = int(os.getenv("LONG_FORM_PART_CHARS", 1000))
+LONG_FORM_FIRST_PART_CHARS = int(os.getenv("LONG_FORM_FIRST_PART_CHARS", 300))
+# Parts of one text synthesizing at once
+LONG_FORM_MAX_PARALLEL = int(os.getenv("LONG_FORM_MAX_PARALLEL", 3))
+# Part requests started per second across all long texts, with bursts up to LONG_FORM_MAX_PARALLEL
+LONG_FORM_REQUESTS_PER_SECOND = float(os.getenv("LONG_FORM_REQUESTS_PER_SECOND", 4))
+
+T = TypeVar("T")
+
+# Marks the end of a part in its queue
+_PART_DONE = object()
+
+
+def is_long_form(text: str) -> bool:
+    """Too long for a single Murf request."""
+    return len(text.strip()) > MURF_MAX_TEXT_CHARS
+
+
+def split_for_synthesis(text: str) -> List[str]:
+    """The parts a long text is synthesized in, in speaking order."""
+    return split_long_text(text.strip(), MURF_MAX_TEXT_CHARS, min(LONG_FORM_PART_CHARS, MURF_MAX_TEXT_CHARS),
+                           min(LONG_FORM_FIRST_PART_CHARS, MURF_MAX_TEXT_CHARS))
+
+
+class RateLimiter:
+    """
+    Token bucket for requests to one provider, shared by every caller and
+    thread. Each request reserves a token up front, possibly going into debt,
+    and waits until that token would have been earned, so waiting callers
+    start in the order they asked.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token; returns how long to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    async def acquire(self) -> float:
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+        return delay
+
+
+class LongFormSynthesizer:
+    """
+    Synthesizes the parts of a long text concurrently and plays them in order.
+
+    Up to `max_parallel` parts of a text render at once, and part requests
+    start no faster than the shared rate limiter allows. `stream()` yields
+    part 0 as it renders, then each later part: the part of it that was
+    buffered while earlier parts played, and the rest as it arrives. Turning
+    the parts into one valid audio stream (headers, tags) is the caller's
+    job, as only it knows the format.
+    """
+
+    def __init__(self, max_parallel: int = LONG_FORM_MAX_PARALLEL,
+                 requests_per_second: float = LONG_FORM_REQUESTS_PER_SECOND):
+        self.max_parallel = max(1, max_parallel)
+        self.limiter = RateLimiter(requests_per_second, burst=self.max_parallel)
+        self.stats = {
+            "texts": 0,
+            "parts": 0,
+            "parts_failed": 0,
+            "rate_limited": 0,
+            "rate_wait_ms": 0.0,
+            "abandoned": 0,
+        }
+
+    async def stream(self, texts: Sequence[str],
+                     synthesize: Callable[[str], AsyncIterator[T]]) -> AsyncIterator[Tuple[int, T]]:
+        """
+        Yield `(part_index, chunk)` for every chunk `synthesize(text)` produces,
+        part after part. A failed part raises here once playback reaches it;
+        stopping early cancels the parts still rendering.
+        """
+        self.stats["texts"] += 1
+        self.stats["parts"] += len(texts)
+        # Waiters acquire in FIFO order, so parts start in speaking order
+        slots = asyncio.Semaphore(self.max_parallel)
+        queues = [asyncio.Queue() for _ in texts]
+
+        async def render(index: int, text: str):
+            async with slots:
+                delay = await self.limiter.acquire()
+                if delay:
+                    self.stats["rate_limited"] += 1
+                    self.stats["rate_wait_ms"] += delay * 1000
+                try:
+                    async for chunk in synthesize(text):
+                        queues[index].put_nowait(chunk)
+                except Exception as e:
+                    self.stats["parts_failed"] += 1
+                    queues[index].put_nowait(e)
+                    return
+            queues[index].put_nowait(_PART_DONE)
+
+        tasks = [asyncio.create_task(render(index, text)) for index, text in enumerate(texts)]
+        try:
+            for index, queue in enumerate(queues):
+                while True:
+                    item = await queue.get()
+                    if item is _PART_DONE:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield index, item
+        except (GeneratorExit, asyncio.CancelledError):
+            # The listener stopped (or went away) before the last part
+            self.stats["abandoned"] += 1
+            raise
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Let cancelled parts clean up (a Murf context is cleared and released) before returning
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> Dict:
+        return {
+            "max_parallel": self.max_parallel,
+            "requests_per_second": self.limiter.rate,
+            "max_text_chars": MURF_MAX_TEXT_CHARS,
+            **self.stats,
+            "rate_wait_ms": round(self.stats["rate_wait_ms"], 1),
+        }
+
+
+# Global long-form synthesizer instance
+long_form_tts = LongFormSynthesizer()
+
+def get_long_form_stats() -> Dict:
+    return long_form_tts.get_stats()
@@ -0,0 +1,109 @@
+import os
+import hashlib
+import logging
+import threading
+import importlib.util
+from collections import OrderedDict
+from typing import Dict
+
+import httpx
+from murf import Murf
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# API keys whose Murf REST clients stay resident; the least recently used one is dropped beyond this
+MURF_MAX_TENANTS = int(os.getenv("MURF_MAX_TENANTS", 8))
+# Connections per key: open at once, and kept alive idle between requests. Keeping fewer alive
+# than may be open makes every burst above that reconnect, so both default to the same size
+MURF_MAX_CONNECTIONS = int(os.getenv("MURF_MAX_CONNECTIONS", 10))
+MURF_MAX_KEEPALIVE = int(os.getenv("MURF_MAX_KEEPALIVE", MURF_MAX_CONNECTIONS))
+# Idle keep-alive connections are closed after this long
+MURF_KEEPALIVE_EXPIRY = float(os.getenv("MURF_KEEPALIVE_EXPIRY", 60))
+MURF_TIMEOUT_SECONDS = float(os.getenv("MURF_TIMEOUT_SECONDS", 60))
+# Multiplex requests over one HTTP/2 connection (needs the h2 package); HTTP/1.1 keep-alive otherwise
+MURF_HTTP2 = os.getenv("MURF_HTTP2", "false").lower() == "true"
+# Per-request options for every call on a pooled client. The Murf constructor takes no retry
+# setting; retries belong to the resilience layer's call_sync, so the SDK must never add its own
+MURF_REQUEST_OPTIONS = {"max_retries": 0}
+
+murf_client_stats = {
+    "hits": 0,
+    "misses": 0,
+    "evictions": 0,
+}
+
+
+def _http2_available() -> bool:
+    if not MURF_HTTP2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("MURF_HTTP2 is on but the h2 package is not installed; using HTTP/1.1 keep-alive")
+        return False
+    return True
+
+
+class MurfClientRegistry:
+    """
+    One Murf REST client per API key, on a shared keep-alive connection pool.
+
+    `Murf(api_key=...)` builds its own httpx client, so a client per call
+    pays for a fresh TCP and TLS handshake every time; the voice fallback
+    could pay it several times per request. Here each key gets one client
+    whose httpx pool keeps up to MURF_MAX_KEEPALIVE idle connections warm
+    (or one multiplexed HTTP/2 connection with MURF_HTTP2), bounded by
+    MURF_MAX_CONNECTIONS. httpx clients are thread-safe, so the worker
+    threads running blocking Murf calls share them. At most `max_tenants`
+    keys stay resident; an evicted client is not closed, since a request
+    may still be running on it, and goes away with its last user.
+    """
+
+    def __init__(self, max_tenants: int = MURF_MAX_TENANTS):
+        self.max_tenants = max_tenants
+        self.http2 = _http2_available()
+        self.limits = httpx.Limits(max_connections=MURF_MAX_CONNECTIONS,
+                                   max_keepalive_connections=MURF_MAX_KEEPALIVE,
+                                   keepalive_expiry=MURF_KEEPALIVE_EXPIRY)
+        self._clients: "OrderedDict[str, Murf]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def client(self, api_key: str) -> Murf:
+        # Same short id as the Gemini registry logs, without importing the Gemini SDK here
+        fingerprint = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+        with self._lock:
+            client = self._clients.get(fingerprint)
+            if client is not None:
+                murf_client_stats["hits"] += 1
+                self._clients.move_to_end(fingerprint)
+                return client
+            murf_client_stats["misses"] += 1
+            http_client = httpx.Client(limits=self.limits, http2=self.http2, timeout=MURF_TIMEOUT_SECONDS)
+            client = self._clients[fingerprint] = Murf(api_key=api_key, timeout=MURF_TIMEOUT_SECONDS,
+                                                       httpx_client=http_client)
+            logger.info(f"Created Murf REST client for key {fingerprint}")
+            while len(self._clients) > self.max_tenants:
+                old_fingerprint, _ = self._clients.popitem(last=False)
+                murf_client_stats["evictions"] += 1
+                logger.info(f"Evicted Murf REST client for key {old_fingerprint}")
+            return client
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            tenants = len(self._clients)
+        return {
+            "tenants": tenants,
+            "max_tenants": self.max_tenants,
+            "http2": self.http2,
+            "max_connections": MURF_MAX_CONNECTIONS,
+            "max_keepalive": MURF_MAX_KEEPALIVE,
+            **murf_client_stats,
+        }
+
+
+# Global instance
+murf_clients = MurfClientRegistry()
+
+
+def get_murf_client_stats() -> Dict:
+    return murf_clients.get_stats()
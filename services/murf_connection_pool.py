@@ -0,0 +1,379 @@
+import os
+import json
+import time
+import uuid
+import base64
+import random
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional
+
+import websockets
+
+from services.audio_protocol import WavStreamNormalizer
+from services.resilience import get_provider
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MURF_STREAM_URL = "wss://api.murf.ai/v1/speech/stream-input"
+
+# Pool sizing; Murf limits how many contexts may be open on one socket
+MAX_CONNECTIONS = int(os.getenv("MURF_POOL_MAX_CONNECTIONS", 4))
+MAX_CONTEXTS_PER_CONNECTION = int(os.getenv("MURF_MAX_CONTEXTS_PER_CONNECTION", 5))
+MAX_ACTIVE_CONTEXTS = int(os.getenv("MURF_MAX_ACTIVE_CONTEXTS", MAX_CONNECTIONS * MAX_CONTEXTS_PER_CONNECTION))
+# Close connections that have carried no context for this long
+IDLE_TIMEOUT = float(os.getenv("MURF_IDLE_TIMEOUT", 60))
+# How often idle connections are pinged and reaped
+HEALTH_CHECK_INTERVAL = float(os.getenv("MURF_HEALTH_CHECK_INTERVAL", 15))
+PING_TIMEOUT = 5.0
+CONNECT_ATTEMPTS = 3
+RECONNECT_BASE_DELAY = 0.25
+
+# Process-wide counters across all pools
+pool_stats = {
+    "connections_opened": 0,
+    "connection_failures": 0,
+    "connections_closed": 0,
+    "contexts_opened": 0,
+    "contexts_waited": 0,
+    "health_check_failures": 0,
+}
+
+# Pushed into a context inbox when its connection dies
+_CONNECTION_LOST = object()
+
+
+class MurfConnection:
+    """
+    One long-lived Murf WebSocket carrying several contexts at once.
+
+    A reader task routes every incoming message to the inbox of the context
+    named by its `context_id`, so concurrent utterances share the socket.
+    """
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.inboxes: Dict[str, asyncio.Queue] = {}
+        self.last_used = time.monotonic()
+        self.alive = True
+        self._reader = asyncio.create_task(self._read_loop())
+
+    @property
+    def active_contexts(self) -> int:
+        return len(self.inboxes)
+
+    async def _read_loop(self):
+        try:
+            async for raw in self.websocket:
+                try:
+                    message = json.loads(raw)
+                except json.JSONDecodeError:
+                    logger.warning(f"Ignoring malformed Murf message: {str(raw)[:100]}")
+                    continue
+                context_id = message.get("context_id")
+                if context_id is None and len(self.inboxes) == 1:
+                    # Only one context in flight, so the message can only be for it
+                    context_id = next(iter(self.inboxes))
+                inbox = self.inboxes.get(context_id)
+                if inbox is None:
+                    logger.debug(f"Dropping Murf message for unknown context {context_id}")
+                    continue
+                inbox.put_nowait(message)
+        except websockets.exceptions.ConnectionClosed as e:
+            logger.info(f"Murf connection closed: {e}")
+        except Exception as e:
+            logger.error(f"Murf connection reader failed: {e}")
+        finally:
+            self.alive = False
+            for inbox in self.inboxes.values():
+                inbox.put_nowait(_CONNECTION_LOST)
+
+    def register(self, context_id: str) -> asyncio.Queue:
+        inbox = asyncio.Queue()
+        self.inboxes[context_id] = inbox
+        self.last_used = time.monotonic()
+        return inbox
+
+    def release(self, context_id: str):
+        self.inboxes.pop(context_id, None)
+        self.last_used = time.monotonic()
+
+    async def send(self, message: Dict):
+        await self.websocket.send(json.dumps(message))
+
+    async def ping(self) -> bool:
+        try:
+            waiter = await self.websocket.ping()
+            await asyncio.wait_for(waiter, timeout=PING_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def close(self):
+        self.alive = False
+        self._reader.cancel()
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass
+        await asyncio.gather(self._reader, return_exceptions=True)
+
+
+class MurfStreamingContext:
+    """
+    A Murf context that is fed text piece by piece while it is speaking.
+
+    Text goes in with `send_text(..., end=False)` as soon as a sentence is ready;
+    `audio_chunks()` yields decoded audio bytes as Murf produces them and ends
+    after the final message that follows `end()`. Sending and receiving can run
+    in separate tasks. `close()` hands the context's slot back to the pool.
+    WAV audio comes out as one stream with a single header at the front.
+    """
+
+    def __init__(self, pool: "MurfConnectionPool", connection: MurfConnection, context_id: str, voice_id: str):
+        self.pool = pool
+        self.connection = connection
+        self.context_id = context_id
+        self.voice_id = voice_id
+        self.inbox = connection.register(context_id)
+        self.wav = WavStreamNormalizer() if pool.audio_format == "WAV" else None
+        self.ended = False
+        self._closed = False
+
+    async def send_text(self, text: str, end: bool = False):
+        if self.ended:
+            raise RuntimeError(f"Murf context {self.context_id} already ended")
+        message = {"text": text, "context_id": self.context_id, "end": end}
+        logger.info(f"Sending text to Murf: '{text}' (context_id={self.context_id}, end={end})")
+        await self.connection.send(message)
+        self.ended = end
+
+    async def end(self):
+        """Close the context; Murf flushes the remaining audio and sends `final`."""
+        if not self.ended:
+            await self.send_text("", end=True)
+
+    async def audio_chunks(self) -> AsyncIterator[bytes]:
+        while True:
+            response = await self.inbox.get()
+            if response is _CONNECTION_LOST:
+                raise ConnectionError(f"Murf connection lost while context {self.context_id} was active")
+            if "error" in response:
+                raise RuntimeError(f"Murf error for context {self.context_id}: {response['error']}")
+            if "audio" in response:
+                try:
+                    audio = base64.b64decode(response["audio"], validate=False)
+                except Exception as e:
+                    logger.error(f"Failed to decode base64 audio chunk: {e}")
+                    audio = b""
+                if self.wav is not None:
+                    audio = self.wav.feed(audio)
+                if audio:
+                    yield audio
+            if response.get("final"):
+                logger.info(f"Received final audio response for context {self.context_id}")
+                break
+
+    async def clear(self):
+        """Ask Murf to stop synthesizing this context; best effort."""
+        if self.connection.alive:
+            try:
+                await asyncio.wait_for(self.connection.send({"context_id": self.context_id, "clear": True}), timeout=1)
+                logger.info(f"Cleared Murf context {self.context_id}")
+            except Exception as e:
+                logger.warning(f"Could not clear Murf context {self.context_id}: {e}")
+        self.ended = True
+
+    async def close(self):
+        if not self._closed:
+            self._closed = True
+            self.pool.release(self)
+
+
+class MurfConnectionPool:
+    """
+    Long-lived Murf connections for one API key and audio format.
+
+    Contexts are multiplexed over at most `max_connections` sockets, each
+    carrying up to `max_contexts_per_connection`; beyond `max_active_contexts`
+    callers wait for a slot. Connections are opened on demand with jittered
+    backoff, pinged while idle, and closed after `idle_timeout` without use.
+    """
+
+    def __init__(self, api_key: str, sample_rate: int = 44100, audio_format: str = "WAV",
+                 max_connections: int = MAX_CONNECTIONS,
+                 max_contexts_per_connection: int = MAX_CONTEXTS_PER_CONNECTION,
+                 max_active_contexts: int = MAX_ACTIVE_CONTEXTS,
+                 idle_timeout: float = IDLE_TIMEOUT):
+        self.api_key = api_key
+        self.audio_format = audio_format
+        self.url = f"{MURF_STREAM_URL}?api-key={api_key}&sample_rate={sample_rate}&channel_type=MONO&format={audio_format}"
+        self.max_connections = max_connections
+        self.max_contexts_per_connection = max_contexts_per_connection
+        self.idle_timeout = idle_timeout
+        self.connections: List[MurfConnection] = []
+        self._slots = asyncio.Semaphore(max_active_contexts)
+        self._lock = asyncio.Lock()
+        self._maintenance: Optional[asyncio.Task] = None
+
+    async def open_context(self, voice_id: str = "en-IN-rohan") -> MurfStreamingContext:
+        """Reserve a context slot, configure the voice and return the context."""
+        # Fail fast while Murf is known to be down instead of queueing for a slot
+        get_provider("murf").breaker.raise_if_open()
+        if self._slots.locked():
+            pool_stats["contexts_waited"] += 1
+        await self._slots.acquire()
+        try:
+            connection = await self._connection_with_room()
+            context = MurfStreamingContext(self, connection, "murf_ctx_" + str(uuid.uuid4())[:8], voice_id)
+            voice_config = {
+                "voice_config": {
+                    "voiceId": voice_id,
+                    "style": "Conversational",
+                    "rate": 0,
+                    "pitch": 0,
+                    "variation": 1
+                },
+                "context_id": context.context_id
+            }
+            try:
+                await connection.send(voice_config)
+            except Exception:
+                connection.release(context.context_id)
+                raise
+        except BaseException:
+            self._slots.release()
+            raise
+        pool_stats["contexts_opened"] += 1
+        logger.info(f"Opened Murf context {context.context_id} with voice {voice_id} "
+                    f"({len(self.connections)} connections, {self.active_contexts} active contexts)")
+        return context
+
+    def release(self, context: MurfStreamingContext):
+        context.connection.release(context.context_id)
+        self._slots.release()
+
+    @property
+    def active_contexts(self) -> int:
+        return sum(connection.active_contexts for connection in self.connections)
+
+    async def _connection_with_room(self) -> MurfConnection:
+        async with self._lock:
+            self.connections = [c for c in self.connections if c.alive]
+            candidates = [c for c in self.connections if c.active_contexts < self.max_contexts_per_connection]
+            if candidates and (min(c.active_contexts for c in candidates) == 0 or len(self.connections) >= self.max_connections):
+                return min(candidates, key=lambda c: c.active_contexts)
+            if len(self.connections) < self.max_connections:
+                connection = await self._connect()
+                self.connections.append(connection)
+                self._ensure_maintenance()
+                return connection
+            if candidates:
+                return min(candidates, key=lambda c: c.active_contexts)
+        # Unreachable while the semaphore matches the per-connection caps
+        raise RuntimeError("No Murf connection has room for another context")
+
+    async def _connect(self) -> MurfConnection:
+        for attempt in range(CONNECT_ATTEMPTS):
+            try:
+                websocket = await websockets.connect(self.url)
+                get_provider("murf").breaker.record_success()
+                pool_stats["connections_opened"] += 1
+                logger.info(f"Opened pooled Murf connection ({len(self.connections) + 1}/{self.max_connections})")
+                return MurfConnection(websocket)
+            except Exception as e:
+                pool_stats["connection_failures"] += 1
+                get_provider("murf").breaker.record_failure()
+                if attempt == CONNECT_ATTEMPTS - 1:
+                    raise
+                delay = RECONNECT_BASE_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5)
+                logger.warning(f"Murf connect failed ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def _ensure_maintenance(self):
+        if self._maintenance is None or self._maintenance.done():
+            self._maintenance = asyncio.create_task(self._maintain())
+
+    async def _maintain(self):
+        """Ping idle connections and close the ones idle for too long."""
+        while self.connections:
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+            now = time.monotonic()
+            for connection in list(self.connections):
+                if connection.active_contexts:
+                    continue
+                if not connection.alive or now - connection.last_used > self.idle_timeout:
+                    reason = "dead" if not connection.alive else "idle"
+                elif not await connection.ping():
+                    pool_stats["health_check_failures"] += 1
+                    reason = "failed health check"
+                else:
+                    continue
+                # A context may have been placed on it while we were pinging
+                if connection.active_contexts:
+                    continue
+                self.connections.remove(connection)
+                pool_stats["connections_closed"] += 1
+                logger.info(f"Closing {reason} Murf connection")
+                await connection.close()
+
+    async def retire(self):
+        """
+        Stop using the pool: idle connections close now, busy ones once their
+        contexts finish, so a reply still streaming on the old key is not cut off.
+        """
+        self.idle_timeout = 0
+        for connection in list(self.connections):
+            if connection.active_contexts:
+                continue
+            self.connections.remove(connection)
+            pool_stats["connections_closed"] += 1
+            await connection.close()
+        if self.connections:
+            self._ensure_maintenance()
+        elif self._maintenance is not None:
+            self._maintenance.cancel()
+
+    async def close(self):
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+        for connection in self.connections:
+            await connection.close()
+        self.connections = []
+
+    def get_stats(self) -> Dict:
+        return {
+            "connections": len(self.connections),
+            "active_contexts": self.active_contexts,
+        }
+
+
+# One pool per (API key, sample rate, format)
+_pools: Dict[tuple, MurfConnectionPool] = {}
+
+
+def get_murf_pool(api_key: str, sample_rate: int = 44100, audio_format: str = "WAV") -> MurfConnectionPool:
+    key = (api_key, sample_rate, audio_format)
+    pool = _pools.get(key)
+    if pool is None:
+        pool = _pools[key] = MurfConnectionPool(api_key, sample_rate=sample_rate, audio_format=audio_format)
+    return pool
+
+
+async def retire_murf_pools(api_key: str):
+    """Drop and retire every pool opened with a key that is no longer in use."""
+    for key in [key for key in _pools if key[0] == api_key]:
+        pool = _pools.pop(key)
+        await pool.retire()
+        logger.info(f"Retired Murf pool ({key[1]}Hz {key[2]}) for a replaced API key")
+
+
+def get_murf_pool_stats() -> Dict:
+    return {
+        **pool_stats,
+        "pools": len(_pools),
+        "connections": sum(len(pool.connections) for pool in _pools.values()),
+        "active_contexts": sum(pool.active_contexts for pool in _pools.values()),
+    }
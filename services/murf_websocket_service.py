@@ -1,10 +1,19 @@
 import os
-import json
 import asyncio
 import websockets
 import logging
-from typing import Optional
-import uuid
+from typing import AsyncIterator, Dict, Optional
+import base64
+from contextlib import aclosing
+
+from services.audio_protocol import WavStreamNormalizer, wav_with_lengths
+from services.long_form_tts import is_long_form, long_form_tts, split_for_synthesis
+from services.murf_connection_pool import MurfStreamingContext, get_murf_pool, retire_murf_pools
+from services.tts_cache import TTS_CACHE_ENABLED, tts_cache, tts_cache_key
+
+# Streaming synthesis settings, part of every cache key
+STREAM_FORMAT = "WAV"
+STREAM_SAMPLE_RATE = 44100
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -21,11 +30,12 @@ class MurfWebSocketService:
         if not self.api_key:
             raise ValueError("Murf API key not configured. Please set it in the API configuration.")
         
-        # Correct WebSocket URL from Murf API documentation
-        self.websocket_url = "wss://api.murf.ai/v1/speech/stream-input"
-        # Use a unique context per request to avoid active context limit issues
+        # Long-lived connections shared by every request made with this key;
+        # each request gets its own context_id on one of them
+        self.pool = get_murf_pool(self.api_key, sample_rate=STREAM_SAMPLE_RATE, audio_format=STREAM_FORMAT)
     
-    def get_runtime_api_key(self) -> str:
+    @staticmethod
+    def get_runtime_api_key() -> str:
         """Get Murf API key from runtime storage."""
         try:
             # Import here to avoid circular imports
@@ -34,9 +44,74 @@ class MurfWebSocketService:
         except:
             return ''
         
+    async def stream_audio(self, text: str, voice_id: str = "en-IN-rohan") -> AsyncIterator[bytes]:
+        """
+        Synthesize text and yield the audio bytes as Murf produces them.
+
+        Nothing is buffered: each chunk can go to the client the moment it arrives.
+        WAV chunks concatenate into a single file with one header. If the
+        consumer stops early or is cancelled, the context is cleared so Murf
+        stops synthesizing. Text already spoken in this voice is streamed from
+        the TTS cache instead; a complete synthesis is added to it.
+
+        Text too long for one request is cut into parts synthesized on
+        concurrent contexts: the first part streams live while the later
+        ones render, and every part after the first loses its WAV header.
+        """
+        cache_key = tts_cache_key(text, voice_id, audio_format=STREAM_FORMAT, sample_rate=STREAM_SAMPLE_RATE)
+        if TTS_CACHE_ENABLED:
+            cached = False
+            async for chunk_bytes in tts_cache.stream(cache_key):
+                cached = True
+                yield chunk_bytes
+            if cached:
+                logger.info(f"TTS cache hit for '{text[:30]}...' ({voice_id})")
+                return
+
+        audio = bytearray()
+        async with aclosing(self._stream_long(text, voice_id) if is_long_form(text)
+                            else self._stream_context(text, voice_id)) as chunks:
+            async for chunk_bytes in chunks:
+                if TTS_CACHE_ENABLED:
+                    audio.extend(chunk_bytes)
+                yield chunk_bytes
+        if audio:
+            # The header in front only counted the first segment's samples
+            await asyncio.to_thread(tts_cache.put, cache_key, wav_with_lengths(bytes(audio)))
+
+    async def _stream_context(self, text: str, voice_id: str) -> AsyncIterator[bytes]:
+        """One utterance on one pooled context."""
+        context = await self.pool.open_context(voice_id)
+        finished = False
+        try:
+            # Send the whole text with end=True so the context closes once it has spoken
+            await context.send_text(text, end=True)
+            async for chunk_bytes in context.audio_chunks():
+                yield chunk_bytes
+            finished = True
+        finally:
+            if not finished:
+                # Abandoned mid-utterance: tell Murf to drop the context before releasing it
+                await context.clear()
+            await context.close()
+
+    async def _stream_long(self, text: str, voice_id: str) -> AsyncIterator[bytes]:
+        """A long text in parts on concurrent contexts, joined into one WAV stream."""
+        parts = split_for_synthesis(text)
+        logger.info(f"Long text ({len(text)} chars): synthesizing {len(parts)} parts in parallel")
+        wav = WavStreamNormalizer()
+        async with aclosing(long_form_tts.stream(parts, lambda part: self._stream_context(part, voice_id))) as chunks:
+            async for _, chunk_bytes in chunks:
+                chunk_bytes = wav.feed(chunk_bytes)
+                if chunk_bytes:
+                    yield chunk_bytes
+
     async def send_text_to_murf(self, text: str, voice_id: str = "en-IN-rohan") -> Optional[str]:
         """
         Send text to Murf WebSocket API and receive base64 encoded audio.
+
+        Collects the whole utterance; prefer `stream_audio` when the audio can
+        be forwarded as it arrives.
         
         Args:
             text: The text to convert to speech
@@ -46,100 +121,44 @@ class MurfWebSocketService:
             base64 encoded audio string or None if failed
         """
         try:
-            # Build WebSocket URL with query parameters as per documentation
-            ws_url = f"{self.websocket_url}?api-key={self.api_key}&sample_rate=44100&channel_type=MONO&format=WAV"
-            
-            logger.info(f"Connecting to Murf WebSocket: {ws_url[:50]}...")
-            
-            async with websockets.connect(ws_url) as websocket:
-                
-                # Generate a unique context_id per request to avoid active context limit
-                request_context_id = "murf_ctx_" + str(uuid.uuid4())[:8]
-
-                # First, send voice configuration with request-specific context_id
-                voice_config = {
-                    "voice_config": {
-                        "voiceId": voice_id,
-                        "style": "Conversational",
-                        "rate": 0,
-                        "pitch": 0,
-                        "variation": 1
-                    },
-                    "context_id": request_context_id
-                }
-                
-                logger.info(f"Sending voice config: {voice_config}")
-                await websocket.send(json.dumps(voice_config))
-                
-                # Then send the text with end=True to close the context
-                text_message = {
-                    "text": text,
-                    "context_id": request_context_id,
-                    "end": True  # This will close the context for concurrency
-                }
-                
-                logger.info(f"Sending text to Murf: '{text}' (context_id={request_context_id})")
-                await websocket.send(json.dumps(text_message))
-                
-                # Collect all audio chunks as raw bytes
-                import base64
-                audio_bytes = bytearray()
-                
-                while True:
-                    response_raw = await websocket.recv()
-                    response = json.loads(response_raw)
-                    
-                    logger.info(f"Received response: {response}")
-                    
-                    if "audio" in response:
-                        # Each response["audio"] is a standalone base64 string.
-                        # Decode to bytes and append so we don't end up with multiple padded base64 segments concatenated.
-                        audio_chunk_b64 = response["audio"]
-                        try:
-                            chunk_bytes = base64.b64decode(audio_chunk_b64, validate=False)
-                            audio_bytes.extend(chunk_bytes)
-                            logger.info(f"Received audio chunk (b64 len: {len(audio_chunk_b64)} chars, bytes: {len(chunk_bytes)})")
-                        except Exception as e:
-                            logger.error(f"Failed to decode base64 audio chunk: {e}")
-                    
-                    # Check if this is the final response
-                    if response.get("final"):
-                        logger.info("Received final audio response")
-                        break
-                
-                # Encode the combined bytes as a single base64 string
-                if len(audio_bytes) > 0:
-                    combined_audio_b64 = base64.b64encode(bytes(audio_bytes)).decode("ascii")
-                    logger.info(f"Combined audio bytes: {len(audio_bytes)} → base64 length: {len(combined_audio_b64)}")
-                    
-                    print(f"\n=== MURF BASE64 AUDIO ===")
-                    print(f"Text: '{text}'")
-                    print(f"Voice ID: {voice_id}")
-                    print(f"Base64 Audio (first 100 chars): {combined_audio_b64[:100]}...")
-                    print(f"Base64 Audio (last 100 chars): ...{combined_audio_b64[-100:]}")
-                    print(f"Total Base64 Length: {len(combined_audio_b64)} characters")
-                    print("=== END MURF AUDIO ===\n")
-                    
-                    return combined_audio_b64
-                else:
-                    logger.error("No audio data received from Murf")
-                    return None
-                    
+            audio_bytes = bytearray()
+            async for chunk_bytes in self.stream_audio(text, voice_id):
+                audio_bytes.extend(chunk_bytes)
+                logger.info(f"Received audio chunk ({len(chunk_bytes)} bytes)")
+
+            if len(audio_bytes) > 0:
+                combined_audio_b64 = base64.b64encode(bytes(audio_bytes)).decode("ascii")
+                logger.info(f"Combined audio bytes: {len(audio_bytes)} → base64 length: {len(combined_audio_b64)}")
+                return combined_audio_b64
+            else:
+                logger.error("No audio data received from Murf")
+                return None
+
         except websockets.exceptions.ConnectionClosedError as e:
             logger.error(f"Murf WebSocket connection closed: {e}")
             return None
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse Murf response JSON: {e}")
+        except ConnectionError as e:
+            logger.error(f"Murf WebSocket connection lost: {e}")
             return None
         except Exception as e:
-            logger.error(f"Error connecting to Murf WebSocket: {e}")
+            logger.error(f"Error synthesizing with Murf: {e}")
             import traceback
             traceback.print_exc()
             return None
 
+    async def open_streaming_context(self, voice_id: str = "en-IN-rohan") -> MurfStreamingContext:
+        """
+        Open a context for incremental synthesis on a pooled connection.
+        The caller owns the context and must `close()` it.
+        """
+        return await self.pool.open_context(voice_id)
+
     async def stream_text_to_murf(self, text_chunks: list, voice_id: str = "en-IN-rohan") -> list:
         """
         Send multiple text chunks to Murf and collect all base64 audio responses.
+
+        The chunks are synthesized concurrently, paced by the shared long-form
+        rate limiter, and returned in their original order.
         
         Args:
             text_chunks: List of text chunks to convert
@@ -148,24 +167,35 @@ class MurfWebSocketService:
         Returns:
             List of base64 encoded audio strings
         """
+        texts = [chunk.strip() for chunk in text_chunks if chunk.strip()]  # Only process non-empty chunks
+
+        async def synthesize(text: str) -> AsyncIterator[Optional[str]]:
+            logger.info(f"Processing chunk: '{text[:30]}...'")
+            yield await self.send_text_to_murf(text, voice_id)
+
         audio_responses = []
-        
-        for i, chunk in enumerate(text_chunks):
-            if chunk.strip():  # Only process non-empty chunks
-                logger.info(f"Processing chunk {i+1}/{len(text_chunks)}: '{chunk[:30]}...'")
-                audio_data = await self.send_text_to_murf(chunk.strip(), voice_id)
+        async with aclosing(long_form_tts.stream(texts, synthesize)) as responses:
+            async for _, audio_data in responses:
                 if audio_data:
                     audio_responses.append(audio_data)
-                
-                # Small delay between requests to avoid rate limiting
-                await asyncio.sleep(0.5)
-        
         return audio_responses
 
+# Services are cached per API key so their connection pool outlives a single call
+_murf_services: Dict[str, MurfWebSocketService] = {}
+
 # Function to create instance with runtime API key
 def get_murf_service():
-    """Get MurfWebSocketService instance with runtime API key."""
-    return MurfWebSocketService()
+    """Get the MurfWebSocketService for the runtime API key."""
+    api_key = MurfWebSocketService.get_runtime_api_key()
+    service = _murf_services.get(api_key)
+    if service is None:
+        service = _murf_services[api_key] = MurfWebSocketService(api_key or None)
+    return service
+
+async def retire_murf_service(api_key: str):
+    """Forget the service for a replaced API key and retire its connection pools."""
+    _murf_services.pop(api_key, None)
+    await retire_murf_pools(api_key)
 
 async def send_to_murf_websocket(text: str, voice_id: str = "en-IN-rohan") -> Optional[str]:
     """
@@ -180,3 +210,10 @@ async def send_to_murf_websocket(text: str, voice_id: str = "en-IN-rohan") -> Op
     """
     murf_service = get_murf_service()
     return await murf_service.send_text_to_murf(text, voice_id)
+
+async def stream_from_murf_websocket(text: str, voice_id: str = "en-IN-rohan") -> AsyncIterator[bytes]:
+    """
+    Convenience function that yields Murf audio bytes as they are synthesized.
+    """
+    async for chunk_bytes in get_murf_service().stream_audio(text, voice_id):
+        yield chunk_bytes
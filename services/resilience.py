@@ -0,0 +1,351 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Providers that may get a hedged second request once a call outlives their p95 latency
+HEDGED_PROVIDERS = {name.strip() for name in os.getenv("RESILIENCE_HEDGE", "gemini,tavily").split(",") if name.strip()}
+HEDGE_PERCENTILE = 0.95
+# Latency samples needed before hedging starts; until then the p95 is a guess
+HEDGE_MIN_SAMPLES = 20
+
+# Per provider: breaker trip point and cool-down, attempts, backoff, and how long one attempt may take
+PROVIDER_SETTINGS = {
+    "gemini": dict(failure_threshold=5, reset_timeout=30.0, max_attempts=3, base_delay=1.0, max_delay=8.0,
+                   attempt_timeout=20.0),
+    "murf": dict(failure_threshold=5, reset_timeout=30.0, max_attempts=2, base_delay=0.5, max_delay=4.0,
+                 attempt_timeout=15.0),
+    "assemblyai": dict(failure_threshold=5, reset_timeout=30.0, max_attempts=2, base_delay=1.0, max_delay=4.0,
+                       attempt_timeout=None),
+    "tavily": dict(failure_threshold=5, reset_timeout=30.0, max_attempts=2, base_delay=0.3, max_delay=2.0,
+                   attempt_timeout=5.0),
+    "huggingface": dict(failure_threshold=3, reset_timeout=60.0, max_attempts=2, base_delay=2.0, max_delay=20.0,
+                        attempt_timeout=70.0),
+}
+
+
+class CircuitOpenError(Exception):
+    """The provider's breaker is open: fail fast instead of queueing behind an outage."""
+
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(f"{provider} is unavailable (circuit open, retrying in {retry_in:.0f}s)")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+class TransientError(Exception):
+    """Raised by a call for a response worth retrying (429, 5xx, model still loading)."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed while calls succeed; opens after `failure_threshold` consecutive
+    transient failures and rejects calls for `reset_timeout` seconds; then
+    lets a single probe through (half-open), which closes or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Admit a call or raise CircuitOpenError."""
+        with self._lock:
+            if self.state == self.OPEN:
+                waited = time.monotonic() - self._opened_at
+                if waited < self.reset_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, self.reset_timeout - waited)
+                self.state = self.HALF_OPEN
+                logger.info(f"Circuit for {self.name} half-open, probing")
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, 0)
+                self._probing = True
+
+    def raise_if_open(self):
+        """Reject while open and cooling down, without taking the half-open probe."""
+        with self._lock:
+            if self.state == self.OPEN:
+                waited = time.monotonic() - self._opened_at
+                if waited < self.reset_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, self.reset_timeout - waited)
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                    logger.warning(f"Circuit for {self.name} opened after {self.consecutive_failures} failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def record_abandoned(self):
+        """The call was cancelled: it says nothing about the provider, but frees the probe."""
+        with self._lock:
+            self._probing = False
+
+
+class RetryBudget:
+    """
+    Token bucket shared by every caller of a provider. Each call deposits
+    `ratio` of a token (up to `burst`); each retry or hedge spends a whole
+    one. Retries can then add at most ~`ratio` extra load during an outage,
+    instead of multiplying it by the attempt count.
+    """
+
+    def __init__(self, ratio: float = 0.2, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self._samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _never(_: BaseException) -> bool:
+    return False
+
+
+class Provider:
+    """
+    Resilience policy for one upstream: a circuit breaker, a shared retry
+    budget, jittered exponential backoff, a per-attempt timeout and, when
+    enabled, a hedged second request once an attempt outlives the p95.
+
+    `retryable(error)` tells transient failures (retried, counted by the
+    breaker) from final ones (raised at once; the provider did answer).
+    TransientError and attempt timeouts are always transient.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 attempt_timeout: Optional[float] = None, hedge: bool = False,
+                 retry_ratio: float = 0.2, retry_burst: float = 10.0):
+        self.name = name
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.budget = RetryBudget(retry_ratio, retry_burst)
+        self.latency = LatencyTracker()
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempt_timeout = attempt_timeout
+        self.hedge = hedge
+        self.stats = {
+            "calls": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "retries": 0,
+            "retries_denied": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+        }
+
+    async def call(self, fn: Callable[[], Awaitable], retryable: Callable[[BaseException], bool] = _never,
+                   attempts: Optional[int] = None, hedge: Optional[bool] = None,
+                   on_retry: Optional[Callable[[int, float, BaseException], Awaitable]] = None):
+        """
+        Await `fn()` under this provider's policy. `fn` is called afresh for
+        every attempt and hedge. `on_retry(attempt, delay, error)` is awaited
+        before each backoff sleep, e.g. to tell the user.
+        """
+        attempts = attempts or self.max_attempts
+        hedge = self.hedge if hedge is None else hedge
+        self.stats["calls"] += 1
+        self.budget.deposit()
+        for attempt in range(attempts):
+            self.breaker.check()
+            try:
+                result = await self._attempt(fn, hedge)
+            except asyncio.CancelledError:
+                self.breaker.record_abandoned()
+                raise
+            except Exception as e:
+                if not self._is_transient(e, retryable):
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                delay = self._retry_delay(attempt, attempts, e)
+                if delay is None:
+                    raise
+                if on_retry is not None:
+                    await on_retry(attempt + 1, delay, e)
+                await asyncio.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return result
+
+    def call_sync(self, fn: Callable, retryable: Callable[[BaseException], bool] = _never,
+                  attempts: Optional[int] = None):
+        """`call()` for blocking clients; run it in a worker thread, it sleeps between attempts."""
+        attempts = attempts or self.max_attempts
+        self.stats["calls"] += 1
+        self.budget.deposit()
+        for attempt in range(attempts):
+            self.breaker.check()
+            started = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                if not self._is_transient(e, retryable):
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                delay = self._retry_delay(attempt, attempts, e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+            else:
+                self.latency.add(time.perf_counter() - started)
+                self.breaker.record_success()
+                return result
+
+    def _is_transient(self, error: BaseException, retryable: Callable[[BaseException], bool]) -> bool:
+        if isinstance(error, asyncio.TimeoutError):
+            self.stats["timeouts"] += 1
+            return True
+        return isinstance(error, TransientError) or retryable(error)
+
+    def _retry_delay(self, attempt: int, attempts: int, error: BaseException) -> Optional[float]:
+        """Backoff before the next attempt, or None when out of attempts or retry budget."""
+        self.stats["failures"] += 1
+        if attempt + 1 >= attempts:
+            return None
+        if not self.budget.withdraw():
+            self.stats["retries_denied"] += 1
+            logger.warning(f"{self.name}: retry budget spent, not retrying ({error})")
+            return None
+        self.stats["retries"] += 1
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt)) * random.uniform(0.5, 1.5)
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after:
+            delay = max(delay, min(self.max_delay, retry_after))
+        logger.warning(f"{self.name}: attempt {attempt + 1}/{attempts} failed ({error}), retrying in {delay:.2f}s")
+        return delay
+
+    async def _timed(self, fn: Callable[[], Awaitable]):
+        started = time.perf_counter()
+        if self.attempt_timeout:
+            result = await asyncio.wait_for(fn(), self.attempt_timeout)
+        else:
+            result = await fn()
+        self.latency.add(time.perf_counter() - started)
+        return result
+
+    async def _attempt(self, fn: Callable[[], Awaitable], hedge: bool):
+        hedge_after = self.latency.percentile(HEDGE_PERCENTILE) if hedge else None
+        if hedge_after is None:
+            return await self._timed(fn)
+
+        primary = asyncio.ensure_future(self._timed(fn))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=hedge_after)
+            if not done and self.budget.withdraw():
+                self.stats["hedges"] += 1
+                logger.info(f"{self.name}: no answer after p95 ({hedge_after * 1000:.0f}ms), hedging")
+                pending.add(asyncio.ensure_future(self._timed(fn)))
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+                # The loser's outcome is irrelevant; retrieve it so it is not reported as unhandled
+                task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    def get_stats(self) -> Dict:
+        p95 = self.latency.percentile(HEDGE_PERCENTILE)
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "times_opened": self.breaker.times_opened,
+            "rejected": self.breaker.rejected,
+            "retry_tokens": round(self.budget.tokens, 2),
+            "hedging": self.hedge,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            **self.stats,
+        }
+
+
+# Global instances, one per upstream
+providers: Dict[str, Provider] = {
+    name: Provider(name, hedge=name in HEDGED_PROVIDERS, **settings)
+    for name, settings in PROVIDER_SETTINGS.items()
+}
+
+
+def get_provider(name: str) -> Provider:
+    return providers[name]
+
+
+def get_resilience_stats() -> Dict:
+    return {name: provider.get_stats() for name, provider in providers.items()}
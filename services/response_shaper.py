@@ -0,0 +1,152 @@
+import os
+import random
+from typing import AsyncIterator, Dict
+
+from .text_segmenter import sentence_ends
+
+# A reply is at most this many characters; longer ones are cut and get a comedy ending
+RESPONSE_MAX_CHARS = int(os.getenv("RESPONSE_MAX_CHARS", 150))
+# Sentences spoken as they stream; later ones only if the whole reply fits RESPONSE_MAX_CHARS
+RESPONSE_MAX_SENTENCES = int(os.getenv("RESPONSE_MAX_SENTENCES", 2))
+# Server-side cap, with headroom so the shaper sees where the character budget is crossed
+RESPONSE_MAX_OUTPUT_TOKENS = int(os.getenv("RESPONSE_MAX_OUTPUT_TOKENS", 80))
+
+# Passed with every comedian turn so Gemini stops generating soon after the budget
+GENERATION_CONFIG = {"max_output_tokens": RESPONSE_MAX_OUTPUT_TOKENS}
+
+# Spoken after a cut reply, so it still lands like a punchline
+COMEDY_ENDINGS = [
+    "bas yaar, enough lecture!",
+    "you get it, na? Moving on!",
+    "arre, I'm talking too much like my mother!",
+]
+
+shaper_stats = {
+    "replies": 0,
+    "truncated": 0,
+    "stopped_early": 0,
+    "chars_dropped": 0,
+}
+
+
+def get_shaper_stats() -> Dict:
+    return {
+        "max_chars": RESPONSE_MAX_CHARS,
+        "max_sentences": RESPONSE_MAX_SENTENCES,
+        "max_output_tokens": RESPONSE_MAX_OUTPUT_TOKENS,
+        **shaper_stats,
+    }
+
+
+class ResponseShaper:
+    """
+    Enforces the reply budget while tokens arrive.
+
+    The rule the non-streaming path used to apply after the fact: a reply of
+    up to `max_chars` stays whole; a longer one keeps its first
+    `max_sentences` sentences (or, without a sentence break, what fits) and
+    gets a comedy ending. Streamed, that becomes:
+
+    - the first `max_sentences` sentences are released as they arrive, one
+      whole word at a time, never past `max_chars`;
+    - a later sentence is held until it is complete and released only if the
+      reply still fits `max_chars`;
+    - once the received text passes `max_chars` nothing more can be spoken,
+      so `done` turns true and the caller should stop the stream.
+
+    `feed()` returns the text that may be spoken now, `finish()` what is left
+    once the stream ends (held text that fits, or the comedy ending).
+    """
+
+    def __init__(self, max_chars: int = RESPONSE_MAX_CHARS, max_sentences: int = RESPONSE_MAX_SENTENCES):
+        self.max_chars = max_chars
+        self.max_sentences = max_sentences
+        self.text = ""
+        self.ending = ""
+        self.done = False
+        self._received = ""
+
+    @property
+    def reply(self) -> str:
+        """The shaped reply: what was released, plus the ending if it was cut."""
+        return (self.text.rstrip() + self.ending).strip()
+
+    @property
+    def truncated(self) -> bool:
+        return len(self._received.strip()) > len(self.text.strip())
+
+    def feed(self, text: str) -> str:
+        if self.done:
+            return ""
+        self._received += text
+        if len(self._received.strip()) > self.max_chars:
+            self.done = True
+        return self._release(self._limit())
+
+    def finish(self) -> str:
+        """Call once the stream is over (or was stopped); returns the last text to speak."""
+        if self.done:
+            rest = self._release(self._limit())
+        else:
+            # The stream ended within budget: everything received fits
+            rest = self._release(len(self._received))
+        shaper_stats["replies"] += 1
+        if self.truncated:
+            ending = random.choice(COMEDY_ENDINGS)
+            if self.text.rstrip()[-1:] in ".!?…":
+                # Cut after a whole sentence: the ending is a sentence of its own
+                self.ending = " " + ending[0].upper() + ending[1:]
+            else:
+                # Cut mid-sentence: trail off into the ending
+                self.ending = "... " + ending
+            shaper_stats["truncated"] += 1
+            shaper_stats["chars_dropped"] += len(self._received.strip()) - len(self.text.strip())
+            rest += self.ending
+        return rest
+
+    def _limit(self) -> int:
+        """How much of the received text may be spoken before the stream ends."""
+        received = self._received
+        # Within budget, speak up to the last whole word; a cut at the budget never goes back
+        window = received[:self.max_chars + 1]
+        limit = len(window) - len(window.split()[-1]) if window.split() and not window[-1].isspace() else len(window)
+        if len(received.strip()) > self.max_chars and limit == 0:
+            # One giant word: cut it rather than say nothing
+            limit = self.max_chars
+        ends = sentence_ends(received)
+        if len(ends) >= self.max_sentences:
+            limit = min(limit, ends[self.max_sentences - 1])
+            # Later sentences only whole, and only while the reply fits
+            for end in ends[self.max_sentences:]:
+                if len(received[:end].rstrip()) <= self.max_chars:
+                    limit = end
+        return limit
+
+    def _release(self, limit: int) -> str:
+        if limit <= len(self.text):
+            return ""
+        piece = self._received[len(self.text):limit]
+        self.text += piece
+        return piece
+
+
+async def shape_stream(texts: AsyncIterator[str], shaper: ResponseShaper) -> AsyncIterator[str]:
+    """
+    Yield the shaped pieces of a text stream, closing the stream as soon as
+    the budget is spent instead of paying for tokens that would be dropped.
+    """
+    try:
+        async for text in texts:
+            piece = shaper.feed(text)
+            if piece:
+                yield piece
+            if shaper.done:
+                shaper_stats["stopped_early"] += 1
+                break
+    finally:
+        aclose = getattr(texts, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    rest = shaper.finish()
+    if rest:
+        yield rest
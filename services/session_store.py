@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from .chat_persistence import chat_db
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Resident LLM sessions; past these limits the least recently used ones hibernate
+MAX_RESIDENT_SESSIONS = int(os.getenv("CHAT_SESSIONS_MAX", 500))
+MAX_RESIDENT_BYTES = int(os.getenv("CHAT_SESSIONS_MAX_BYTES", 50_000_000))
+# Sessions idle longer than this hibernate even when there is room
+SESSION_IDLE_TTL = float(os.getenv("CHAT_SESSION_IDLE_TTL", 1800))
+# How often idle and over-budget sessions are swept out between turns
+SESSION_SWEEP_INTERVAL = float(os.getenv("CHAT_SESSION_SWEEP_INTERVAL", 60))
+
+
+def serialize_history(history) -> List[Dict]:
+    """
+    Reduce a chat history to [{"role", "parts": [text, ...]}].
+
+    Accepts Gemini Content objects as well as the plain dicts the chat was
+    seeded with; non-text parts (function calls) are dropped.
+    """
+    compact = []
+    for content in history:
+        if isinstance(content, dict):
+            role = content.get("role")
+            parts = [part for part in content.get("parts", []) if isinstance(part, str)]
+        else:
+            role = content.role
+            parts = [part.text for part in content.parts if getattr(part, "text", "")]
+        if parts:
+            compact.append({"role": role, "parts": parts})
+    return compact
+
+
+def history_bytes(history) -> int:
+    """Approximate resident size of a history: the text it holds."""
+    return sum(len(part) for content in serialize_history(history) for part in content["parts"])
+
+
+class _Entry:
+    __slots__ = ("chat", "last_used", "size", "pins")
+
+    def __init__(self, chat, size: int):
+        self.chat = chat
+        self.last_used = time.monotonic()
+        self.size = size
+        # Turns in flight on this chat; a pinned session is never hibernated
+        self.pins = 0
+
+
+class ChatSessionStore:
+    """
+    Bounded home for live chat sessions, keyed by session id.
+
+    Sessions are kept in LRU order. When there are more than `max_sessions`,
+    more than `max_bytes` of history, or a session has been idle for
+    `idle_ttl`, the least recently used sessions are hibernated: their history
+    is written to chat_history.db as compact JSON and the live chat object is
+    dropped. `get()` rehydrates a hibernated session on its next turn, and
+    creates a fresh one with `create_chat(history)` for an unknown id.
+
+    Eviction runs on every `get()` and, so idle sessions leave even when no
+    new turns arrive, in a background sweep every `sweep_interval` seconds
+    while any session is resident. A turn pins its session with
+    `get(session_id, pin=True)` and unpins it with `release()` once its
+    history is written; pinned sessions are skipped, however long the turn
+    takes, so its write never lands on a chat that was already hibernated.
+    """
+
+    def __init__(self, create_chat: Callable[[List[Dict]], object],
+                 max_sessions: int = MAX_RESIDENT_SESSIONS,
+                 max_bytes: int = MAX_RESIDENT_BYTES,
+                 idle_ttl: float = SESSION_IDLE_TTL,
+                 sweep_interval: float = SESSION_SWEEP_INTERVAL):
+        self.create_chat = create_chat
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = asyncio.Lock()
+        self._sweeper: Optional[asyncio.Task] = None
+        self.stats = {
+            "created": 0,
+            "evicted_lru": 0,
+            "evicted_bytes": 0,
+            "evicted_idle": 0,
+            "rehydrated": 0,
+            "rehydration_ms_total": 0.0,
+            "rehydration_ms_max": 0.0,
+        }
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, session_id: str, pin: bool = False):
+        """
+        Return the live chat for a session, rehydrating or creating it if needed.
+
+        With `pin`, the session stays resident until a matching `release()`.
+        """
+        async with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                self._entries.move_to_end(session_id)
+                self._resize(entry)
+            else:
+                entry = await self._load(session_id)
+                self._entries[session_id] = entry
+                self._bytes += entry.size
+            entry.last_used = time.monotonic()
+            if pin:
+                entry.pins += 1
+            await self._evict()
+            self._ensure_sweeper()
+            return entry.chat
+
+    def release(self, session_id: str):
+        """Unpin a session once its turn is over; its idle time starts now."""
+        entry = self._entries.get(session_id)
+        if entry is None or not entry.pins:
+            return
+        entry.pins -= 1
+        entry.last_used = time.monotonic()
+        # The turn has written its exchange to the history
+        self._resize(entry)
+
+    def _ensure_sweeper(self):
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep())
+
+    async def _sweep(self):
+        """Hibernate idle and over-budget sessions between turns."""
+        while self._entries:
+            await asyncio.sleep(self.sweep_interval)
+            async with self._lock:
+                try:
+                    await self._evict()
+                except Exception as e:
+                    # A failed write leaves the session resident; the next sweep tries again
+                    logger.warning(f"Chat session sweep failed: {e}")
+
+    async def _load(self, session_id: str) -> _Entry:
+        started = time.perf_counter()
+        stored = await asyncio.to_thread(chat_db.take_hibernated_session, session_id)
+        if stored is None:
+            self.stats["created"] += 1
+            chat = self.create_chat([])
+        else:
+            chat = self.create_chat(json.loads(stored))
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.stats["rehydrated"] += 1
+            self.stats["rehydration_ms_total"] += elapsed_ms
+            self.stats["rehydration_ms_max"] = max(self.stats["rehydration_ms_max"], elapsed_ms)
+            logger.info(f"Rehydrated chat session {session_id} in {elapsed_ms:.1f}ms")
+        return _Entry(chat, history_bytes(chat.history))
+
+    def _resize(self, entry: _Entry):
+        size = history_bytes(entry.chat.history)
+        self._bytes += size - entry.size
+        entry.size = size
+
+    async def _evict(self):
+        now = time.monotonic()
+        for session_id in list(self._entries):
+            entry = self._entries[session_id]
+            if entry.pins:
+                # A turn is still running on it and will write its history here
+                continue
+            if now - entry.last_used > self.idle_ttl:
+                reason = "evicted_idle"
+            elif len(self._entries) > self.max_sessions:
+                reason = "evicted_lru"
+            elif self._bytes > self.max_bytes:
+                reason = "evicted_bytes"
+            else:
+                break
+            await self._hibernate(session_id, reason)
+
+    async def _hibernate(self, session_id: str, reason: str):
+        entry = self._entries.pop(session_id)
+        self._resize(entry)
+        self._bytes -= entry.size
+        self.stats[reason] += 1
+        history = json.dumps(serialize_history(entry.chat.history), ensure_ascii=False, separators=(",", ":"))
+        await asyncio.to_thread(chat_db.hibernate_session, session_id, history)
+        logger.info(f"Hibernated chat session {session_id} ({reason}, {len(history)} bytes)")
+
+    def get_stats(self) -> Dict:
+        rehydrated = self.stats["rehydrated"]
+        return {
+            "resident_sessions": len(self._entries),
+            "resident_bytes": self._bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "idle_ttl": self.idle_ttl,
+            "pinned_sessions": sum(1 for entry in self._entries.values() if entry.pins),
+            **self.stats,
+            "rehydration_ms_avg": round(self.stats["rehydration_ms_total"] / rehydrated, 2) if rehydrated else 0.0,
+        }
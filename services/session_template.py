@@ -0,0 +1,99 @@
+import logging
+from typing import Dict, List, Optional, Sequence
+
+from .gemini_clients import gemini_clients
+from .history_manager import estimate_tokens
+from .session_store import serialize_history
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Chats saved before the persona became a system instruction open with it as a user/model pair
+LEGACY_PRIMING_ENTRIES = 2
+
+template_stats = {
+    "sessions_cloned": 0,
+    "legacy_sessions_migrated": 0,
+    "turns_measured": 0,
+    "prompt_tokens_total": 0,
+    "baseline_prompt_tokens_total": 0,
+}
+
+
+class SessionTemplate:
+    """
+    A persona built once and cloned into every new session.
+
+    The persona is the model's system_instruction instead of a priming
+    user/model turn at the head of every chat, so new sessions start from an
+    empty history on the per-key model the client registry already holds.
+    History budgets and hibernated sessions no longer carry the persona.
+
+    The system instruction is still billed as prompt tokens on every turn.
+    Gemini context caching would avoid that, but gemini-1.5 only caches
+    prefixes of 32k tokens or more and the persona is far below that, so it
+    is not used. Each turn's prompt tokens are logged next to an estimate
+    of what the old layout (persona and greeting in the history) would have
+    sent.
+    """
+
+    def __init__(self, system_instruction: str, tools: Sequence = (), legacy_greeting: str = ""):
+        self.system_instruction = system_instruction
+        self.tools = tuple(tools)
+        self.persona_tokens = estimate_tokens([{"role": "user", "parts": [system_instruction]}])
+        # The priming pair old chats opened with: the persona as a user turn, then the model's greeting
+        self.legacy_priming_tokens = estimate_tokens([
+            {"role": "user", "parts": [system_instruction]},
+            {"role": "model", "parts": [legacy_greeting]},
+        ]) if legacy_greeting else self.persona_tokens
+
+        logger.info(f"Persona is a system instruction (~{self.persona_tokens} tokens): chat histories no longer "
+                    f"carry it as a priming turn, so each one is that much shorter")
+
+    def model(self, api_key: str):
+        """The persona's model for this key."""
+        return gemini_clients.model(api_key, tools=self.tools, system_instruction=self.system_instruction)
+
+    def start_chat(self, api_key: str, history: Optional[List] = None):
+        """Clone the template into a new chat, or resume a saved history on it."""
+        history = list(history or [])
+        if self._has_legacy_priming(history):
+            history = history[LEGACY_PRIMING_ENTRIES:]
+            template_stats["legacy_sessions_migrated"] += 1
+        template_stats["sessions_cloned"] += 1
+        return self.model(api_key).start_chat(history=history)
+
+    def record_usage(self, response):
+        """Log a turn's prompt tokens beside the estimate for the persona-in-history layout."""
+        try:
+            usage = response.usage_metadata
+        except Exception:
+            return
+        prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+        if not prompt_tokens:
+            return
+        # Same request with the system instruction swapped back for the priming pair
+        baseline_tokens = prompt_tokens - self.persona_tokens + self.legacy_priming_tokens
+        template_stats["turns_measured"] += 1
+        template_stats["prompt_tokens_total"] += prompt_tokens
+        template_stats["baseline_prompt_tokens_total"] += baseline_tokens
+        logger.info(f"Prompt tokens this turn: {prompt_tokens} "
+                    f"(~{baseline_tokens} with the persona and greeting in the history)")
+
+    def _has_legacy_priming(self, history: List) -> bool:
+        if len(history) < LEGACY_PRIMING_ENTRIES:
+            return False
+        first = serialize_history(history[:1])
+        return bool(first) and first[0]["role"] == "user" and first[0]["parts"][:1] == [self.system_instruction]
+
+    def get_stats(self) -> Dict:
+        measured = template_stats["turns_measured"]
+        return {
+            "persona_tokens": self.persona_tokens,
+            "legacy_priming_tokens": self.legacy_priming_tokens,
+            **template_stats,
+            "prompt_tokens_avg": round(template_stats["prompt_tokens_total"] / measured, 1) if measured else 0.0,
+            "baseline_prompt_tokens_avg":
+                round(template_stats["baseline_prompt_tokens_total"] / measured, 1) if measured else 0.0,
+        }
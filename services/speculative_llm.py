@@ -0,0 +1,152 @@
+import os
+import re
+import asyncio
+import logging
+from typing import Dict, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Start answering a partial transcript before AssemblyAI closes the turn.
+# Off by default: every discarded guess is Gemini spend that bought nothing.
+SPECULATION_ENABLED = os.getenv("SPECULATIVE_LLM", "false").lower() == "true"
+# How long a partial transcript must stay unchanged before we bet on it
+SPECULATION_STABLE_MS = int(os.getenv("SPECULATION_STABLE_MS", 400))
+# Rough characters per token when Gemini does not report usage
+CHARS_PER_TOKEN = 4
+
+# Process-wide counters for speculative generation
+speculation_stats = {
+    "started": 0,
+    "committed": 0,
+    "discarded": 0,
+    "committed_tokens": 0,
+    "wasted_tokens": 0,
+}
+
+
+def get_speculation_stats() -> Dict:
+    decided = speculation_stats["committed"] + speculation_stats["discarded"]
+    return {
+        "enabled": SPECULATION_ENABLED,
+        "stable_ms": SPECULATION_STABLE_MS,
+        **speculation_stats,
+        "hit_rate": round(speculation_stats["committed"] / decided, 3) if decided else 0.0,
+    }
+
+
+def normalize_transcript(text: str) -> str:
+    """Compare transcripts on their words only: case, punctuation and spacing are ignored."""
+    return " ".join(re.sub(r"[^\w\s']", " ", text.lower()).split())
+
+
+class SpeculativeResponse:
+    """
+    A Gemini reply generated from a partial transcript, before end-of-turn.
+
+    Generation runs on a fork of the session's chat, so the session itself is
+    untouched until the reply is committed. If the final transcript matches,
+    the speculation goes to the turn, which may still answer another way
+    (tools, the response cache). Only when the turn speaks it from
+    `text_stream()` (already generated text first, then the rest as it
+    arrives) is it committed and counted as a hit; `close()` at the end of the
+    turn counts its tokens as committed. Otherwise `discard()`, or `close()`
+    on a speculation that was never spoken, cancels it and counts the tokens
+    it used as wasted.
+    """
+
+    def __init__(self, session_id: Optional[str], transcript: str):
+        self.session_id = session_id
+        self.transcript = transcript
+        self.key = normalize_transcript(transcript)
+        self.chat = None
+        self.text = ""
+        self.tokens = 0
+        self.committed = False
+        self.discarded = False
+        self._pieces: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        speculation_stats["started"] += 1
+        logger.info(f"Speculating on partial transcript: '{self.transcript}'")
+        self._task = asyncio.create_task(self._generate())
+
+    def matches(self, transcript: str) -> bool:
+        return normalize_transcript(transcript) == self.key
+
+    async def _generate(self):
+        from .llm_service import get_runtime_api_key, get_chat_session, _iterate_stream_text
+        from .history_manager import history_manager
+        from .response_shaper import GENERATION_CONFIG
+        from .resilience import get_provider
+
+        stream = None
+        try:
+            api_key = get_runtime_api_key('gemini')
+            session_chat = await get_chat_session(self.session_id, api_key)
+            # Read-only: a pending summary fold or truncation is the committed turn's to apply
+            self.chat = session_chat.model.start_chat(history=history_manager.preview(session_chat))
+            # One attempt: a speculation is never worth a retry, and an open breaker skips it
+            stream = await get_provider("gemini").call(
+                lambda: self.chat.send_message_async(self.transcript, stream=True, generation_config=GENERATION_CONFIG),
+                attempts=1, hedge=False)
+            async for text in _iterate_stream_text(stream):
+                self.text += text
+                self._pieces.put_nowait(text)
+            self._pieces.put_nowait(None)
+        except BaseException as e:
+            self._pieces.put_nowait(e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            logger.warning(f"Speculative generation failed for '{self.transcript}': {e}")
+        finally:
+            self.tokens = self._count_tokens(stream)
+
+    def _count_tokens(self, stream) -> int:
+        usage = getattr(stream, "usage_metadata", None)
+        total = getattr(usage, "total_token_count", None)
+        if total:
+            return total
+        return (len(self.transcript) + len(self.text)) // CHARS_PER_TOKEN
+
+    async def text_stream(self):
+        """Yield the reply text, replaying what was generated so far; the first piece commits it."""
+        while True:
+            piece = await self._pieces.get()
+            if piece is None:
+                return
+            if isinstance(piece, BaseException):
+                raise piece
+            if not self.committed:
+                self.commit()
+            yield piece
+
+    def commit(self):
+        self.committed = True
+        speculation_stats["committed"] += 1
+        logger.info(f"Speculation hit for '{self.transcript}' ({len(self.text)} chars already generated)")
+
+    async def close(self):
+        """The turn is over; stop generating if it was abandoned midway."""
+        if not self.committed:
+            await self.discard("unused: the turn never spoke it")
+            return
+        await self._cancel()
+        speculation_stats["committed_tokens"] += self.tokens
+
+    async def discard(self, reason: str):
+        """Cancel the generation and count what it spent as wasted."""
+        if self.discarded:
+            return
+        self.discarded = True
+        await self._cancel()
+        speculation_stats["discarded"] += 1
+        speculation_stats["wasted_tokens"] += self.tokens
+        logger.info(f"Discarded speculation for '{self.transcript}' ({reason}, ~{self.tokens} tokens wasted)")
+
+    async def _cancel(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
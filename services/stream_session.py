@@ -0,0 +1,437 @@
+import os
+import time
+import json
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from .streaming_stt_service import open_streaming_transcriber
+from .turn_dispatcher import TurnDispatcher
+from .bounded_queue import BoundedQueue, QueueOverflowError
+from .audio_protocol import AUDIO_TRANSPORT_BINARY, AUDIO_TRANSPORT_JSON
+from .speculative_llm import SPECULATION_ENABLED, SPECULATION_STABLE_MS, SpeculativeResponse, normalize_transcript
+from utils.audio_framing import PcmFramer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 16kHz 16-bit mono; frames of 50-250ms (50ms = 1600 bytes) go to AssemblyAI
+STT_SAMPLE_RATE = 16_000
+STT_FRAME_MS = int(os.getenv("STT_FRAME_MS", 50))
+# How long to wait for AssemblyAI's Termination event after the client hangs up
+STT_SHUTDOWN_TIMEOUT = 5.0
+# Cancel the turn being answered as soon as the caller starts speaking again
+BARGE_IN_ENABLED = os.getenv("BARGE_IN_ENABLED", "true").lower() == "true"
+# Words a partial transcript needs before it counts as barge-in, so a cough or an
+# "mm-hmm" does not cut the reply off; a finished turn always counts
+BARGE_IN_MIN_WORDS = int(os.getenv("BARGE_IN_MIN_WORDS", 3))
+
+# Per-connection queue budgets; policy is block, drop-oldest or disconnect.
+# Ingress holds browser PCM waiting for AssemblyAI (10s of audio by default),
+# egress holds messages waiting for the client socket.
+INGRESS_MAX_BYTES = int(os.getenv("STREAM_INGRESS_MAX_BYTES", 320_000))
+INGRESS_POLICY = os.getenv("STREAM_INGRESS_POLICY", "drop-oldest")
+EGRESS_MAX_BYTES = int(os.getenv("STREAM_EGRESS_MAX_BYTES", 2_000_000))
+EGRESS_POLICY = os.getenv("STREAM_EGRESS_POLICY", "block")
+# Close code sent when a queue with the disconnect policy overflows ("try again later")
+OVERFLOW_CLOSE_CODE = 1013
+
+# Process-wide counters for the streaming endpoint
+streaming_stats = {
+    "active_sessions": 0,
+    "total_sessions": 0,
+    "messages_sent": 0,
+    "send_latency_ms_total": 0.0,
+    "send_latency_ms_max": 0.0,
+    "overflow_disconnects": 0,
+}
+
+# Sessions currently connected, for per-session queue counters
+active_sessions: Set["StreamSession"] = set()
+
+
+def get_streaming_stats() -> Dict:
+    """Snapshot of streaming endpoint counters, including per-connection overhead."""
+    sent = streaming_stats["messages_sent"]
+    return {
+        **streaming_stats,
+        "send_latency_ms_avg": round(streaming_stats["send_latency_ms_total"] / sent, 3) if sent else 0.0,
+        # receive, send, STT and turn-worker task per connection
+        "tasks_per_session": StreamSession.TASKS_PER_SESSION,
+        "sessions": [session.get_stats() for session in active_sessions],
+    }
+
+
+class TurnChannel:
+    """
+    What a single turn sees of the client socket.
+
+    It quacks like a WebSocket (`send_text`, `send_bytes`, `client_state`) so it
+    can be handed to `run_streaming_turn`, and tags everything it
+    queues with the turn id so the session can drop output of a turn that was
+    abandoned. `binary_audio` tells the turn which audio transport was negotiated.
+    """
+
+    def __init__(self, session: "StreamSession", turn_id: int):
+        self.session = session
+        self.turn_id = turn_id
+
+    @property
+    def client_state(self):
+        return self.session.websocket.client_state
+
+    @property
+    def binary_audio(self) -> bool:
+        return self.session.audio_transport == AUDIO_TRANSPORT_BINARY
+
+    async def send_text(self, message: str):
+        await self.session.send_text(message, turn_id=self.turn_id)
+
+    async def send_bytes(self, data: bytes):
+        await self.session.send_bytes(data, turn_id=self.turn_id)
+
+
+class StreamSession:
+    """
+    One /ws/stream-audio connection, run entirely on the server event loop.
+
+    Three tasks share the connection: the receive task reads PCM frames and
+    control messages from the browser, the STT task bridges audio to AssemblyAI
+    and reacts to turn events, and the send task is the only writer to the socket.
+    Finished turns go to a per-session TurnDispatcher, whose worker answers them
+    one at a time. Anything that wants to talk to the client goes through
+    `send_text`, so messages are pushed the moment they are produced.
+
+    When the caller speaks over the agent (or the client sends `interrupt`), the
+    turn in flight is cancelled, its queued output is discarded and the client is
+    told which turn ids were abandoned.
+
+    With speculation enabled, a partial transcript that stays unchanged for
+    SPECULATION_STABLE_MS starts a Gemini reply early; end-of-turn either hands
+    it to the turn (same words), which commits it only if it speaks it, or
+    throws it away.
+    """
+
+    TASKS_PER_SESSION = 4
+
+    def __init__(self, websocket: WebSocket, session_id: Optional[str], assemblyai_key: Optional[str]):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.assemblyai_key = assemblyai_key
+        # Clients opt into binary audio frames; everyone else gets base64 audio_chunk JSON
+        requested_transport = websocket.query_params.get("audio_transport", AUDIO_TRANSPORT_JSON)
+        self.audio_transport = AUDIO_TRANSPORT_BINARY if requested_transport == AUDIO_TRANSPORT_BINARY else AUDIO_TRANSPORT_JSON
+        self.audio_queue = BoundedQueue(INGRESS_MAX_BYTES, INGRESS_POLICY, sizeof=lambda chunk: len(chunk) if chunk else 0)
+        self.outbox = BoundedQueue(EGRESS_MAX_BYTES, EGRESS_POLICY, sizeof=lambda item: len(item[2]) if item else 0)
+        self._receive_task: Optional[asyncio.Task] = None
+        self._overflowed = False
+        self.turns = TurnDispatcher(self._answer_turn)
+        self._abandoned_turns: Set[int] = set()
+        self._closed = False
+        # Speculation on the current partial transcript, and ones matched to queued turns
+        self._speculation: Optional[SpeculativeResponse] = None
+        self._speculation_timer: Optional[asyncio.Task] = None
+        self._matched_speculations: Dict[int, SpeculativeResponse] = {}
+
+    async def send_text(self, message: str, turn_id: Optional[int] = None):
+        """Queue a text frame for the client; the send task delivers it."""
+        await self._enqueue(message, turn_id)
+
+    async def send_bytes(self, data: bytes, turn_id: Optional[int] = None):
+        """Queue a binary frame for the client; the send task delivers it."""
+        await self._enqueue(data, turn_id)
+
+    async def _enqueue(self, message, turn_id: Optional[int]):
+        if self._closed:
+            raise RuntimeError("Stream session is closed")
+        try:
+            await self.outbox.put((time.perf_counter(), turn_id, message))
+        except QueueOverflowError:
+            self._on_overflow("egress")
+            raise
+
+    async def send_message(self, message: Dict):
+        await self.send_text(json.dumps(message))
+
+    def get_stats(self) -> Dict:
+        return {
+            "session_id": self.session_id,
+            "audio_transport": self.audio_transport,
+            "ingress": self.audio_queue.get_stats(),
+            "egress": self.outbox.get_stats(),
+        }
+
+    def _on_overflow(self, direction: str):
+        """A disconnect-policy queue overflowed: hang up instead of buffering more."""
+        if self._overflowed:
+            return
+        self._overflowed = True
+        streaming_stats["overflow_disconnects"] += 1
+        logger.warning(f"{direction} queue over budget for session {self.session_id}, disconnecting")
+        if self._receive_task is not None and self._receive_task is not asyncio.current_task():
+            self._receive_task.cancel()
+
+    async def interrupt(self, reason: str) -> List[int]:
+        """Cancel the turn in flight and any queued turns, and tell the client."""
+        abandoned = self.turns.cancel_all()
+        for turn_id in abandoned:
+            await self._abandon(turn_id, reason)
+        if abandoned:
+            logger.info(f"Abandoned turns {abandoned} ({reason})")
+        return abandoned
+
+    async def _abandon(self, turn_id: int, reason: str):
+        self._abandoned_turns.add(turn_id)
+        speculation = self._matched_speculations.pop(turn_id, None)
+        if speculation is not None:
+            await speculation.close()
+        await self.send_message({
+            "type": "turn_cancelled",
+            "turn_id": turn_id,
+            "reason": reason,
+            "timestamp": time.time()
+        })
+
+    # --- Tasks ---
+
+    async def _receive_loop(self):
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    logger.info("WebSocket disconnected by client.")
+                    break
+                if message.get("bytes") is not None:
+                    try:
+                        await self.audio_queue.put(message["bytes"])
+                    except QueueOverflowError:
+                        self._on_overflow("ingress")
+                        break
+                elif message.get("text") is not None:
+                    await self._on_control_message(message["text"])
+        except WebSocketDisconnect:
+            logger.info("WebSocket disconnected by client.")
+        except Exception as e:
+            logger.error(f"An error occurred in the websocket: {e}", exc_info=True)
+        finally:
+            # Signal the STT task to stop
+            self.audio_queue.put_unbounded(None)
+
+    async def _send_loop(self):
+        while True:
+            item = await self.outbox.get()
+            if item is None:
+                break
+            queued_at, turn_id, message = item
+            if turn_id in self._abandoned_turns:
+                continue
+            try:
+                if isinstance(message, bytes):
+                    await self.websocket.send_bytes(message)
+                else:
+                    await self.websocket.send_text(message)
+            except Exception as e:
+                logger.warning(f"Dropping message, client socket unavailable: {e}")
+                continue
+            latency_ms = (time.perf_counter() - queued_at) * 1000
+            streaming_stats["messages_sent"] += 1
+            streaming_stats["send_latency_ms_total"] += latency_ms
+            streaming_stats["send_latency_ms_max"] = max(streaming_stats["send_latency_ms_max"], latency_ms)
+            if isinstance(message, bytes):
+                logger.debug(f"Sent {len(message)} byte binary frame to client")
+            else:
+                logger.info(f"Sent message to client: {message[:200]}")
+
+    async def _on_control_message(self, raw: str):
+        try:
+            message = json.loads(raw)
+        except json.JSONDecodeError:
+            logger.warning(f"Ignoring malformed control message: {raw[:100]}")
+            return
+        if message.get("type") == "interrupt":
+            await self.interrupt("client_interrupt")
+
+    async def _drain_audio(self):
+        while await self.audio_queue.get() is not None:
+            pass
+
+    async def _stt_loop(self):
+        """Bridge browser audio to AssemblyAI and handle turn events."""
+        if not self.assemblyai_key:
+            logger.warning("AssemblyAI API key not available in runtime. Streaming transcription may not work.")
+            await self._drain_audio()
+            return
+
+        transcriber = await open_streaming_transcriber(self.assemblyai_key, sample_rate=STT_SAMPLE_RATE)
+        if transcriber is None:
+            await self._drain_audio()
+            return
+
+        audio_finished = False
+
+        async def pump_audio():
+            nonlocal audio_finished
+            # Frame audio to meet AssemblyAI's duration requirements (50-1000ms)
+            framer = PcmFramer(frame_ms=STT_FRAME_MS, sample_rate=STT_SAMPLE_RATE)
+            try:
+                while True:
+                    chunk = await self.audio_queue.get()
+                    if chunk is None:
+                        audio_finished = True
+                        # Send any remaining buffered audio before stopping
+                        tail = framer.flush()
+                        if tail:
+                            await transcriber.send_audio(tail)
+                        break
+
+                    for frame in framer.push(chunk):
+                        await transcriber.send_audio(frame)
+            finally:
+                await transcriber.terminate()
+
+        pump_task = asyncio.create_task(pump_audio())
+        try:
+            async for event in transcriber.events():
+                event_type = event.get("type")
+                if event_type == "Begin":
+                    logger.info(f"Session started: {event.get('id')}")
+                elif event_type == "Turn":
+                    await self._on_turn(event)
+                elif event_type == "Termination":
+                    logger.info(f"Session terminated: {event.get('audio_duration_seconds')}s of audio processed")
+        except Exception as e:
+            logger.error(f"Error during transcription: {e}", exc_info=True)
+        finally:
+            if not pump_task.done():
+                pump_task.cancel()
+            await asyncio.gather(pump_task, return_exceptions=True)
+            await transcriber.close()
+            # Keep consuming so the receive task never blocks on a dead transcriber
+            if not audio_finished:
+                await self._drain_audio()
+            logger.info("Transcription finished.")
+
+    async def _on_turn(self, event: Dict):
+        transcript = event.get("transcript")
+        if not transcript:
+            return
+        logger.info(f"Turn: {transcript} (end_of_turn: {event.get('end_of_turn')})")
+
+        # Barge-in: the caller is talking again, stop answering the previous turn
+        end_of_turn = event.get("end_of_turn")
+        if BARGE_IN_ENABLED and self.turns.busy and (end_of_turn or len(transcript.split()) >= BARGE_IN_MIN_WORDS):
+            await self.interrupt("barge_in")
+
+        if not end_of_turn:
+            if SPECULATION_ENABLED:
+                await self._on_partial(transcript)
+            return
+
+        speculation = await self._take_speculation(transcript)
+        turn_id, dropped_id = self.turns.submit(transcript)
+        if dropped_id is not None:
+            await self._abandon(dropped_id, "queue_full")
+        if speculation is not None:
+            self._matched_speculations[turn_id] = speculation
+        await self.send_message({
+            "type": "turn_end",
+            "turn_id": turn_id,
+            "transcript": transcript,
+            "timestamp": time.time()
+        })
+        logger.info(f"Turn {turn_id} ended - queued transcript for client: '{transcript}'")
+
+    # --- Speculation ---
+
+    async def _on_partial(self, transcript: str):
+        """Restart the stability timer whenever the partial transcript changes."""
+        key = normalize_transcript(transcript)
+        if self._speculation is not None:
+            if self._speculation.key == key:
+                return
+            await self._discard_speculation("partial transcript changed")
+        if self._speculation_timer is not None:
+            self._speculation_timer.cancel()
+        self._speculation_timer = asyncio.create_task(self._speculate_when_stable(transcript))
+
+    async def _speculate_when_stable(self, transcript: str):
+        await asyncio.sleep(SPECULATION_STABLE_MS / 1000)
+        self._speculation_timer = None
+        # Never fork the chat while a turn is still writing to it; tool turns are not worth guessing
+        from .llm_service import needs_tools
+        if self.turns.busy or needs_tools(transcript):
+            return
+        self._speculation = SpeculativeResponse(self.session_id, transcript)
+        self._speculation.start()
+
+    async def _take_speculation(self, transcript: str) -> Optional[SpeculativeResponse]:
+        """At end of turn: hand over the speculation if it guessed these words, else drop it."""
+        if self._speculation_timer is not None:
+            self._speculation_timer.cancel()
+            self._speculation_timer = None
+        speculation, self._speculation = self._speculation, None
+        if speculation is None:
+            return None
+        if speculation.matches(transcript):
+            return speculation
+        await speculation.discard("final transcript differs")
+        return None
+
+    async def _discard_speculation(self, reason: str):
+        speculation, self._speculation = self._speculation, None
+        if speculation is not None:
+            await speculation.discard(reason)
+
+    async def _answer_turn(self, turn_id: int, transcript: str):
+        # --- Day 21: Stream LLM response to Murf WebSocket and send audio to client ---
+        from .turn_pipeline import run_streaming_turn
+        speculation = self._matched_speculations.pop(turn_id, None)
+        try:
+            await run_streaming_turn(
+                transcript, TurnChannel(self, turn_id), session_id=self.session_id, turn_id=turn_id,
+                speculation=speculation
+            )
+        finally:
+            if speculation is not None:
+                await speculation.close()
+
+    async def run(self):
+        streaming_stats["active_sessions"] += 1
+        streaming_stats["total_sessions"] += 1
+        active_sessions.add(self)
+        receive_task = self._receive_task = asyncio.create_task(self._receive_loop())
+        send_task = asyncio.create_task(self._send_loop())
+        stt_task = asyncio.create_task(self._stt_loop())
+        try:
+            # wait() rather than await: the receive task is cancelled on egress overflow
+            await asyncio.wait({receive_task})
+            try:
+                await asyncio.wait_for(stt_task, timeout=STT_SHUTDOWN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning("Transcriber did not terminate in time, closing anyway")
+        finally:
+            for task in (receive_task, stt_task):
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(receive_task, stt_task, return_exceptions=True)
+            if self._speculation_timer is not None:
+                self._speculation_timer.cancel()
+            await self._discard_speculation("session closed")
+            await self.turns.close()
+            for speculation in self._matched_speculations.values():
+                await speculation.close()
+            self._matched_speculations.clear()
+            self._closed = True
+            self.outbox.put_unbounded(None)
+            await send_task
+            if self._overflowed:
+                try:
+                    await self.websocket.close(code=OVERFLOW_CLOSE_CODE)
+                except Exception:
+                    pass
+            active_sessions.discard(self)
+            streaming_stats["active_sessions"] -= 1
+            logger.info("WebSocket connection closed.")
@@ -0,0 +1,96 @@
+import json
+import logging
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urlencode
+
+import websockets
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ASSEMBLYAI_STREAMING_URL = "wss://streaming.assemblyai.com/v3/ws"
+
+
+class AsyncStreamingTranscriber:
+    """
+    Native asyncio client for the AssemblyAI v3 streaming API.
+
+    The SDK's StreamingClient blocks a thread for the whole session; this client
+    speaks the same protocol over `websockets` so a live call costs one socket on
+    the server event loop and nothing else.
+    """
+
+    def __init__(self, api_key: str, sample_rate: int = 16_000, format_turns: bool = False):
+        self.api_key = api_key
+        self.sample_rate = sample_rate
+        self.format_turns = format_turns
+        self._websocket = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._websocket is not None and self._websocket.open
+
+    async def connect(self):
+        """Open the streaming session."""
+        params = {
+            "sample_rate": self.sample_rate,
+            "encoding": "pcm_s16le",
+            "format_turns": "true" if self.format_turns else "false",
+        }
+        url = f"{ASSEMBLYAI_STREAMING_URL}?{urlencode(params)}"
+        self._websocket = await websockets.connect(url, extra_headers={"Authorization": self.api_key})
+        logger.info("Connected to AssemblyAI streaming API")
+
+    async def send_audio(self, chunk: bytes):
+        """Send one frame of 16-bit mono PCM audio."""
+        await self._websocket.send(chunk)
+
+    async def events(self) -> AsyncIterator[Dict]:
+        """
+        Yield decoded server events (Begin, Turn, Termination) as they arrive.
+        The iterator ends after the Termination event or when the socket closes.
+        """
+        try:
+            async for raw in self._websocket:
+                if isinstance(raw, bytes):
+                    continue
+                try:
+                    event = json.loads(raw)
+                except json.JSONDecodeError:
+                    logger.warning(f"Ignoring malformed AssemblyAI message: {raw[:100]}")
+                    continue
+
+                if "error" in event:
+                    logger.error(f"AssemblyAI streaming error: {event['error']}")
+
+                yield event
+
+                if event.get("type") == "Termination":
+                    break
+        except websockets.exceptions.ConnectionClosed as e:
+            logger.info(f"AssemblyAI streaming connection closed: {e}")
+
+    async def terminate(self):
+        """Ask the server to flush the session; it answers with a Termination event."""
+        if self.is_open:
+            try:
+                await self._websocket.send(json.dumps({"type": "Terminate"}))
+            except websockets.exceptions.ConnectionClosed:
+                pass
+
+    async def close(self):
+        if self._websocket is not None:
+            await self._websocket.close()
+            self._websocket = None
+
+
+async def open_streaming_transcriber(api_key: str, sample_rate: int = 16_000) -> Optional[AsyncStreamingTranscriber]:
+    """Create and connect a transcriber, or return None if the connection fails."""
+    transcriber = AsyncStreamingTranscriber(api_key, sample_rate=sample_rate)
+    try:
+        await transcriber.connect()
+        return transcriber
+    except Exception as e:
+        logger.error(f"Could not connect to AssemblyAI streaming API: {e}")
+        return None
@@ -1,8 +1,11 @@
 import os
+import httpx
 import assemblyai as aai
 from fastapi import HTTPException
 import logging
 
+from .resilience import CircuitOpenError, get_provider
+
 def get_runtime_api_key() -> str:
     """Get AssemblyAI API key from runtime storage, NO fallback to environment."""
     try:
@@ -12,6 +15,10 @@ def get_runtime_api_key() -> str:
     except:
         return ''
 
+def assemblyai_retryable(error: BaseException) -> bool:
+    """Dropped connections and timeouts are worth another attempt."""
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
 def transcribe_audio_data(audio_data: bytes) -> str:
     logging.info("--- ENTERING STT SERVICE ---")
     
@@ -32,7 +39,8 @@ def transcribe_audio_data(audio_data: bytes) -> str:
         transcriber = aai.Transcriber(config=config)
         
         logging.info("Step 3: Calling transcriber.transcribe()")
-        transcript = transcriber.transcribe(audio_data)
+        transcript = get_provider("assemblyai").call_sync(
+            lambda: transcriber.transcribe(audio_data), retryable=assemblyai_retryable)
         logging.info(f"Step 4: Transcription complete. Status: {transcript.status}")
 
         if transcript.status == aai.TranscriptStatus.error:
@@ -46,6 +54,9 @@ def transcribe_audio_data(audio_data: bytes) -> str:
         logging.info(f"Step 5: Transcription successful. Text: '{transcript.text[:50]}...'")
         return transcript.text
         
+    except CircuitOpenError as e:
+        logging.error(f"Skipping transcription: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logging.error(f"An unexpected exception occurred in STT service: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Could not transcribe audio data: {e}")
@@ -0,0 +1,122 @@
+import re
+from typing import List, Tuple
+
+# Sentence end: terminal punctuation (plus closing quotes/brackets) followed by whitespace
+SENTENCE_END = re.compile(r"[.!?…]+[\"')\]]*\s+")
+# Clause break: only used once a segment is already long enough to be worth speaking
+CLAUSE_BREAK = re.compile(r"[,;:—–]\s+")
+# Words that end in a period without ending the sentence
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "no"}
+
+
+class SentenceSegmenter:
+    """
+    Turns a stream of LLM tokens into speakable segments for incremental TTS.
+
+    `feed()` returns every segment completed by the new text: whole sentences,
+    or clauses once a pending segment reaches `clause_chars`. The very first
+    segment may be cut at a clause sooner (`first_clause_chars`) so the voice
+    starts as early as possible. `flush()` returns whatever is left at the end.
+    """
+
+    def __init__(self, min_chars: int = 12, clause_chars: int = 80, first_clause_chars: int = 30):
+        self.min_chars = min_chars
+        self.clause_chars = clause_chars
+        self.first_clause_chars = first_clause_chars
+        self._buffer = ""
+        self._emitted = 0
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        segments = []
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                break
+            segment = self._buffer[:cut].strip()
+            self._buffer = self._buffer[cut:]
+            if segment:
+                segments.append(segment)
+                self._emitted += 1
+        return segments
+
+    def flush(self) -> str:
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return rest
+
+    def _find_cut(self):
+        for match in SENTENCE_END.finditer(self._buffer):
+            if match.end() < self.min_chars or self._is_abbreviation(match.start()):
+                continue
+            return match.end()
+
+        clause_chars = self.first_clause_chars if self._emitted == 0 else self.clause_chars
+        if len(self._buffer) >= clause_chars:
+            for match in CLAUSE_BREAK.finditer(self._buffer):
+                if match.end() >= self.min_chars and not self._buffer[match.start() - 1:match.start()].isdigit():
+                    return match.end()
+        return None
+
+    def _is_abbreviation(self, end: int) -> bool:
+        return is_abbreviation(self._buffer, end)
+
+
+def is_abbreviation(text: str, end: int) -> bool:
+    """True if the terminal punctuation at `text[end]` closes an abbreviation, not a sentence."""
+    if text[end] != ".":
+        return False
+    word = re.search(r"([\w.]+)$", text[:end])
+    if not word:
+        return False
+    token = word.group(1).lower().rstrip(".")
+    # Single letters ("A. Kumar") and known abbreviations
+    return len(token) == 1 or token in ABBREVIATIONS
+
+
+def sentence_ends(text: str) -> List[int]:
+    """Offsets just past each complete sentence in `text` (after its trailing whitespace)."""
+    return [match.end() for match in SENTENCE_END.finditer(text) if not is_abbreviation(text, match.start())]
+
+
+def split_long_text(text: str, max_chars: int, part_chars: int, first_part_chars: int) -> List[str]:
+    """
+    Cut text too long for one synthesis request into parts at sentence ends.
+
+    Sentences are packed into parts of up to `part_chars`, the first one
+    smaller (`first_part_chars`) so its audio is ready sooner. A sentence
+    longer than its part is cut at clause breaks, then between words, so a
+    run-on text without sentence ends gets the same part sizes. No part is
+    longer than `max_chars`.
+    """
+    sentences, start = [], 0
+    for end in sentence_ends(text) + [len(text)]:
+        sentence = text[start:end].strip()
+        start = end
+        if sentence:
+            sentences.append(sentence)
+
+    parts, current = [], ""
+    for sentence in sentences:
+        while sentence:
+            target = min(first_part_chars if not parts else part_chars, max_chars)
+            if current and len(current) + 1 + len(sentence) > target:
+                parts.append(current)
+                current = ""
+            elif not current and len(sentence) > target:
+                piece, sentence = _cut_sentence(sentence, target)
+                parts.append(piece)
+            else:
+                current = f"{current} {sentence}" if current else sentence
+                sentence = ""
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _cut_sentence(sentence: str, max_chars: int) -> Tuple[str, str]:
+    """The longest head of `sentence` within `max_chars` that ends at a clause break or word, and the rest."""
+    window = sentence[:max_chars + 1]
+    breaks = [match.end() for match in CLAUSE_BREAK.finditer(window)]
+    cut = breaks[-1] if breaks else window.rfind(" ") + 1 or max_chars
+    return sentence[:cut].strip(), sentence[cut:].strip()
@@ -0,0 +1,141 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Shared deadline for the tools of one turn; whatever finished by then goes into the prompt
+TOOL_DEADLINE_SECONDS = float(os.getenv("TOOL_DEADLINE_SECONDS", 8))
+
+tool_stats = {
+    "runs": 0,
+    "search_completed": 0,
+    "search_timed_out": 0,
+    "image_completed": 0,
+    "image_late": 0,
+    "tool_errors": 0,
+}
+
+# Images still being painted after their turn's deadline; referenced so they are not collected
+_late_images: Set[asyncio.Task] = set()
+
+
+def get_tool_stats() -> Dict:
+    return {"deadline_seconds": TOOL_DEADLINE_SECONDS, **tool_stats}
+
+
+class ToolResults:
+    """What the tools of a turn produced by the deadline."""
+
+    def __init__(self, query: str):
+        self.query = query
+        self.search_result: Optional[str] = None
+        self.search_timed_out = False
+        self.image_response: Optional[str] = None
+        self.image_path: Optional[str] = None
+        self.image_pending = False
+        self.late_image: Optional[asyncio.Task] = None
+
+    def build_prompt(self) -> str:
+        """Merge every tool result into one prompt for the comedian."""
+        parts = []
+        if self.search_result is not None:
+            parts.append(f"I searched the web and found: {self.search_result}")
+        elif self.search_timed_out:
+            parts.append("I tried searching the web but it took too long, so I have no fresh information.")
+        if self.image_pending:
+            parts.append("I am still painting an image for them; it will show up in the UI in a moment.")
+        elif self.image_path:
+            parts.append(f"I created an image for them: {self.image_response}\n\nMention that they can see the image in the UI.")
+        elif self.image_response is not None:
+            parts.append(f"I tried to create an image but: {self.image_response}")
+        details = "\n\n".join(parts)
+        return (f"User asked: '{self.query}'\n\n{details}\n\n"
+                f"Now give a short, funny response that uses this while maintaining your comedy style.")
+
+    def cancel_late_image(self):
+        if self.late_image is not None and not self.late_image.done():
+            self.late_image.cancel()
+
+
+def _forget_late_image(task: asyncio.Task):
+    _late_images.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        tool_stats["tool_errors"] += 1
+        logger.error(f"Late image generation failed: {task.exception()}")
+
+
+async def run_tools(query: str, search: bool, image: bool,
+                    on_image: Optional[Callable[[str], Awaitable]] = None,
+                    deadline: float = TOOL_DEADLINE_SECONDS) -> ToolResults:
+    """
+    Run web search and image generation concurrently under one deadline.
+
+    `on_image(image_path)` is awaited as soon as an image lands, even if that
+    is after the deadline: the turn answers without it, and the picture shows
+    up in the UI when it is ready. A search still running at the deadline is
+    cancelled.
+    """
+    from .web_search_service import search_and_format_for_comedy
+    from .image_generation_service import generate_and_format_for_comedy
+
+    results = ToolResults(query)
+    tool_stats["runs"] += 1
+    started = time.perf_counter()
+
+    async def paint():
+        response, image_path = await generate_and_format_for_comedy(query)
+        if image_path and on_image is not None:
+            try:
+                await on_image(image_path)
+            except Exception as e:
+                logger.warning(f"Could not deliver generated image {image_path}: {e}")
+        return response, image_path
+
+    search_task = asyncio.create_task(search_and_format_for_comedy(query)) if search else None
+    image_task = asyncio.create_task(paint()) if image else None
+    tasks = {task for task in (search_task, image_task) if task is not None}
+    try:
+        await asyncio.wait(tasks, timeout=deadline)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    if search_task is not None:
+        if not search_task.done():
+            search_task.cancel()
+            results.search_timed_out = True
+            tool_stats["search_timed_out"] += 1
+            logger.warning(f"Web search missed the {deadline:.1f}s tool deadline for '{query}'")
+        elif search_task.exception() is not None:
+            tool_stats["tool_errors"] += 1
+            logger.error(f"Web search failed: {search_task.exception()}")
+            results.search_result = "nothing, my internet search is broken right now"
+        else:
+            results.search_result = search_task.result()
+            tool_stats["search_completed"] += 1
+
+    if image_task is not None:
+        if not image_task.done():
+            results.image_pending = True
+            results.late_image = image_task
+            _late_images.add(image_task)
+            image_task.add_done_callback(_forget_late_image)
+            tool_stats["image_late"] += 1
+            logger.info(f"Image for '{query}' still painting after {deadline:.1f}s, answering without it")
+        elif image_task.exception() is not None:
+            tool_stats["tool_errors"] += 1
+            logger.error(f"Image generation failed: {image_task.exception()}")
+            results.image_response = "my art machine crashed"
+        else:
+            results.image_response, results.image_path = image_task.result()
+            tool_stats["image_completed"] += 1
+
+    logger.info(f"Tools for '{query}' finished in {(time.perf_counter() - started) * 1000:.0f}ms "
+                f"(search={search}, image={image})")
+    return results
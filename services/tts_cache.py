@@ -0,0 +1,290 @@
+import os
+import json
+import uuid
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Opt-in reuse of synthesized audio for text already spoken with the same voice and format.
+# Off by default: clips are written to TTS_CACHE_DIR, which needs disk space to spare.
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "false").lower() == "true"
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache")
+# Disk tier budget; least recently used files are deleted beyond it
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", 256_000_000))
+# RAM tier budget, for the clips asked for most often
+TTS_CACHE_RAM_BYTES = int(os.getenv("TTS_CACHE_RAM_BYTES", 16_000_000))
+# Size of the reads that stream a cached clip
+TTS_CACHE_CHUNK_BYTES = 64 * 1024
+
+AUDIO_EXTENSIONS = {"MP3": "mp3", "WAV": "wav"}
+MEDIA_TYPES = {"mp3": "audio/mpeg", "wav": "audio/wav"}
+
+
+def tts_cache_key(text: str, voice_id: str, style: Optional[str] = None, audio_format: str = "MP3",
+                  sample_rate: float = 44100.0) -> str:
+    """Content address of a clip: hash of everything that changes the audio, plus its file extension."""
+    identity = json.dumps([text.strip(), voice_id, style or "", audio_format.upper(), float(sample_rate)])
+    extension = AUDIO_EXTENSIONS.get(audio_format.upper(), audio_format.lower())
+    return f"{hashlib.sha256(identity.encode('utf-8')).hexdigest()}.{extension}"
+
+
+def is_cache_key(key: str) -> bool:
+    digest, _, extension = key.partition(".")
+    return len(digest) == 64 and all(c in "0123456789abcdef" for c in digest) and extension in MEDIA_TYPES
+
+
+def _read_chunks(f) -> Iterator[bytes]:
+    with f:
+        while True:
+            chunk = f.read(TTS_CACHE_CHUNK_BYTES)
+            if not chunk:
+                return
+            yield chunk
+
+
+class TTSCache:
+    """
+    Content-addressed cache of synthesized audio, in RAM over an on-disk LRU.
+
+    Clips are keyed by `tts_cache_key`, so the same text in the same voice,
+    style and format is only ever synthesized once. Every clip is written to
+    disk; the most recently used small ones are also kept in RAM. Both tiers
+    are bounded and evict least recently used first.
+
+    Writes go to a unique temp file that is renamed into place, so concurrent
+    writers of the same clip (threads, or other worker processes sharing the
+    directory) never expose a partial file and the last rename wins with
+    identical bytes. Eviction only unlinks: a reader that already opened the
+    file keeps reading it, and a file evicted by another process is simply a
+    miss here.
+    """
+
+    def __init__(self, directory: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_BYTES,
+                 ram_bytes: int = TTS_CACHE_RAM_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ram_bytes = ram_bytes
+        self._lock = threading.Lock()
+        self._ram: "OrderedDict[str, bytes]" = OrderedDict()
+        self._ram_used = 0
+        # File name -> size, least recently used first
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_used = 0
+        self._loaded = False
+        self.stats = {
+            "ram_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "bytes_saved": 0,
+            "ram_evictions": 0,
+            "disk_evictions": 0,
+            "write_errors": 0,
+        }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _load(self):
+        """Index what earlier runs left on disk, oldest first; called under the lock."""
+        if self._loaded:
+            return
+        self._loaded = True
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and is_cache_key(entry.name):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._disk[name] = size
+            self._disk_used += size
+        if files:
+            logger.info(f"TTS cache: {len(files)} clips ({self._disk_used} bytes) on disk in {self.directory}")
+
+    def lookup(self, key: str) -> bool:
+        """True (and counted as a hit) if the clip is cached; the caller can then serve it by key."""
+        return self._find(key) is not None
+
+    def get(self, key: str) -> Optional[bytes]:
+        """The cached clip, or None."""
+        found = self._find(key)
+        if found is None:
+            return None
+        if isinstance(found, bytes):
+            return found
+        try:
+            with open(found, "rb") as f:
+                audio = f.read()
+        except FileNotFoundError:
+            # Evicted by another process between the lookup and the read
+            self._forget(key)
+            return None
+        self._remember(key, audio)
+        return audio
+
+    async def stream(self, key: str, chunk_bytes: int = TTS_CACHE_CHUNK_BYTES) -> AsyncIterator[bytes]:
+        """Yield the cached clip in chunks, straight from RAM or read piece by piece from disk."""
+        found = await asyncio.to_thread(self._find, key)
+        if found is None:
+            return
+        if isinstance(found, bytes):
+            for offset in range(0, len(found), chunk_bytes):
+                yield found[offset:offset + chunk_bytes]
+            return
+        try:
+            f = await asyncio.to_thread(open, found, "rb")
+        except FileNotFoundError:
+            self._forget(key)
+            return
+        try:
+            while True:
+                chunk = await asyncio.to_thread(f.read, chunk_bytes)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            f.close()
+
+    def open_clip(self, key: str) -> Optional[Iterator[bytes]]:
+        """
+        Chunks of a clip for serving, without counting a hit, or None. The
+        file is opened up front, so an eviction after this call cannot cut
+        the response short.
+        """
+        with self._lock:
+            audio = self._ram.get(key)
+            if audio is None:
+                self._load()
+        if audio is not None:
+            return iter([audio])
+        try:
+            f = open(self._path(key), "rb")
+        except FileNotFoundError:
+            return None
+        return _read_chunks(f)
+
+    def put(self, key: str, audio: bytes):
+        """Store a freshly synthesized clip in both tiers."""
+        if not audio:
+            return
+        with self._lock:
+            self._load()
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(audio)
+            os.replace(temp_path, path)
+        except OSError as e:
+            self.stats["write_errors"] += 1
+            logger.warning(f"TTS cache: could not write {key}: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            previous = self._disk.pop(key, None)
+            if previous is not None:
+                self._disk_used -= previous
+            self._disk[key] = len(audio)
+            self._disk_used += len(audio)
+            self.stats["stores"] += 1
+            evicted = self._evict_disk()
+        self._remember(key, audio)
+        for name in evicted:
+            try:
+                os.remove(self._path(name))
+            except FileNotFoundError:
+                pass
+
+    def _find(self, key: str):
+        """RAM bytes or a disk path for the clip, counting the hit or miss."""
+        with self._lock:
+            audio = self._ram.get(key)
+            if audio is not None:
+                self._ram.move_to_end(key)
+                self.stats["ram_hits"] += 1
+                self.stats["bytes_saved"] += len(audio)
+                return audio
+            self._load()
+            size = self._disk.get(key)
+            if size is None:
+                self.stats["misses"] += 1
+                return None
+            self._disk.move_to_end(key)
+            self.stats["disk_hits"] += 1
+            self.stats["bytes_saved"] += size
+        path = self._path(key)
+        try:
+            # Keep the on-disk order close to the LRU order for the next restart
+            os.utime(path)
+        except FileNotFoundError:
+            self._forget(key)
+            return None
+        return path
+
+    def _remember(self, key: str, audio: bytes):
+        """Keep a small clip in the RAM tier; big ones would push out many small ones, so they stay on disk."""
+        if len(audio) > self.ram_bytes // 8:
+            return
+        with self._lock:
+            if key in self._ram:
+                self._ram.move_to_end(key)
+                return
+            self._ram[key] = audio
+            self._ram_used += len(audio)
+            while self._ram_used > self.ram_bytes and self._ram:
+                _, dropped = self._ram.popitem(last=False)
+                self._ram_used -= len(dropped)
+                self.stats["ram_evictions"] += 1
+
+    def _evict_disk(self) -> list:
+        """Drop least recently used files from the index until within budget; called under the lock."""
+        evicted = []
+        while self._disk_used > self.max_bytes and len(self._disk) > 1:
+            name, size = self._disk.popitem(last=False)
+            self._disk_used -= size
+            dropped = self._ram.pop(name, None)
+            if dropped is not None:
+                self._ram_used -= len(dropped)
+            evicted.append(name)
+            self.stats["disk_evictions"] += 1
+        return evicted
+
+    def _forget(self, key: str):
+        with self._lock:
+            size = self._disk.pop(key, None)
+            if size is not None:
+                self._disk_used -= size
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            hits = self.stats["ram_hits"] + self.stats["disk_hits"]
+            lookups = hits + self.stats["misses"]
+            return {
+                "enabled": TTS_CACHE_ENABLED,
+                "ram_entries": len(self._ram),
+                "ram_bytes": self._ram_used,
+                "ram_max_bytes": self.ram_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_used,
+                "disk_max_bytes": self.max_bytes,
+                **self.stats,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+# Global TTS cache instance
+tts_cache = TTSCache()
+
+def get_tts_cache_stats() -> Dict:
+    return tts_cache.get_stats()
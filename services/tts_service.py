@@ -1,8 +1,23 @@
 import os
-from murf import Murf
+import time
+import base64
+import asyncio
+import httpx
+from typing import AsyncIterator, List
 from murf.core.api_error import ApiError
 from fastapi import HTTPException
 
+from .resilience import CircuitOpenError, get_provider
+from .tts_cache import MEDIA_TYPES, TTS_CACHE_ENABLED, tts_cache, tts_cache_key
+from .voice_selector import voice_selector
+from .murf_clients import MURF_REQUEST_OPTIONS, murf_clients
+from .audio_protocol import mp3_frames
+from .long_form_tts import is_long_form, long_form_tts, split_for_synthesis
+
+# REST synthesis settings, part of every cache key
+TTS_FORMAT = "MP3"
+TTS_SAMPLE_RATE = 44100.0
+
 def get_runtime_api_key() -> str:
     """Get Murf API key from runtime storage only, NO fallback to environment."""
     try:
@@ -12,63 +27,231 @@ def get_runtime_api_key() -> str:
     except:
         return ''
 
+def murf_retryable(error: BaseException) -> bool:
+    """Throttling, server errors and dropped connections are worth another attempt."""
+    if isinstance(error, ApiError):
+        return error.status_code is not None and (error.status_code == 429 or error.status_code >= 500)
+    return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
+
+def tts_cache_url(key: str) -> str:
+    """Where main.py serves a cached clip."""
+    return f"/tts/cache/{key}"
+
+def audio_url_available(audio_url: str) -> bool:
+    """Whether a clip URL handed out earlier still plays: cached clips can be evicted."""
+    if audio_url.startswith(tts_cache_url("")):
+        return TTS_CACHE_ENABLED and tts_cache.lookup(audio_url[len(tts_cache_url("")):])
+    return True
+
+def _murf_generate(murf_client, text: str, voice_id: str, encode_as_base_64: bool):
+    """One Murf REST synthesis, through the provider's breaker and retries."""
+    return get_provider("murf").call_sync(
+        lambda: murf_client.text_to_speech.generate(
+            format=TTS_FORMAT,
+            sample_rate=TTS_SAMPLE_RATE,
+            text=text,
+            voice_id=voice_id,  # Indian English male voice optimized for comedy
+            # The audio itself, rather than only a link to it, so it can be cached
+            encode_as_base_64=encode_as_base_64,
+            request_options=MURF_REQUEST_OPTIONS,
+        ),
+        retryable=murf_retryable,
+    )
+
+def _http_error(e: Exception) -> HTTPException:
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, CircuitOpenError):
+        return HTTPException(status_code=503, detail=str(e))
+    if isinstance(e, ApiError):
+        return HTTPException(status_code=e.status_code, detail=f"Murf API error: {e.body}")
+    return HTTPException(status_code=500, detail=f"Could not generate TTS audio: {e}")
+
 def generate_tts_audio(text: str, voice_id: str = "en-IN-rohan") -> str:
     """
     Generate TTS audio with comedian persona voice settings.
     Using Indian English male voice with customized parameters for standup comedy feel.
+
+    Text that was already synthesized in this voice is served from the TTS
+    cache instead of asking Murf again. Text too long for one Murf request
+    is synthesized part after part in this thread; async callers should
+    await `generate_long_tts_audio` instead, which renders the parts
+    concurrently.
     """
     # Get API key from runtime storage only
     api_key = get_runtime_api_key()
     if not api_key:
         raise HTTPException(status_code=500, detail="Murf API key not configured. Please configure it in the API settings.")
-    
-    # Create client with runtime API key
-    murf_client = Murf(api_key=api_key)
+
+    if is_long_form(text):
+        return _generate_long_tts_audio_sync(murf_clients.client(api_key), text, voice_id)
+
+    cache_key = tts_cache_key(text, voice_id, audio_format=TTS_FORMAT, sample_rate=TTS_SAMPLE_RATE)
+    if TTS_CACHE_ENABLED and tts_cache.lookup(cache_key):
+        print(f"⚡ TTS cache hit for '{text[:30]}...' ({voice_id})")
+        return tts_cache_url(cache_key)
+
+    # This key's pooled client: a warm keep-alive connection instead of a new handshake per call
+    murf_client = murf_clients.client(api_key)
     try:
-        if len(text) > 2900:
-            text = text[:2900]
-        
         # Enhanced TTS settings for comedian persona
-        tts_resp = murf_client.text_to_speech.generate(
-            format="MP3",
-            sample_rate=44100.0,
-            text=text,
-            voice_id=voice_id  # Indian English male voice optimized for comedy
-        )
+        tts_resp = _murf_generate(murf_client, text, voice_id, encode_as_base_64=TTS_CACHE_ENABLED)
+        encoded_audio = getattr(tts_resp, "encoded_audio", None)
+        if TTS_CACHE_ENABLED and encoded_audio:
+            tts_cache.put(cache_key, base64.b64decode(encoded_audio))
+            return tts_cache_url(cache_key)
         return tts_resp.audio_file
-    except ApiError as e:
-        raise HTTPException(status_code=e.status_code, detail=f"Murf API error: {e.body}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Could not generate TTS audio: {e}")
+        raise _http_error(e)
 
-def generate_comedian_tts_audio(text: str) -> str:
+def _synthesize_part(murf_client, text: str, voice_id: str) -> bytes:
+    """Audio of one part of a long text; parts are cached on their own too, so a repeated paragraph is reused."""
+    cache_key = tts_cache_key(text, voice_id, audio_format=TTS_FORMAT, sample_rate=TTS_SAMPLE_RATE)
+    if TTS_CACHE_ENABLED:
+        audio = tts_cache.get(cache_key)
+        if audio is not None:
+            return audio
+    tts_resp = _murf_generate(murf_client, text, voice_id, encode_as_base_64=True)
+    audio = base64.b64decode(tts_resp.encoded_audio or "")
+    if not audio:
+        raise RuntimeError(f"Murf returned no audio for part '{text[:30]}...'")
+    if TTS_CACHE_ENABLED:
+        tts_cache.put(cache_key, audio)
+    return audio
+
+def _generate_long_tts_audio_sync(murf_client, text: str, voice_id: str) -> str:
+    """Long text for blocking callers: its parts in order, paced by the shared long-form rate limit."""
+    cache_key = tts_cache_key(text, voice_id, audio_format=TTS_FORMAT, sample_rate=TTS_SAMPLE_RATE)
+    if TTS_CACHE_ENABLED and tts_cache.lookup(cache_key):
+        print(f"⚡ TTS cache hit for '{text[:30]}...' ({voice_id})")
+        return tts_cache_url(cache_key)
+
+    parts = split_for_synthesis(text)
+    print(f"📚 Long text ({len(text)} chars): synthesizing {len(parts)} parts one after another")
+    audio = bytearray()
+    try:
+        for part in parts:
+            delay = long_form_tts.limiter.reserve()
+            if delay:
+                time.sleep(delay)
+            audio.extend(mp3_frames(_synthesize_part(murf_client, part, voice_id)))
+    except Exception as e:
+        raise _http_error(e)
+    return _long_form_url(cache_key, bytes(audio))
+
+def _long_form_url(cache_key: str, audio: bytes) -> str:
     """
-    Specialized TTS function for comedian persona with optimal Indian English male voices.
+    Where a joined long-form clip is served from. Murf never saw the whole
+    text, so there is no Murf URL for it: with the cache on it is served
+    from the cache like any synthesized clip; with it off the clip is
+    returned inline as a data URL rather than stored anywhere.
+    """
+    if TTS_CACHE_ENABLED:
+        tts_cache.put(cache_key, audio)
+        return tts_cache_url(cache_key)
+    return f"data:{MEDIA_TYPES['mp3']};base64,{base64.b64encode(audio).decode('ascii')}"
+
+async def stream_tts_audio(text: str, voice_id: str = "en-IN-rohan") -> AsyncIterator[bytes]:
+    """
+    Yield MP3 audio for text of any length, part by part as it is ready.
+
+    Long text is cut at sentence ends and the parts synthesized concurrently
+    under the long-form rate limit; the first part is yielded as soon as it
+    is done while later ones are still rendering. Parts are stripped down to
+    their MP3 frames, so the chunks concatenate into one playable file, which
+    is added to the TTS cache once complete (when the cache is on).
+    """
+    api_key = get_runtime_api_key()
+    if not api_key:
+        raise HTTPException(status_code=500, detail="Murf API key not configured. Please configure it in the API settings.")
+
+    cache_key = tts_cache_key(text, voice_id, audio_format=TTS_FORMAT, sample_rate=TTS_SAMPLE_RATE)
+    if TTS_CACHE_ENABLED:
+        cached = False
+        async for chunk in tts_cache.stream(cache_key):
+            cached = True
+            yield chunk
+        if cached:
+            print(f"⚡ TTS cache hit for '{text[:30]}...' ({voice_id})")
+            return
+
+    parts = split_for_synthesis(text) if is_long_form(text) else [text.strip()]
+    audio = bytearray()
+    async for frames in _stream_parts(murf_clients.client(api_key), parts, voice_id):
+        if TTS_CACHE_ENABLED:
+            audio.extend(frames)
+        yield frames
+    if TTS_CACHE_ENABLED and len(parts) > 1:
+        # A single part is already cached under this same key
+        await asyncio.to_thread(tts_cache.put, cache_key, bytes(audio))
+
+async def _stream_parts(murf_client, parts: List[str], voice_id: str) -> AsyncIterator[bytes]:
+    """The parts' MP3 frames in order, synthesized concurrently under the long-form rate limit."""
+    async def synthesize(part: str) -> AsyncIterator[bytes]:
+        yield await asyncio.to_thread(_synthesize_part, murf_client, part, voice_id)
+
+    if len(parts) > 1:
+        print(f"📚 Long text: synthesizing {len(parts)} parts in parallel")
+    try:
+        async for _, clip in long_form_tts.stream(parts, synthesize):
+            yield mp3_frames(clip)
+    except Exception as e:
+        raise _http_error(e)
+
+async def generate_long_tts_audio(text: str, voice_id: str = "en-IN-rohan") -> str:
+    """
+    Synthesize text too long for one Murf request, its parts concurrently;
+    returns the URL of the joined clip (see `_long_form_url`).
     """
-    # Get API key from runtime storage only
     api_key = get_runtime_api_key()
     if not api_key:
         raise HTTPException(status_code=500, detail="Murf API key not configured. Please configure it in the API settings.")
-    
-    # Create client with runtime API key
-    murf_client = Murf(api_key=api_key)
-    
-    # Best Indian English male voices for comedy (in order of preference)
-    indian_male_voices = [
-        "en-IN-rohan",      # Best choice: Conversational, Promo, Narration - perfect for comedy
-        "en-IN-aarav",      # Good alternative: Conversational style
-        "en-IN-eashwar",    # Another option: Narration, Conversational
-        "en-US-ronnie",     # Supports Indian English + multiple emotions (Angry, Sad, etc.)
-    ]
-    
-    for voice in indian_male_voices:
-        try:
-            print(f"🎭 Trying comedian voice: {voice}")
-            return generate_tts_audio(text, voice_id=voice)
-        except Exception as e:
-            print(f"❌ Voice {voice} failed: {e}")
-            continue
-    
+
+    cache_key = tts_cache_key(text, voice_id, audio_format=TTS_FORMAT, sample_rate=TTS_SAMPLE_RATE)
+    if TTS_CACHE_ENABLED and await asyncio.to_thread(tts_cache.lookup, cache_key):
+        print(f"⚡ TTS cache hit for '{text[:30]}...' ({voice_id})")
+        return tts_cache_url(cache_key)
+
+    audio = bytearray()
+    async for frames in _stream_parts(murf_clients.client(api_key), split_for_synthesis(text), voice_id):
+        audio.extend(frames)
+    return await asyncio.to_thread(_long_form_url, cache_key, bytes(audio))
+
+# Best Indian English male voices for comedy (in order of preference)
+COMEDIAN_VOICES = [
+    "en-IN-rohan",      # Best choice: Conversational, Promo, Narration - perfect for comedy
+    "en-IN-aarav",      # Good alternative: Conversational style
+    "en-IN-eashwar",    # Another option: Narration, Conversational
+    "en-US-ronnie",     # Supports Indian English + multiple emotions (Angry, Sad, etc.)
+]
+
+def murf_unavailable(error: BaseException) -> bool:
+    """Murf itself is down or throttling (retries already spent); another voice won't help."""
+    return isinstance(error, HTTPException) and error.status_code in (429, 502, 503, 504)
+
+async def generate_comedian_tts_audio(text: str) -> str:
+    """
+    Specialized TTS function for comedian persona with optimal Indian English male voices.
+
+    The voices are tried healthiest first, with a backup voice started when
+    the current one is slower than usual; the first audio wins.
+    """
+    # Get API key from runtime storage only
+    if not get_runtime_api_key():
+        raise HTTPException(status_code=500, detail="Murf API key not configured. Please configure it in the API settings.")
+
+    if is_long_form(text):
+        # Hedging a whole long text across voices would multiply its cost; the healthiest voice reads it
+        return await generate_long_tts_audio(text, voice_id=voice_selector.rank(COMEDIAN_VOICES)[0])
+
+    try:
+        return await voice_selector.first_success(
+            COMEDIAN_VOICES, lambda voice: generate_tts_audio(text, voice_id=voice), give_up=murf_unavailable)
+    except Exception as e:
+        if murf_unavailable(e):
+            print(f"❌ Murf unavailable, not trying other voices: {e.detail}")
+            raise
+
     # Fallback to default
     print("⚠️ All preferred voices failed, using default")
-    return generate_tts_audio(text)
+    return await asyncio.to_thread(generate_tts_audio, text)
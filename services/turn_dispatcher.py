@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Finished turns waiting behind the one being answered, per session
+TURN_QUEUE_SIZE = 4
+
+# Process-wide counters for end-of-turn work
+turn_stats = {
+    "turns_submitted": 0,
+    "turns_completed": 0,
+    "turns_failed": 0,
+    "turns_dropped": 0,
+    "turns_cancelled": 0,
+    "active_workers": 0,
+}
+
+
+def get_turn_stats() -> Dict:
+    return dict(turn_stats)
+
+
+class TurnDispatcher:
+    """
+    Runs end-of-turn LLM/TTS work for one session on the server event loop.
+
+    A single worker task drains a bounded queue, so turns of a session are
+    answered strictly in order and the whole server shares one loop instead of
+    spinning up a thread and event loop per turn. When the queue is full the
+    oldest waiting turn is dropped: the caller has already said something newer.
+    `submit` returns the dropped id so the client can be told, as for `cancel_all`.
+
+    Every turn gets an increasing id and runs as its own task, so `cancel_all`
+    can abandon the turn in flight (barge-in) without stopping the worker.
+    """
+
+    def __init__(self, handler: Callable[[int, str], Awaitable], max_pending: int = TURN_QUEUE_SIZE):
+        self.handler = handler
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._worker: Optional[asyncio.Task] = None
+        self._next_turn_id = 1
+        self._current: Optional[asyncio.Task] = None
+        self._current_turn_id: Optional[int] = None
+
+    @property
+    def busy(self) -> bool:
+        """True while a turn is being answered or waiting to be."""
+        return self._current is not None or not self.queue.empty()
+
+    def submit(self, transcript: str) -> Tuple[int, Optional[int]]:
+        """
+        Queue a finished turn; must be called from the event loop. Returns its
+        id and the id of the pending turn dropped to make room, if any.
+        """
+        dropped_id = None
+        if self.queue.full():
+            dropped_id, dropped = self.queue.get_nowait()
+            self.queue.task_done()
+            turn_stats["turns_dropped"] += 1
+            logger.warning(f"Turn queue full, dropping oldest pending turn {dropped_id}: '{dropped}'")
+
+        turn_id = self._next_turn_id
+        self._next_turn_id += 1
+        self.queue.put_nowait((turn_id, transcript))
+        turn_stats["turns_submitted"] += 1
+
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+        return turn_id, dropped_id
+
+    def cancel_all(self) -> List[int]:
+        """Abandon the turn in flight and everything queued; return the abandoned ids."""
+        abandoned = []
+        while not self.queue.empty():
+            turn_id, _ = self.queue.get_nowait()
+            self.queue.task_done()
+            abandoned.append(turn_id)
+        if self._current is not None and not self._current.done():
+            self._current.cancel()
+            abandoned.append(self._current_turn_id)
+        turn_stats["turns_cancelled"] += len(abandoned)
+        return sorted(abandoned)
+
+    async def _run(self):
+        turn_stats["active_workers"] += 1
+        try:
+            while True:
+                turn_id, transcript = await self.queue.get()
+                task = asyncio.create_task(self.handler(turn_id, transcript))
+                self._current, self._current_turn_id = task, turn_id
+                try:
+                    # wait() rather than await: a cancelled turn must not stop the worker
+                    await asyncio.wait({task})
+                finally:
+                    if not task.done():
+                        task.cancel()
+                    self._current, self._current_turn_id = None, None
+                    self.queue.task_done()
+
+                if task.cancelled():
+                    logger.info(f"Turn {turn_id} cancelled")
+                elif task.exception() is not None:
+                    turn_stats["turns_failed"] += 1
+                    logger.error(f"Error processing turn {turn_id} '{transcript}': {task.exception()}")
+                else:
+                    turn_stats["turns_completed"] += 1
+        finally:
+            turn_stats["active_workers"] -= 1
+
+    async def close(self):
+        """Stop the worker, abandoning any turn still queued or in flight."""
+        if self._worker is not None:
+            current = self._current
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            if current is not None:
+                await asyncio.gather(current, return_exceptions=True)
+            self._worker = None
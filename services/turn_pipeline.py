@@ -0,0 +1,516 @@
+import os
+import json
+import time
+import asyncio
+import inspect
+import logging
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from .stt_service import transcribe_audio_data
+from .tts_service import audio_url_available, generate_comedian_tts_audio
+from .llm_service import STREAM_VOICE_ID, reply_stream, response_cache
+from .resilience import get_provider
+from .text_segmenter import SentenceSegmenter
+from .audio_protocol import AUDIO_FRAME_PAYLOAD_BYTES, Base64ChunkEncoder, pack_audio_frame
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Longest we wait for Murf to finish speaking once the LLM reply is complete
+MURF_FINAL_TIMEOUT = 30
+
+STAGES = ("stt", "llm", "tts")
+
+# Per pipeline and stage: how far into the turn each stage produced its first output and finished
+pipeline_stats: Dict[str, Dict[str, Dict[str, float]]] = {}
+
+# Time-to-first-audio for the sentence-pipelined streaming path
+tts_pipeline_stats = {
+    "turns": 0,
+    "first_audio_ms_total": 0.0,
+    "llm_complete_ms_total": 0.0,
+    # How long before the full LLM reply existed the voice had already started
+    "head_start_ms_total": 0.0,
+}
+
+# hook(turn, stage, event, elapsed_ms), event is "first" or "done"; may be a coroutine function
+StageHook = Callable[["Turn", str, str, float], Optional[Awaitable]]
+
+
+def get_tts_pipeline_stats() -> Dict:
+    turns = tts_pipeline_stats["turns"]
+    if not turns:
+        return {"turns": 0}
+    return {
+        "turns": turns,
+        "first_audio_ms_avg": round(tts_pipeline_stats["first_audio_ms_total"] / turns, 1),
+        "llm_complete_ms_avg": round(tts_pipeline_stats["llm_complete_ms_total"] / turns, 1),
+        "head_start_ms_avg": round(tts_pipeline_stats["head_start_ms_total"] / turns, 1),
+    }
+
+
+def get_pipeline_stats() -> Dict:
+    """Average time into the turn at which each stage of each pipeline first produced output and finished."""
+    snapshot = {}
+    for name, stages in pipeline_stats.items():
+        snapshot[name] = {}
+        for stage, counters in stages.items():
+            snapshot[name][stage] = {
+                "turns": counters["turns"],
+                "first_ms_avg": round(counters["first_ms_total"] / counters["firsts"], 1) if counters["firsts"] else None,
+                "done_ms_avg": round(counters["done_ms_total"] / counters["turns"], 1) if counters["turns"] else None,
+            }
+    return snapshot
+
+
+class Turn:
+    """
+    One question and its answer as it moves through a TurnPipeline.
+
+    The endpoint fills in what it knows up front (query or audio, session,
+    callbacks); the stages fill in the rest as they go: the LLM stage sets
+    `reply` and, for cached answers, `cached`/`cached_audio`/`cached_audio_url`;
+    the request path's TTS stage sets `audio_url` when it synthesizes; the pipeline
+    records when each stage produced its first output and when it finished.
+    """
+
+    def __init__(self, query: str = "", session_id: Optional[str] = None, turn_id: Optional[int] = None,
+                 speculation=None, on_retry=None, on_image=None, hooks: List[StageHook] = ()):
+        self.query = query
+        self.session_id = session_id
+        self.turn_id = turn_id
+        self.speculation = speculation
+        self.on_retry = on_retry
+        self.on_image = on_image
+        self.hooks = list(hooks)
+        # Set by the pipeline: whether its speech stage can replay cached audio
+        self.wants_audio = False
+        self.reply = ""
+        self.cached = False
+        self.cached_audio: Optional[bytes] = None
+        self.cached_audio_url: Optional[str] = None
+        self.cache_key: Optional[tuple] = None
+        self.audio = bytearray()
+        self.audio_url: Optional[str] = None
+        self.started = time.perf_counter()
+        self.marks: Dict[str, float] = {}
+
+    def elapsed_ms(self, stage: str, event: str) -> Optional[float]:
+        return self.marks.get(f"{stage}_{event}")
+
+
+async def _one(item) -> AsyncIterator:
+    yield item
+
+
+class TurnPipeline:
+    """
+    STT -> LLM -> TTS for one turn, each stage an async generator.
+
+    A stage is `stage(turn, upstream)` and yields as soon as it has something:
+    the STT stage turns audio into transcripts, the LLM stage transcripts into
+    reply text, the TTS stage reply text into audio. Stages are chained, not
+    run one after another, so the voice can start while the reply is still
+    being written. Every stage is timed (first output, done); hooks registered
+    on the pipeline or the turn see each event, and the averages show up in
+    /api/metrics. Closing or cancelling the pipeline closes every stage.
+
+    /agent/chat and the streaming WebSocket run the same LLM stage, so caching,
+    tools, retries and the reply budget behave the same on both. They differ in
+    what they plug in around it: an uploaded recording is transcribed in one
+    go, while streaming turns arrive already transcribed by the session's
+    realtime transcriber (which has to run continuously to detect turns) and
+    enter at the LLM stage. Speech is a single Murf REST call for the request
+    path and sentence-by-sentence Murf WebSocket synthesis for streaming.
+    """
+
+    def __init__(self, name: str, stt, llm, tts, hooks: List[StageHook] = (), replays_audio: bool = False):
+        self.name = name
+        self.stages = {"stt": stt, "llm": llm, "tts": tts}
+        self.hooks = list(hooks)
+        # The TTS stage can speak a cached answer's audio instead of synthesizing it again
+        self.replays_audio = replays_audio
+        pipeline_stats[name] = {
+            stage: {"turns": 0, "firsts": 0, "first_ms_total": 0.0, "done_ms_total": 0.0} for stage in STAGES
+        }
+
+    async def run(self, turn: Turn, audio: Optional[AsyncIterator[bytes]] = None, until: str = "tts") -> AsyncIterator:
+        """
+        Yield the output of stage `until` for this turn. Without `audio` the
+        turn enters at the LLM stage with `turn.query` as its transcript.
+        """
+        turn.wants_audio = self.replays_audio and until == "tts"
+        if audio is not None:
+            upstream = self._timed(turn, "stt", self.stages["stt"](turn, audio))
+        else:
+            upstream = _one(turn.query)
+        upstream = self._timed(turn, "llm", self.stages["llm"](turn, upstream))
+        if until == "tts":
+            upstream = self._timed(turn, "tts", self.stages["tts"](turn, upstream))
+        async with aclosing(upstream):
+            async for item in upstream:
+                yield item
+        self._cache_answer(turn)
+
+    async def _timed(self, turn: Turn, stage: str, source: AsyncIterator) -> AsyncIterator:
+        """Pass a stage's output through, marking its first item and its end."""
+        first = True
+        async with aclosing(source):
+            async for item in source:
+                if first:
+                    first = False
+                    await self._mark(turn, stage, "first")
+                yield item
+        await self._mark(turn, stage, "done")
+
+    async def _mark(self, turn: Turn, stage: str, event: str):
+        elapsed_ms = (time.perf_counter() - turn.started) * 1000
+        turn.marks[f"{stage}_{event}"] = elapsed_ms
+        counters = pipeline_stats[self.name][stage]
+        if event == "first":
+            counters["firsts"] += 1
+            counters["first_ms_total"] += elapsed_ms
+        else:
+            counters["turns"] += 1
+            counters["done_ms_total"] += elapsed_ms
+        for hook in self.hooks + turn.hooks:
+            result = hook(turn, stage, event, elapsed_ms)
+            if inspect.isawaitable(result):
+                await result
+
+    def _cache_answer(self, turn: Turn):
+        """Store a fresh answer with the audio the TTS stage produced for it (bytes or a clip URL)."""
+        if turn.cache_key is None or not turn.reply:
+            return
+        if turn.cached:
+            if turn.audio_url:
+                # The hit had no playable clip for this endpoint: keep the new one for the next hit
+                response_cache.put(turn.cache_key, turn.reply, audio_url=turn.audio_url)
+            return
+        response_cache.put(turn.cache_key, turn.reply, bytes(turn.audio) if turn.audio else None,
+                           audio_url=turn.audio_url)
+
+
+# --- Stages ---
+
+async def transcribe_recording(turn: Turn, audio: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """STT stage for an uploaded recording: one transcript for the whole file."""
+    recording = b"".join([chunk async for chunk in audio])
+    logger.info("Transcribing audio...")
+    transcript = await asyncio.to_thread(transcribe_audio_data, recording)
+    logger.info(f"Transcription successful: '{transcript}'")
+    yield transcript
+
+
+async def synthesize_reply(turn: Turn, texts: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    TTS stage for the request path: the whole reply in one Murf REST call;
+    yields the audio URL. A cached answer's clip is handed out again instead.
+    """
+    async for _ in texts:
+        pass
+    if turn.cached_audio_url and audio_url_available(turn.cached_audio_url):
+        logger.info("Replaying the cached answer's audio")
+        yield turn.cached_audio_url
+        return
+    logger.info("Generating comedian TTS audio...")
+    audio_url = await generate_comedian_tts_audio(turn.reply)
+    logger.info(f"Comedian TTS audio generated successfully: {audio_url}")
+    turn.audio_url = audio_url
+    yield audio_url
+
+
+async def speak_sentences(turn: Turn, texts: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """
+    TTS stage for the streaming path: each finished sentence goes to a Murf
+    context as soon as the LLM stage completes it, and audio is yielded as
+    Murf produces it, while the rest of the reply is still being written.
+    A cached answer's audio is replayed instead.
+    """
+    from .murf_websocket_service import get_murf_service
+
+    texts = texts.__aiter__()
+    first = await anext(texts, None)
+    if first is None:
+        return
+    if turn.cached_audio:
+        async for _ in texts:
+            pass
+        for offset in range(0, len(turn.cached_audio), AUDIO_FRAME_PAYLOAD_BYTES):
+            yield turn.cached_audio[offset:offset + AUDIO_FRAME_PAYLOAD_BYTES]
+        return
+
+    audio: asyncio.Queue = asyncio.Queue()
+    context = None
+    relay_task: Optional[asyncio.Task] = None
+    finished = False
+
+    async def relay(murf_context):
+        async for chunk in murf_context.audio_chunks():
+            audio.put_nowait(chunk)
+
+    async def speak(segment: str, end: bool = False):
+        """Send a finished sentence to Murf, opening the context on first use."""
+        nonlocal context, relay_task
+        if context is None:
+            context = await get_murf_service().open_streaming_context(voice_id=STREAM_VOICE_ID)
+            relay_task = asyncio.create_task(relay(context))
+        await context.send_text(segment, end=end)
+
+    async def feed():
+        segmenter = SentenceSegmenter()
+        async with aclosing(texts):
+            for segment in segmenter.feed(first):
+                await speak(segment)
+            async for text in texts:
+                for segment in segmenter.feed(text):
+                    await speak(segment)
+        # Speak whatever is left after the last sentence break and close the context
+        rest = segmenter.flush()
+        if rest:
+            await speak(rest, end=True)
+        elif context is not None:
+            await context.end()
+
+    feeder = asyncio.create_task(feed())
+    try:
+        deadline = None
+        while True:
+            if not audio.empty():
+                yield audio.get_nowait()
+                continue
+            if feeder.done():
+                feeder.result()
+                if relay_task is None:
+                    return
+                if relay_task.done():
+                    relay_task.result()
+                    finished = True
+                    return
+                # The reply is complete; Murf gets MURF_FINAL_TIMEOUT to finish speaking it
+                if deadline is None:
+                    deadline = time.monotonic() + MURF_FINAL_TIMEOUT
+                if time.monotonic() >= deadline:
+                    raise asyncio.TimeoutError("Murf did not finish speaking in time")
+                waiting_on = relay_task
+            else:
+                waiting_on = feeder
+            getter = asyncio.ensure_future(audio.get())
+            try:
+                await asyncio.wait({getter, waiting_on}, return_when=asyncio.FIRST_COMPLETED,
+                                   timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            finally:
+                if not getter.done():
+                    getter.cancel()
+            if getter.done() and not getter.cancelled():
+                yield getter.result()
+    finally:
+        for task in (feeder, relay_task):
+            if task is not None and not task.done():
+                task.cancel()
+        await asyncio.gather(*[task for task in (feeder, relay_task) if task is not None], return_exceptions=True)
+        if context is not None:
+            if not finished:
+                await context.clear()
+            await context.close()
+
+
+request_pipeline = TurnPipeline("request", transcribe_recording, reply_stream, synthesize_reply)
+streaming_pipeline = TurnPipeline("streaming", None, reply_stream, speak_sentences, replays_audio=True)
+
+
+# --- Endpoints ---
+
+async def run_request_turn(session_id: str, recording: bytes) -> str:
+    """/agent/chat: transcribe the recording, answer it, return the URL of the spoken answer."""
+    turn = Turn(session_id=session_id)
+    audio_url = ""
+    async for audio_url in request_pipeline.run(turn, audio=_one(recording)):
+        pass
+    logger.info(f"LLM response received: '{turn.reply}'")
+    return audio_url
+
+
+async def run_text_turn(turn: Turn) -> str:
+    """Answer `turn.query` without speech; returns the reply."""
+    async for _ in request_pipeline.run(turn, until="llm"):
+        pass
+    return turn.reply
+
+
+async def run_streaming_turn(query: str, websocket=None, session_id: Optional[str] = None,
+                             turn_id: Optional[int] = None, speculation=None) -> Optional[str]:
+    """
+    Answer a streaming turn: the reply is spoken sentence by sentence and the
+    audio relayed to the client as Murf produces it, so the voice starts while
+    Gemini is still generating. Returns the response text.
+
+    The coroutine may be cancelled at any await (barge-in); the LLM stage then
+    rolls the chat history back so the abandoned turn leaves no trace.
+
+    `speculation` is a SpeculativeResponse that guessed this query: its text,
+    possibly still being generated, is spoken instead of asking Gemini again.
+    """
+    # Check WebSocket connection state early
+    websocket_available = False
+    if websocket:
+        try:
+            websocket_available = not websocket.client_state.name == 'DISCONNECTED'
+            if websocket_available:
+                print("🔗 WebSocket connection is active")
+            else:
+                print("⚠️ WebSocket is disconnected")
+        except Exception as e:
+            print(f"❌ Error checking WebSocket state: {e}")
+            websocket_available = False
+
+    # Clients that negotiated binary frames get raw audio with a small header,
+    # everyone else gets base64 audio_chunk messages that concatenate cleanly
+    binary_audio = bool(websocket) and getattr(websocket, "binary_audio", False)
+    base64_encoder = Base64ChunkEncoder()
+    audio_stats = {"chunks": 0, "bytes": 0}
+
+    async def send_audio_to_client(audio: bytes, final: bool = False):
+        nonlocal websocket_available
+        if not (websocket_available and websocket):
+            return
+        try:
+            if binary_audio:
+                for offset in range(0, len(audio), AUDIO_FRAME_PAYLOAD_BYTES):
+                    audio_stats["chunks"] += 1
+                    await websocket.send_bytes(pack_audio_frame(turn_id, audio_stats["chunks"], audio[offset:offset + AUDIO_FRAME_PAYLOAD_BYTES]))
+            else:
+                data = base64_encoder.encode(audio) + (base64_encoder.flush() if final else "")
+                if data:
+                    audio_stats["chunks"] += 1
+                    chunk_message = {
+                        "type": "audio_chunk",
+                        "turn_id": turn_id,
+                        "chunk_id": audio_stats["chunks"],
+                        "data": data,
+                        "timestamp": time.time()
+                    }
+                    await websocket.send_text(json.dumps(chunk_message))
+        except Exception as e:
+            print(f"❌ Failed to send audio chunk {audio_stats['chunks']}: {e}")
+            websocket_available = False  # Mark as unavailable after error
+
+    async def send_image_to_client(image_path: str):
+        """Tell the client where the generated image is, as soon as it exists."""
+        if not websocket:
+            return
+        # The image_path might contain the full path, so we need to handle it properly
+        if image_path.startswith('/'):
+            # It's already a URL path
+            image_url = image_path
+        elif image_path.startswith('static/'):
+            # It's a file path, convert to URL
+            image_url = f"/{image_path}"
+        else:
+            # Fallback: assume it's just the filename
+            image_url = f"/static/generated_images/{os.path.basename(image_path)}"
+
+        image_message = {
+            "type": "image_generated",
+            "turn_id": turn_id,
+            "image_path": image_path,
+            "image_url": image_url,
+            "timestamp": time.time()
+        }
+        await websocket.send_text(json.dumps(image_message))
+        print(f"📤 Sent image info to client: {image_path} -> {image_url}")
+
+    async def announce_retry(attempt: int, delay: float, error: BaseException):
+        """Gemini failed transiently; tell the user while the resilience layer backs off."""
+        max_attempts = get_provider("gemini").max_attempts
+        print(f"⏳ Gemini call failed ({error}). Retrying in {delay:.1f}s... [attempt {attempt + 1}/{max_attempts}]")
+        if websocket:
+            retry_message = {
+                "type": "retry_toast",
+                "turn_id": turn_id,
+                "message": f"Gemini is busy. Retrying in {delay:.1f}s... (attempt {attempt + 1}/{max_attempts})",
+                "attempt": attempt + 1,
+                "max_retries": max_attempts,
+                "timestamp": time.time()
+            }
+            try:
+                await websocket.send_text(json.dumps(retry_message))
+            except Exception as e:
+                print(f"⚠️ Could not send retry toast: {e}")
+
+    async def on_stage(turn: Turn, stage: str, event: str, elapsed_ms: float):
+        if stage == "tts" and event == "first":
+            print(f"\n🔊 First audio {elapsed_ms:.0f}ms into the turn")
+        elif stage == "llm" and event == "done" and turn.reply.strip():
+            print("\n--- LLM response complete, flushing Murf context ---")
+            print(f"📝 Full response content: '{turn.reply.strip()}'")
+            # Send agent response text to client (audio may already be playing)
+            if websocket:
+                response_text_message = {
+                    "type": "agent_response_text",
+                    "turn_id": turn_id,
+                    "text": turn.reply.strip(),
+                    "timestamp": time.time()
+                }
+                if turn.cached:
+                    response_text_message["cached"] = True
+                await websocket.send_text(json.dumps(response_text_message))
+                print(f"📤 Sent agent response text to client: '{turn.reply.strip()[:100]}...'")
+
+    turn = Turn(query, session_id=session_id, turn_id=turn_id, speculation=speculation,
+                on_retry=announce_retry, on_image=send_image_to_client, hooks=[on_stage])
+    try:
+        async for audio in streaming_pipeline.run(turn):
+            audio_stats["bytes"] += len(audio)
+            if turn.cache_key is not None and not turn.cached:
+                # Keep a copy of the synthesized audio so this answer can be cached
+                turn.audio.extend(audio)
+            await send_audio_to_client(audio)
+        await send_audio_to_client(b"", final=True)
+    except asyncio.CancelledError:
+        print(f"🛑 Turn {turn_id} cancelled: '{query}'")
+        raise
+    except Exception as e:
+        print(f"❌ Error streaming LLM response to Murf and client: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+
+    if not turn.reply.strip():
+        print("⚠️ No content to send to Murf - response is empty!")
+        return None
+    if not audio_stats["bytes"]:
+        print("❌ Failed to get audio from Murf")
+        return None
+
+    if not turn.cached:
+        first_audio_ms = turn.elapsed_ms("tts", "first")
+        llm_complete_ms = turn.elapsed_ms("llm", "done")
+        tts_pipeline_stats["turns"] += 1
+        tts_pipeline_stats["first_audio_ms_total"] += first_audio_ms
+        tts_pipeline_stats["llm_complete_ms_total"] += llm_complete_ms
+        tts_pipeline_stats["head_start_ms_total"] += llm_complete_ms - first_audio_ms
+        print(f"⏱️ First audio at {first_audio_ms:.0f}ms, LLM finished at {llm_complete_ms:.0f}ms "
+              f"(voice started {llm_complete_ms - first_audio_ms:.0f}ms before the full reply existed)")
+
+    # Send completion message only if websocket is still connected
+    try:
+        if websocket_available and websocket:
+            completion_message = {
+                "type": "audio_complete",
+                "turn_id": turn_id,
+                "total_chunks": audio_stats["chunks"],
+                "total_length": audio_stats["bytes"],
+                "binary": binary_audio,
+                "timestamp": time.time()
+            }
+            if turn.cached:
+                completion_message["cached"] = True
+            await websocket.send_text(json.dumps(completion_message))
+            print(f"🎉 [Day 21] Audio streaming to client complete!")
+    except Exception as e:
+        print(f"❌ Failed to send completion message: {e}")
+
+    return turn.reply.strip()
@@ -0,0 +1,209 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, TypeVar
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Start the next voice when the current one has not answered after this long;
+# a voice with a latency history waits VOICE_HEDGE_MULTIPLIER x its usual latency instead
+VOICE_HEDGE_AFTER_SECONDS = float(os.getenv("VOICE_HEDGE_AFTER_SECONDS", 3.0))
+VOICE_HEDGE_MULTIPLIER = 2.0
+# Never hedge sooner than this, however fast a voice usually is
+VOICE_HEDGE_MIN_SECONDS = 0.5
+# Voices synthesizing the same text at once, at most
+VOICE_HEDGE_MAX_PARALLEL = int(os.getenv("VOICE_HEDGE_MAX_PARALLEL", 2))
+# Weight of the newest outcome in the moving success rate and latency
+VOICE_HEALTH_ALPHA = 0.2
+# Voices slower than this on average rank below healthy fast ones
+VOICE_SLOW_SECONDS = 6.0
+# A voice that stopped being tried drifts back to full health with this half-life
+VOICE_HEALTH_RECOVERY_SECONDS = 300.0
+
+T = TypeVar("T")
+
+
+class VoiceHealth:
+    """Moving success rate and latency of one voice; updated from worker threads."""
+
+    def __init__(self, voice_id: str):
+        self.voice_id = voice_id
+        # Optimistic until proven otherwise, so untried voices keep their preference order
+        self._success_rate = 1.0
+        self._updated = time.monotonic()
+        self.latency: Optional[float] = None
+        self.attempts = 0
+        self.successes = 0
+        self.failures = 0
+
+    def record(self, ok: bool, seconds: float):
+        self.attempts += 1
+        rate = self.success_rate
+        self._success_rate = rate + VOICE_HEALTH_ALPHA * ((1.0 if ok else 0.0) - rate)
+        self._updated = time.monotonic()
+        if ok:
+            self.successes += 1
+            self.latency = seconds if self.latency is None else self.latency + VOICE_HEALTH_ALPHA * (seconds - self.latency)
+        else:
+            self.failures += 1
+
+    @property
+    def success_rate(self) -> float:
+        """Moving success rate, recovering towards 1.0 while the voice goes untried."""
+        recovered = 1.0 - 0.5 ** ((time.monotonic() - self._updated) / VOICE_HEALTH_RECOVERY_SECONDS)
+        return self._success_rate + (1.0 - self._success_rate) * recovered
+
+    @property
+    def slow(self) -> bool:
+        return self.latency is not None and self.latency > VOICE_SLOW_SECONDS
+
+    def hedge_after(self) -> float:
+        if self.latency is None:
+            return VOICE_HEDGE_AFTER_SECONDS
+        return max(VOICE_HEDGE_MIN_SECONDS, self.latency * VOICE_HEDGE_MULTIPLIER)
+
+    def get_stats(self) -> Dict:
+        return {
+            "success_rate": round(self.success_rate, 3),
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "attempts": self.attempts,
+            "successes": self.successes,
+            "failures": self.failures,
+        }
+
+
+class VoiceSelector:
+    """
+    Picks the voice for a synthesis, hedging across candidate voices.
+
+    Every attempt's outcome and latency is remembered per voice, including
+    attempts that lost a race, so the next call starts from the healthiest
+    voice: higher recent success rate first, very slow voices after fast
+    ones, the caller's preference order otherwise. The first voice gets a
+    head start of about twice its usual latency; if it has not answered by
+    then, or fails, the next voice starts alongside it. The first success
+    wins and the rest are abandoned.
+
+    Synthesis is blocking (the Murf SDK), so attempts run in worker threads.
+    An abandoned thread cannot be stopped; it runs to completion, its outcome
+    still counts towards its voice's health, and its audio ends up in the TTS
+    cache.
+    """
+
+    def __init__(self, max_parallel: int = VOICE_HEDGE_MAX_PARALLEL):
+        self.max_parallel = max(1, max_parallel)
+        self._health: Dict[str, VoiceHealth] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "fallbacks": 0,
+            "all_failed": 0,
+        }
+
+    def health(self, voice_id: str) -> VoiceHealth:
+        with self._lock:
+            health = self._health.get(voice_id)
+            if health is None:
+                health = self._health[voice_id] = VoiceHealth(voice_id)
+            return health
+
+    def rank(self, voices: Sequence[str]) -> List[str]:
+        """Candidates, healthiest first; the given order breaks ties."""
+        preference = {voice: index for index, voice in enumerate(voices)}
+        return sorted(voices, key=lambda voice: (
+            -round(self.health(voice).success_rate, 1), self.health(voice).slow, preference[voice]))
+
+    def _measured(self, voice_id: str, synthesize: Callable[[str], T]) -> Callable[[], T]:
+        def attempt() -> T:
+            started = time.monotonic()
+            try:
+                result = synthesize(voice_id)
+            except BaseException:
+                with self._lock:
+                    self._health[voice_id].record(False, time.monotonic() - started)
+                raise
+            with self._lock:
+                self._health[voice_id].record(True, time.monotonic() - started)
+            return result
+        return attempt
+
+    async def first_success(self, voices: Sequence[str], synthesize: Callable[[str], T],
+                            give_up: Callable[[BaseException], bool] = lambda e: False) -> T:
+        """
+        Run blocking `synthesize(voice_id)` over the ranked voices, hedged, and
+        return the first result. `give_up(error)` marks failures another voice
+        cannot fix (the provider itself is down); no further voices are started
+        after one, though attempts already running may still win.
+        """
+        self.stats["requests"] += 1
+        order = self.rank(voices)
+        pending: Dict[asyncio.Task, str] = {}
+        launched: List[str] = []
+        errors: List[BaseException] = []
+        stop_error: Optional[BaseException] = None
+
+        def launch():
+            voice_id = order[len(launched)]
+            launched.append(voice_id)
+            self.health(voice_id)
+            print(f"🎭 Trying comedian voice: {voice_id}")
+            pending[asyncio.create_task(asyncio.to_thread(self._measured(voice_id, synthesize)))] = voice_id
+
+        def can_launch() -> bool:
+            return stop_error is None and len(launched) < len(order) and len(pending) < self.max_parallel
+
+        launch()
+        try:
+            while pending:
+                # Hedge once the newest attempt has had its usual time plus margin
+                timeout = self.health(launched[-1]).hedge_after() if can_launch() else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.stats["hedges"] += 1
+                    print(f"⏱️ Voice {launched[-1]} is slow (>{timeout:.1f}s), starting a backup voice alongside it")
+                    launch()
+                    continue
+                for task in done:
+                    voice_id = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        errors.append(e)
+                        print(f"❌ Voice {voice_id} failed: {getattr(e, 'detail', e)}")
+                        if give_up(e):
+                            stop_error = e
+                        continue
+                    if voice_id != launched[0]:
+                        self.stats["hedge_wins" if not errors else "fallbacks"] += 1
+                    return result
+                # A failed voice is replaced right away rather than after the hedge delay
+                if can_launch():
+                    launch()
+            self.stats["all_failed"] += 1
+            raise stop_error or errors[-1]
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            voices = {voice_id: health.get_stats() for voice_id, health in self._health.items()}
+        return {
+            "max_parallel": self.max_parallel,
+            "hedge_after_seconds": VOICE_HEDGE_AFTER_SECONDS,
+            **self.stats,
+            "voices": voices,
+        }
+
+
+# Global voice selector instance
+voice_selector = VoiceSelector()
+
+def get_voice_selector_stats() -> Dict:
+    return voice_selector.get_stats()
@@ -1,12 +1,19 @@
 import os
+import asyncio
 import logging
 from typing import Dict, List, Optional
+import requests
 from tavily import TavilyClient
 
+from .resilience import get_provider
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Tavily errors that another attempt cannot fix
+TAVILY_FINAL_ERRORS = {"InvalidAPIKeyError", "MissingAPIKeyError", "UsageLimitExceededError", "BadRequestError", "ForbiddenError"}
+
 def get_runtime_api_key() -> str:
     """Get Tavily API key from runtime storage only, NO fallback to environment."""
     try:
@@ -16,6 +23,15 @@ def get_runtime_api_key() -> str:
     except:
         return ''
 
+def tavily_retryable(error: BaseException) -> bool:
+    """Throttling, server errors, timeouts and dropped connections are worth another attempt."""
+    if type(error).__name__ in TAVILY_FINAL_ERRORS:
+        return False
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError))
+
 class WebSearchService:
     def __init__(self):
         # Don't initialize with env variable anymore
@@ -50,14 +66,18 @@ class WebSearchService:
         try:
             logger.info(f"Searching web for: '{query}'")
             
-            # Use Tavily's search method
-            response = client.search(
-                query=query,
-                search_depth="basic",  # Can be "basic" or "advanced"
-                max_results=max_results,
-                include_answer=True,  # Get a direct answer if possible
-                include_images=False,  # We don't need images for voice
-                include_raw_content=False  # Keep it concise
+            # Use Tavily's search method; the client blocks, so keep it off the event loop
+            response = await get_provider("tavily").call(
+                lambda: asyncio.to_thread(
+                    client.search,
+                    query=query,
+                    search_depth="basic",  # Can be "basic" or "advanced"
+                    max_results=max_results,
+                    include_answer=True,  # Get a direct answer if possible
+                    include_images=False,  # We don't need images for voice
+                    include_raw_content=False  # Keep it concise
+                ),
+                retryable=tavily_retryable,
             )
             
             if response and 'results' in response:
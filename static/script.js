@@ -388,6 +388,13 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // --- Audio Data Accumulation ---
     let audioChunks = [];
+    // Turns the server abandoned (barge-in); late messages for them are ignored
+    const cancelledTurnIds = new Set();
+    // Binary frames (audio_transport=binary) are scheduled on streamingAudioContext as they arrive
+    let streamedSources = [];
+    let pcmRemainder = null; // a frame may end mid-sample; its last byte waits for the next frame
+    let streamSampleRate;
+    const AUDIO_FRAME_HEADER_BYTES = 10; // version u8 | kind u8 | turn_id u32 | seq u32
     
     // --- Audio Playback ---
     let streamingAudioContext;
@@ -781,6 +788,127 @@ document.addEventListener('DOMContentLoaded', function() {
             
             console.log(`✅ [Day 23] Successfully decoded ${bytes.length} bytes from complete base64`);
             
+            playAudioBytes(bytes);
+            
+            // Clear the chunks array
+            audioChunksForPlayback = [];
+            
+        } catch (error) {
+            console.error('❌ [Day 23] Error playing accumulated chunks:', error);
+        }
+    }
+
+    // Collect one binary audio frame from the server
+    function handleBinaryAudioFrame(buffer) {
+        const view = new DataView(buffer);
+        const version = view.getUint8(0);
+        const kind = view.getUint8(1);
+        const turnId = view.getUint32(2);
+        const seq = view.getUint32(6);
+        if (version !== 1 || kind !== 1) {
+            console.warn(`⚠️ Unknown binary frame (version ${version}, kind ${kind})`);
+            return;
+        }
+        if (cancelledTurnIds.has(turnId)) {
+            return;
+        }
+        console.log(`📻 Received binary audio frame ${seq} for turn ${turnId} (${buffer.byteLength - AUDIO_FRAME_HEADER_BYTES} bytes)`);
+        scheduleAudioBytes(new Uint8Array(buffer, AUDIO_FRAME_HEADER_BYTES));
+    }
+
+    // Offset of the PCM samples after a RIFF header, walking the sub-chunks
+    function wavDataOffset(bytes) {
+        const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+        let offset = 12;
+        while (offset + 8 <= bytes.length) {
+            const chunkId = String.fromCharCode(bytes[offset], bytes[offset + 1], bytes[offset + 2], bytes[offset + 3]);
+            const chunkSize = view.getUint32(offset + 4, true);
+            if (chunkId === 'data') return offset + 8;
+            offset += 8 + chunkSize + (chunkSize & 1);
+        }
+        return bytes.length;
+    }
+
+    // Play a piece of the agent's 16-bit mono PCM right after the piece before it
+    function scheduleAudioBytes(bytes) {
+        const isWavHeader = bytes.length >= 12 && String.fromCharCode(...bytes.subarray(0, 4)) === 'RIFF'
+            && String.fromCharCode(...bytes.subarray(8, 12)) === 'WAVE';
+        if (isWavHeader) {
+            streamSampleRate = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength).getUint32(24, true);
+            bytes = bytes.subarray(wavDataOffset(bytes));
+        }
+        if (pcmRemainder) {
+            const joined = new Uint8Array(pcmRemainder.length + bytes.length);
+            joined.set(pcmRemainder, 0);
+            joined.set(bytes, pcmRemainder.length);
+            bytes = joined;
+            pcmRemainder = null;
+        }
+        if (bytes.length % 2) {
+            pcmRemainder = bytes.slice(bytes.length - 1);
+            bytes = bytes.subarray(0, bytes.length - 1);
+        }
+        if (bytes.length === 0) return;
+
+        if (!streamingAudioContext) {
+            streamingAudioContext = new (window.AudioContext || window.webkitAudioContext)();
+        }
+        const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+        const samples = new Float32Array(bytes.length / 2);
+        for (let i = 0; i < samples.length; i++) {
+            samples[i] = view.getInt16(i * 2, true) / 32768;
+        }
+        const audioBuffer = streamingAudioContext.createBuffer(1, samples.length, streamSampleRate || SAMPLE_RATE);
+        audioBuffer.copyToChannel(samples, 0);
+        const source = streamingAudioContext.createBufferSource();
+        source.buffer = audioBuffer;
+        source.connect(streamingAudioContext.destination);
+        // A short lead absorbs scheduling jitter; after a gap, restart from now instead of the past
+        const startAt = Math.max(playheadTime || 0, streamingAudioContext.currentTime + 0.05);
+        source.start(startAt);
+        playheadTime = startAt + audioBuffer.duration;
+        streamedSources.push(source);
+        source.onended = () => {
+            streamedSources = streamedSources.filter(s => s !== source);
+            if (streamedSources.length === 0) {
+                isPlaying = false;
+                audioIndicator.style.display = 'none';
+            }
+        };
+        if (!isPlaying) {
+            isPlaying = true;
+            audioIndicator.style.display = 'flex';
+            if (agentState === 'THINKING') {
+                updateUI('SPEAKING');
+            }
+            console.log('✅ Streaming playback started');
+        }
+    }
+
+    // The turn's last frame has arrived; let what is scheduled finish on its own
+    function finishStreamedAudio() {
+        pcmRemainder = null;
+        streamSampleRate = undefined;
+    }
+
+    // Silence everything scheduled (barge-in or a cancelled turn)
+    function stopStreamedAudio() {
+        for (const source of streamedSources) {
+            source.onended = null;
+            try { source.stop(); } catch (e) { /* never started */ }
+        }
+        streamedSources = [];
+        pcmRemainder = null;
+        streamSampleRate = undefined;
+        isPlaying = false;
+        if (streamingAudioContext) {
+            playheadTime = streamingAudioContext.currentTime;
+        }
+    }
+
+    // Play decoded WAV/PCM audio bytes through the agent audio element
+    function playAudioBytes(bytes) {
+        try {
             // Check if it's a WAV file and skip header if needed
             let audioData = bytes;
             if (bytes.length > 44 && bytes[0] === 0x52 && bytes[1] === 0x49) { // "RI" from "RIFF"
@@ -816,12 +944,8 @@ document.addEventListener('DOMContentLoaded', function() {
                 audioIndicator.style.display = 'none';
                 console.log('🏁 [Day 23] Audio playback completed');
             };
-            
-            // Clear the chunks array
-            audioChunksForPlayback = [];
-            
         } catch (error) {
-            console.error('❌ [Day 23] Error playing accumulated chunks:', error);
+            console.error('❌ Error playing audio:', error);
         }
     }
 
@@ -875,7 +999,14 @@ document.addEventListener('DOMContentLoaded', function() {
                 console.log("--- Barge-in: User interrupted agent ---");
                 agentAudio.pause(); // Stop the agent from speaking
                 agentAudio.currentTime = 0;
-                startRecording(); // Immediately start a new recording
+                stopStreamedAudio();
+                if (ws && ws.readyState === WebSocket.OPEN) {
+                    // Still streaming: ask the server to abandon the turn and keep listening
+                    ws.send(JSON.stringify({ type: 'interrupt' }));
+                    updateUI('RECORDING');
+                } else {
+                    startRecording(); // Immediately start a new recording
+                }
                 break;
         }
     };
@@ -886,6 +1017,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Clear previous audio chunks
         audioChunks = [];
+        stopStreamedAudio();
         console.log('🗑️ [Day 23] Audio chunks array cleared for new session');
         
         // Reset real-time streaming state
@@ -893,9 +1025,12 @@ document.addEventListener('DOMContentLoaded', function() {
         isStreamingStarted = false;
         wavHeaderSet = true;
         audioIndicator.style.display = 'none';
-        if (streamingAudioContext) {
-            playheadTime = streamingAudioContext.currentTime;
+        // Created inside the click so the browser lets it play the streamed reply later
+        if (!streamingAudioContext) {
+            streamingAudioContext = new (window.AudioContext || window.webkitAudioContext)();
         }
+        streamingAudioContext.resume();
+        playheadTime = streamingAudioContext.currentTime;
         console.log('🔄 [Day 23] Real-time streaming state reset for new session');
         
         // Clear live transcript
@@ -906,10 +1041,12 @@ document.addEventListener('DOMContentLoaded', function() {
             // Use dynamic WebSocket URL based on current location
             const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
             const host = window.location.host;
-            const wsUrl = `${protocol}//${host}/ws/stream-audio?session_id=${encodeURIComponent(sessionId)}`;
+            // audio_transport=binary: agent audio arrives as raw binary frames instead of base64 JSON
+            const wsUrl = `${protocol}//${host}/ws/stream-audio?session_id=${encodeURIComponent(sessionId)}&audio_transport=binary`;
             
             console.log('Connecting to WebSocket:', wsUrl);
             ws = new WebSocket(wsUrl);
+            ws.binaryType = 'arraybuffer';
             ws.onerror = (e) => {
                 console.error('WebSocket error:', e);
                 playFallback('WebSocket error.');
@@ -939,11 +1076,39 @@ document.addEventListener('DOMContentLoaded', function() {
 
             // Handle incoming messages from the server
             ws.onmessage = (event) => {
+                if (event.data instanceof ArrayBuffer) {
+                    handleBinaryAudioFrame(event.data);
+                    return;
+                }
                 try {
                     console.log('Received WebSocket message:', event.data);
                     const message = JSON.parse(event.data);
                     
-                    if (message.type === 'turn_end') {
+                    if (message.turn_id && cancelledTurnIds.has(message.turn_id)) {
+                        console.log(`🛑 Ignoring ${message.type} for abandoned turn ${message.turn_id}`);
+                        return;
+                    }
+                    
+                    if (message.type === 'turn_cancelled') {
+                        console.log(`🛑 Turn ${message.turn_id} abandoned (${message.reason})`);
+                        cancelledTurnIds.add(message.turn_id);
+                        if (message.reason === 'queue_full') {
+                            // Dropped while still queued: it never started, so the reply playing now is unaffected
+                            return;
+                        }
+                        agentAudio.pause();
+                        agentAudio.currentTime = 0;
+                        audioIndicator.style.display = 'none';
+                        audioChunks = [];
+                        audioChunksForPlayback = [];
+                        stopStreamedAudio();
+                        isStreamingStarted = false;
+                        window.lastAgentResponse = null;
+                        if (agentState === 'SPEAKING' || agentState === 'THINKING') {
+                            updateUI('RECORDING');
+                        }
+                    }
+                    else if (message.type === 'turn_end') {
                         console.log('Turn ended:', message.transcript);
                         updateLiveTranscript(message.transcript);
                         updateUI('THINKING');
@@ -991,12 +1156,17 @@ document.addEventListener('DOMContentLoaded', function() {
                             addConversationTurn(liveTranscript.textContent, window.lastAgentResponse);
                         }
                         
-                        // Reassemble full audio from all chunks and play once
-                        const fullBase64 = audioChunks.map(chunk => chunk.data).join('');
-                        console.log(`🎞️ [Day 23] Reassembled full audio base64 length: ${fullBase64.length}`);
-                        audioChunksForPlayback = [fullBase64];
-                        console.log('🎬 [Day 23] Playing final assembled audio');
-                        playAccumulatedChunks();
+                        if (message.binary) {
+                            // Already playing: binary frames are scheduled as they arrive
+                            finishStreamedAudio();
+                        } else {
+                            // Reassemble full audio from all chunks and play once
+                            const fullBase64 = audioChunks.map(chunk => chunk.data).join('');
+                            console.log(`🎞️ [Day 23] Reassembled full audio base64 length: ${fullBase64.length}`);
+                            audioChunksForPlayback = [fullBase64];
+                            console.log('🎬 [Day 23] Playing final assembled audio');
+                            playAccumulatedChunks();
+                        }
                         
                         // Reset streaming state but keep WebSocket open for continuous conversation
                         setTimeout(() => {
@@ -0,0 +1,48 @@
+"""
+Tests for the STT PCM framer
+"""
+
+from utils.audio_framing import PcmFramer
+
+
+def frames_as_bytes(frames):
+    return [bytes(frame) for frame in frames]
+
+
+def test_frames_preserve_stream_order():
+    """Arbitrary chunk sizes must come out as the same bytes in fixed frames"""
+    framer = PcmFramer(frame_ms=50)
+    audio = bytes(range(256)) * 100
+    out = []
+    pos = 0
+    for size in [7, 1600, 3199, 1, 5000, 12, 9000]:
+        out += frames_as_bytes(framer.push(audio[pos:pos + size]))
+        pos += size
+    out += frames_as_bytes(framer.push(audio[pos:]))
+    tail = framer.flush()
+
+    assert all(len(frame) == 1600 for frame in out)
+    assert b"".join(out) + (tail or b"") == audio
+
+
+def test_large_bytes_chunk_is_not_copied():
+    framer = PcmFramer(frame_ms=100)
+    frames = framer.push(bytes(3200 * 10))
+    assert len(frames) == 10
+    assert framer.bytes_copied == 0
+
+
+def test_frame_duration_is_bounded():
+    for frame_ms in (49, 251):
+        try:
+            PcmFramer(frame_ms=frame_ms)
+        except ValueError:
+            continue
+        raise AssertionError(f"frame_ms={frame_ms} should be rejected")
+
+
+if __name__ == "__main__":
+    test_frames_preserve_stream_order()
+    test_large_bytes_chunk_is_not_copied()
+    test_frame_duration_is_bounded()
+    print("✅ Audio framing tests passed")
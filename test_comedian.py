@@ -43,7 +43,7 @@ def test_comedian_voice():
         test_text = "Arre yaar! I'm RAVI, your comedy AI assistant! Ready to make you laugh while solving your problems. What's up, boss?"
         
         print(f"🔊 Generating audio for: {test_text[:50]}...")
-        audio_url = generate_comedian_tts_audio(test_text)
+        audio_url = asyncio.run(generate_comedian_tts_audio(test_text))
         print(f"✅ Audio generated successfully: {audio_url}")
         
     except Exception as e:
@@ -0,0 +1,34 @@
+"""
+Tests for the per-key Gemini client registry
+
+The registry builds its clients with google-generativeai's private
+`_ClientManager` and binds them through a model's private `_client` and
+`_async_client` attributes (requirements.txt pins the version). These fail
+if an upgrade moves any of them.
+"""
+
+import google.generativeai as genai
+from google.generativeai import client as genai_client
+
+from services.gemini_clients import GeminiClientRegistry
+
+
+def test_client_manager_is_still_there():
+    manager = genai_client._ClientManager()
+    assert callable(getattr(manager, "configure", None))
+    assert callable(getattr(manager, "make_client", None))
+
+
+def test_models_still_carry_their_own_clients():
+    model = genai.GenerativeModel("gemini-1.5-flash")
+    assert hasattr(model, "_client")
+    assert hasattr(model, "_async_client")
+
+
+def test_models_are_bound_to_their_key():
+    registry = GeminiClientRegistry()
+    first = registry.model("key-one")
+    second = registry.model("key-two")
+    assert first._client is not None
+    assert first._client is not second._client
+    assert registry.model("key-one") is first
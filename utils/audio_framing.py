@@ -0,0 +1,88 @@
+from typing import List, Optional, Union
+
+# AssemblyAI accepts 50-1000ms of audio per message; we keep frames short for latency
+MIN_FRAME_MS = 50
+MAX_FRAME_MS = 250
+
+
+class PcmFramer:
+    """
+    Cuts an arbitrary stream of PCM chunks into fixed-duration frames.
+
+    The carry-over between chunks never exceeds one frame, so it lives in a single
+    preallocated buffer. Whole frames inside an incoming `bytes` chunk are handed
+    out as memoryview slices of that chunk without copying; only the frame that
+    straddles a chunk boundary is assembled in the buffer. The copy cost per second
+    of audio is therefore flat, however large the browser's frames are.
+    """
+
+    def __init__(self, frame_ms: int = MIN_FRAME_MS, sample_rate: int = 16_000, sample_width: int = 2):
+        if not MIN_FRAME_MS <= frame_ms <= MAX_FRAME_MS:
+            raise ValueError(f"frame_ms must be between {MIN_FRAME_MS} and {MAX_FRAME_MS}, got {frame_ms}")
+        self.frame_ms = frame_ms
+        self.frame_bytes = (sample_rate * frame_ms // 1000) * sample_width
+        self._carry = bytearray(self.frame_bytes)
+        self._carry_view = memoryview(self._carry)
+        self._fill = 0
+        # Bytes memcpy'd by the framer itself, for benchmarking
+        self.bytes_copied = 0
+
+    def push(self, chunk: Union[bytes, bytearray, memoryview]) -> List[Union[bytes, memoryview]]:
+        """
+        Add a chunk and return every frame it completes.
+
+        Frames are `bytes` or read-only memoryviews over the (immutable) input chunk.
+        """
+        fill = self._fill
+        if isinstance(chunk, (bytes, bytearray)) and fill + len(chunk) < self.frame_bytes:
+            # Common case: the browser posts ~3ms worklet buffers, far below a frame
+            self._carry[fill:fill + len(chunk)] = chunk
+            self._fill = fill + len(chunk)
+            self.bytes_copied += len(chunk)
+            return []
+
+        view = memoryview(chunk)
+        if view.format != "B" or view.ndim != 1:
+            view = view.cast("B")
+        # A mutable chunk may be reused by the caller, so its frames cannot be borrowed
+        borrow = isinstance(chunk, bytes)
+        size = len(view)
+        pos = 0
+        frames = []
+
+        if self._fill:
+            take = min(self.frame_bytes - self._fill, size)
+            self._carry_view[self._fill:self._fill + take] = view[:take]
+            self.bytes_copied += take
+            self._fill += take
+            pos = take
+            if self._fill < self.frame_bytes:
+                return frames
+            self._fill = 0
+            self.bytes_copied += self.frame_bytes
+            frames.append(bytes(self._carry))
+
+        while size - pos >= self.frame_bytes:
+            frame = view[pos:pos + self.frame_bytes]
+            pos += self.frame_bytes
+            if borrow:
+                frames.append(frame.toreadonly())
+            else:
+                self.bytes_copied += self.frame_bytes
+                frames.append(bytes(frame))
+
+        remainder = size - pos
+        if remainder:
+            self._carry_view[:remainder] = view[pos:]
+            self.bytes_copied += remainder
+            self._fill = remainder
+        return frames
+
+    def flush(self) -> Optional[bytes]:
+        """Return the buffered partial frame, if any, and reset."""
+        if not self._fill:
+            return None
+        tail = bytes(self._carry_view[:self._fill])
+        self.bytes_copied += self._fill
+        self._fill = 0
+        return tail